@@ -2,6 +2,9 @@
 import re
 import os
 import random
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Optional, Tuple, Dict, Any
 
@@ -10,6 +13,13 @@ _llm_available = None
 MODEL_ID = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
 
+# Admission control for LLM generations: at most LLM_MAX_CONCURRENT run at
+# once and at most LLM_MAX_QUEUE wait for a slot. A message that would wait
+# longer than LLM_WAIT_BUDGET seconds gets the instant fallback reply instead.
+LLM_MAX_CONCURRENT = int(os.environ.get("OPTITASK_LLM_CONCURRENCY", "1"))
+LLM_MAX_QUEUE = int(os.environ.get("OPTITASK_LLM_QUEUE", "4"))
+LLM_WAIT_BUDGET = float(os.environ.get("OPTITASK_LLM_WAIT_BUDGET", "5"))
+
 
 def get_today():
     return datetime.now().strftime("%A, %B %d, %Y")
@@ -27,9 +37,16 @@ class PatternMatcher:
     PATTERNS = {
         # Check list_tasks FIRST to avoid false positives with "schedule"
         "list_tasks": [
+            # "show my gym tasks", "find my gym tasks", "search for client report":
+            # group 1 is a search query. A bare "find ..." ("find me a free
+            # slot", "find time for gym") is left to the scheduling replies / LLM.
+            r"^(?:show|list|display)\s+(?:me\s+)?(?:all\s+)?(?:my\s+)?(?!my\b|all\b|the\b|today|tomorrow|upcoming|pending)(.+?)\s+(?:tasks?|to.?dos?)$",
+            r"^find\s+(?:all\s+)?my\s+(?!today|tomorrow|upcoming|pending)(.+?)\s+(?:tasks?|to.?dos?)$",
+            r"^(?:search|find)\s+(?:my\s+)?tasks?\s+(?:for|about|named|called)\s+(?:the\s+)?(.+)$",
+            r"^search\s+(?:my\s+)?(?:tasks?\s+)?(?:for\s+)?(?:the\s+)?(.+)$",
             r"(?:what(?:'s| is)?|show|list|display)\s+(?:is\s+)?(?:on\s+)?(?:my\s+)?(?:tasks?|schedule|agenda|to.?do)",
             r"what.*(?:on my|do i have|is on).*(?:schedule|today|tomorrow)",
-            r"^show\s+(?:my\s+)?(?:tasks?|schedule)$",
+            r"^(?:show|find)\s+(?:my\s+)?(?:tasks?|schedule)$",
         ],
         "add_task": [
             r"^(?:add|create|set|make|put|schedule)\s+(?:a\s+)?(?:new\s+)?(?:task|meeting|reminder|event)\s+(?:for|to|called|named)?\s*(.+)",
@@ -73,6 +90,94 @@ class PatternMatcher:
         return random.choice(cls.RESPONSES.get(intent, ["Got it!"]))
 
 
+class LLMGate:
+    """
+    Bounded admission for LLM generations. slot() yields True once a
+    generation may run, or False (shed) when the wait queue is full, when
+    the expected wait (requests ahead x recent generation time / slots)
+    is over the budget, or when the budget runs out while waiting. Waiters
+    hold a threadpool thread, so the queue bound is also what keeps /tasks
+    requests from starving behind a burst of chat.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, wait_budget: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.wait_budget = wait_budget
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+        self._avg_secs = 0.0   # moving average of a generation
+        self._admitted = 0
+        self._shed = {"queue_full": 0, "over_budget": 0, "timed_out": 0}
+
+    def _expected_wait(self) -> float:
+        ahead = self._running + self._waiting + 1 - self.max_concurrent
+        return max(0, ahead) * self._avg_secs / self.max_concurrent
+
+    def _acquire(self) -> bool:
+        with self._cond:
+            if self._running < self.max_concurrent and not self._waiting:
+                self._running += 1
+                self._admitted += 1
+                return True
+            if self._waiting >= self.max_queue:
+                self._shed["queue_full"] += 1
+                return False
+            if self._expected_wait() > self.wait_budget:
+                self._shed["over_budget"] += 1
+                return False
+            deadline = time.monotonic() + self.wait_budget
+            self._waiting += 1
+            try:
+                while self._running >= self.max_concurrent:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        self._shed["timed_out"] += 1
+                        return False
+                    self._cond.wait(left)
+            finally:
+                self._waiting -= 1
+            self._running += 1
+            self._admitted += 1
+            return True
+
+    def _release(self, secs: Optional[float]) -> None:
+        with self._cond:
+            self._running -= 1
+            if secs is not None:
+                self._avg_secs = secs if not self._avg_secs else 0.7 * self._avg_secs + 0.3 * secs
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, timed: bool = True):
+        """timed=False leaves the run out of the average (the one that loads the model)."""
+        admitted = self._acquire()
+        started = time.monotonic()
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self._release(time.monotonic() - started if timed else None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "running": self._running,
+                "queue_depth": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "wait_budget_secs": self.wait_budget,
+                "avg_generation_secs": round(self._avg_secs, 3),
+                "admitted": self._admitted,
+                "shed": dict(self._shed),
+                "shed_total": sum(self._shed.values()),
+            }
+
+
+llm_gate = LLMGate(LLM_MAX_CONCURRENT, LLM_MAX_QUEUE, LLM_WAIT_BUDGET)
+
+
 def check_llm_available() -> bool:
     try:
         import transformers
@@ -157,7 +262,8 @@ def process_message(text: str, tasks: list = None) -> Dict[str, Any]:
         return {"action": "add_task", "task_text": task_desc, "response": f"Got it! Adding: {task_desc}"}
 
     if intent == "list_tasks":
-        return {"action": "list_tasks", "response": "Here's your schedule:"}
+        query = data["groups"][0] if data["groups"] else None
+        return {"action": "list_tasks", "query": query, "response": "Here's your schedule:"}
 
     if intent == "complete_task":
         task_id = int(data["groups"][0]) if data["groups"] else None
@@ -167,13 +273,21 @@ def process_message(text: str, tasks: list = None) -> Dict[str, Any]:
         task_id = int(data["groups"][0]) if data["groups"] else None
         return {"action": "delete_task", "task_id": task_id, "response": f"Deleted task #{task_id}."}
 
-    # No pattern match - try LLM if available
+    # No pattern match - try LLM if available and there's room for it
     if check_llm_available():
-        response = query_llm(text, task_ctx)
-        if "trouble" not in response.lower():
-            return {"action": "reply", "response": response}
-    
-    # Smart fallback for common questions (no LLM needed)
+        with llm_gate.slot(timed=_llm_available is not None) as admitted:
+            if admitted:
+                response = query_llm(text, task_ctx)
+                if "trouble" not in response.lower():
+                    return {"action": "reply", "response": response}
+        if not admitted:
+            return {**fallback_reply(text), "degraded": True}
+
+    return fallback_reply(text)
+
+
+def fallback_reply(text: str) -> Dict[str, Any]:
+    """Smart fallback for common questions (no LLM needed)."""
     text_lower = text.lower()
     
     if "priorit" in text_lower or "urgent" in text_lower:
@@ -0,0 +1,102 @@
+import sqlite3
+
+from migrate_db import DB_PATH, day_sql, minute_sql
+
+# task_rollup holds per-user, per-day counters for /analytics, one row per
+# (dimension, key) so a day has at most categories + priorities + 25 rows
+# however many tasks it has. Tasks are bucketed by their deadline day
+# (-1: no deadline). Triggers keep it in step with tasks and
+# tasks_archive (archiving deletes from one and inserts into the other,
+# so it nets out); rebuild_rollups() recomputes it from scratch.
+ROLLUP_DIMS = ("category", "priority", "hour")   # hour: start hour, -1 when untimed
+
+ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS task_rollup (
+  user_id INTEGER NOT NULL,
+  day INTEGER NOT NULL,
+  dim TEXT NOT NULL,
+  key NOT NULL,               -- category name, priority or hour (no affinity: ints stay ints)
+  tasks INTEGER NOT NULL DEFAULT 0,
+  completed INTEGER NOT NULL DEFAULT 0,
+  duration_sum INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, day, dim, key)
+) WITHOUT ROWID;
+"""
+
+
+def hour_sql(col: str) -> str:
+    """SQL for the hour of 'HH:MM' in `col`, -1 if empty or malformed."""
+    return f"(({minute_sql(col)}) + 60) / 60 - 1"
+
+
+def _keys(row: str):
+    return {"category": f"{row}.category", "priority": f"{row}.priority", "hour": hour_sql(f"{row}.start_time")}
+
+
+def _add(row: str) -> str:
+    keys = _keys(row)
+    return "".join(
+        f"""
+          INSERT INTO task_rollup(user_id, day, dim, key, tasks, completed, duration_sum)
+          VALUES({row}.user_id, {day_sql(row + '.deadline')}, '{dim}', {keys[dim]}, 1, {row}.status, {row}.duration)
+          ON CONFLICT(user_id, day, dim, key) DO UPDATE SET
+            tasks = tasks + 1, completed = completed + excluded.completed,
+            duration_sum = duration_sum + excluded.duration_sum;"""
+        for dim in ROLLUP_DIMS
+    )
+
+
+def _sub(row: str) -> str:
+    keys = _keys(row)
+    return "".join(
+        f"""
+          UPDATE task_rollup SET tasks = tasks - 1, completed = completed - {row}.status,
+            duration_sum = duration_sum - {row}.duration
+          WHERE user_id = {row}.user_id AND day = {day_sql(row + '.deadline')} AND dim = '{dim}' AND key = {keys[dim]};"""
+        for dim in ROLLUP_DIMS
+    )
+
+
+ROLLUP_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS tasks_rollup_ins AFTER INSERT ON tasks BEGIN{_add("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_rollup_upd AFTER UPDATE OF
+  user_id, deadline, start_time, status, category, priority, duration
+ON tasks BEGIN{_sub("OLD")}{_add("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_rollup_del AFTER DELETE ON tasks BEGIN{_sub("OLD")}
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_archive_rollup_ins AFTER INSERT ON tasks_archive BEGIN{_add("NEW")}
+END;
+"""
+
+
+def rebuild_rollups(conn) -> int:
+    """Recompute task_rollup from tasks + tasks_archive in one transaction. Returns its row count."""
+    rows = (
+        f"SELECT user_id, {day_sql('deadline')} AS day, category, priority, {hour_sql('start_time')} AS hour, "
+        "status, duration FROM {table}"
+    )
+    source = f"{rows.format(table='tasks')} UNION ALL {rows.format(table='tasks_archive')}"
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM task_rollup")
+        for dim in ROLLUP_DIMS:
+            conn.execute(
+                "INSERT INTO task_rollup(user_id, day, dim, key, tasks, completed, duration_sum) "
+                f"SELECT user_id, day, '{dim}', {dim}, COUNT(*), SUM(status), SUM(duration) "
+                f"FROM ({source}) GROUP BY user_id, day, {dim}"
+            )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return conn.execute("SELECT COUNT(*) FROM task_rollup").fetchone()[0]
+
+
+if __name__ == "__main__":
+    # python analytics.py: rebuild the rollups (after restoring a backup,
+    # editing tasks.db by hand, ...). The server must have created the schema.
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    print(f"Rebuilt task_rollup: {rebuild_rollups(conn)} rows")
+    conn.close()
@@ -1,10 +1,10 @@
 @echo off
 setlocal
 
-REM Build a Windows DLL using MinGW-w64 gcc
+REM Build the C core with MinGW-w64 gcc. Required: the DLL is not checked in.
 REM Output: task_manager.dll
 
-gcc -O2 -shared -o task_manager.dll task_manager.c
+gcc -O2 -shared -fPIC -pthread -o task_manager.dll task_manager.c
 
 if %errorlevel% neq 0 (
   echo Build failed.
@@ -12,4 +12,4 @@ if %errorlevel% neq 0 (
 )
 
 echo Built task_manager.dll successfully.
-endlocal
\ No newline at end of file
+endlocal
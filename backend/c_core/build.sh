@@ -0,0 +1,10 @@
+#!/bin/sh
+# Build the C core with gcc (macOS/Linux). Required: the library is not checked in.
+# Output: task_manager.dll (main.py loads this name on every platform)
+set -e
+cd "$(dirname "$0")"
+# shm_open lives in librt on glibc before 2.34 (and macOS has no librt)
+LIBS=""
+[ "$(uname -s)" = Linux ] && LIBS="-lrt"
+gcc -O2 -shared -fPIC -pthread -o task_manager.dll task_manager.c $LIBS
+echo "Built task_manager.dll successfully."
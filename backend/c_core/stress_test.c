@@ -0,0 +1,235 @@
+// Multithreaded stress test for a private store: THREADS threads mix adds,
+// patches, deletes, snapshots and sorted / dependency reads on one store,
+// then the store's internals are checked (id map, name heap, categories,
+// digest, dependency graph, count) and snapshot + journal are replayed into
+// a second store that must come out identical. POSIX only; run by
+// tests/test_c_concurrency.py, or by hand:
+//
+//   gcc -O2 -pthread -o stress_test stress_test.c && ./stress_test /tmp
+//
+// Includes task_manager.c itself so the checks can read the internals.
+#include "task_manager.c"
+
+#define THREADS 8
+#define OPS_PER_THREAD 5000
+#define ID_WINDOW 1024   // patches / deletes aim at the most recent ids
+#define MAX_IDS (THREADS * OPS_PER_THREAD + 1)
+
+static TmStore* store;
+static char snap_path[4096], journal_path[4096];
+static long long added, deleted;  // __atomic counters
+static int failures;
+
+#define CHECK(cond, ...)                 \
+  do {                                   \
+    if (!(cond)) {                       \
+      fprintf(stderr, "FAIL: " __VA_ARGS__); \
+      fputc('\n', stderr);               \
+      failures++;                        \
+    }                                    \
+  } while (0)
+
+static uint32_t rnd(uint32_t* x) {
+  *x ^= *x << 13;
+  *x ^= *x >> 17;
+  *x ^= *x << 5;
+  return *x;
+}
+
+// An id that was handed out recently (it may already be deleted).
+static int recent_id(uint32_t* x) {
+  int next = __atomic_load_n(&store->h->next_id, __ATOMIC_SEQ_CST);
+  int lo = next > ID_WINDOW ? next - ID_WINDOW : 1;
+  return next > lo ? lo + (int)(rnd(x) % (uint32_t)(next - lo)) : 0;
+}
+
+static void random_name(uint32_t* x, char* out, int thread) {
+  int n = snprintf(out, 16, "t%d-", thread);
+  int len = n + 1 + (int)(rnd(x) % 120);
+  for (int i = n; i < len; i++) out[i] = (char)('a' + rnd(x) % 26);
+  out[len] = '\0';
+}
+
+static void random_date(uint32_t* x, char* out) {
+  snprintf(out, 16, "2030-%02u-%02u", 1 + rnd(x) % 12, 1 + rnd(x) % 28);
+}
+
+static void random_time(uint32_t* x, char* out) {
+  snprintf(out, 16, "%02u:%02u", rnd(x) % 24, rnd(x) % 60);
+}
+
+static const char* categories[] = {"work", "personal", "health", "study", "errand", ""};
+
+static void* worker(void* arg) {
+  int thread = (int)(intptr_t)arg;
+  uint32_t x = 2463534242u + 7919u * (uint32_t)thread;
+  char name[160], day[16], at[16];
+  int* ids = (int*)malloc(sizeof(int) * MAX_IDS);
+  TmDepInfo* deps = (TmDepInfo*)malloc(sizeof(TmDepInfo) * MAX_IDS);
+
+  for (int op = 0; op < OPS_PER_THREAD; op++) {
+    uint32_t r = rnd(&x) % 1000;
+    const char* category = categories[rnd(&x) % 6];
+    if (r < 320) {
+      random_name(&x, name, thread);
+      random_date(&x, day);
+      random_time(&x, at);
+      int dep = rnd(&x) % 3 == 0 ? recent_id(&x) : 0;
+      int id = tm_add_task(store, name, category, 1 + (int)(rnd(&x) % 5), rnd(&x) % 4 ? day : "",
+                           rnd(&x) % 3 ? at : "", 15 * (int)(rnd(&x) % 8), (int)(rnd(&x) % 2), dep,
+                           (int)(rnd(&x) % 11));
+      CHECK(id > 0, "add returned %d", id);
+      if (id > 0) __atomic_fetch_add(&added, 1, __ATOMIC_SEQ_CST);
+    } else if (r < 600) {
+      random_name(&x, name, thread);
+      random_date(&x, day);
+      random_time(&x, at);
+      int dep = rnd(&x) % 4 == 0 ? (rnd(&x) % 2 ? recent_id(&x) : 0) : -1;
+      int ok = tm_update_task(store, recent_id(&x), rnd(&x) % 2 ? name : NULL, rnd(&x) % 2 ? category : NULL,
+                              rnd(&x) % 2 ? 1 + (int)(rnd(&x) % 5) : -1, rnd(&x) % 2 ? day : NULL,
+                              rnd(&x) % 2 ? at : NULL, -1, (int)(rnd(&x) % 3) - 1, dep, -1);
+      CHECK(ok == 1 || ok == 0 || ok == -2 || ok == -3, "update returned %d", ok);
+    } else if (r < 920) {
+      if (tm_delete_task(store, recent_id(&x))) __atomic_fetch_add(&deleted, 1, __ATOMIC_SEQ_CST);
+    } else if (r < 960) {
+      int n = tm_sorted_ids(store, ids, MAX_IDS);
+      int next = __atomic_load_n(&store->h->next_id, __ATOMIC_SEQ_CST);
+      for (int i = 0; i < n; i++) CHECK(ids[i] > 0 && ids[i] < next, "sorted id %d out of range", ids[i]);
+    } else if (r < 998) {
+      int n = tm_dependency_order(store, deps, MAX_IDS);
+      CHECK(n >= 0 && n <= MAX_IDS, "dependency_order returned %d", n);
+    } else {
+      CHECK(tm_snapshot_save(store, snap_path, 0), "snapshot_save failed");
+    }
+  }
+  free(ids);
+  free(deps);
+  return NULL;
+}
+
+// Same rules as tm_cmp_tasks, on ids.
+static int in_order(TmStore* s, int a, int b) {
+  return tm_cmp_tasks(tm_task_by_id(s, a), tm_task_by_id(s, b)) <= 0;
+}
+
+static void check_store(TmStore* s) {
+  TmHeader* h = s->h;
+  int n = h->count;
+
+  // id map: a power-of-two table at load <= 1/2 that finds every task at its index
+  CHECK(h->id_slot_cap > 0 && (h->id_slot_cap & (h->id_slot_cap - 1)) == 0, "id_slot_cap %d", h->id_slot_cap);
+  CHECK(n * 2 <= h->id_slot_cap, "id map overloaded: %d tasks, %d slots", n, h->id_slot_cap);
+  int used = 0;
+  for (int i = 0; i < h->id_slot_cap; i++) {
+    if (!s->id_slots[i]) continue;
+    used++;
+    CHECK(s->id_slots[i] - 1 < n, "id slot %d points past the tasks", i);
+  }
+  CHECK(used == n, "%d id slots in use for %d tasks", used, n);
+  int next = __atomic_load_n(&h->next_id, __ATOMIC_SEQ_CST);
+  for (int i = 0; i < n; i++) {
+    CHECK(tm_find_index_by_id(s, s->tasks[i].id) == i, "id %d not found at index %d", s->tasks[i].id, i);
+    CHECK(s->tasks[i].id > 0 && s->tasks[i].id < next, "id %d vs next_id %d", s->tasks[i].id, next);
+  }
+
+  // name heap: live bytes are exactly the categories' and tasks' strings
+  uint64_t live = 0;
+  for (int i = 0; i < h->cat_count; i++) {
+    CHECK(s->cat_names[i] < h->names_used, "category %d offset past the heap", i);
+    live += strlen(s->names + s->cat_names[i]) + 1;
+  }
+  for (int i = 0; i < n; i++) {
+    CHECK(s->tasks[i].name < h->names_used, "task %d name offset past the heap", s->tasks[i].id);
+    CHECK(s->tasks[i].category < h->cat_count, "task %d category %d", s->tasks[i].id, s->tasks[i].category);
+    live += strlen(s->names + s->tasks[i].name) + 1;
+  }
+  CHECK(live == h->names_live, "names_live %u, strings hold %llu", h->names_live, (unsigned long long)live);
+  CHECK(h->names_live <= h->names_used && h->names_used <= h->names_cap, "name heap %u/%u/%u",
+        h->names_live, h->names_used, h->names_cap);
+
+  // categories: each interned once and findable
+  for (int i = 0; i < h->cat_count; i++) {
+    CHECK(tm_intern_category(s, tm_category_name(s, i)) == i, "category %d not found", i);
+  }
+  CHECK(h->cat_count == 6, "%d categories interned", h->cat_count);  // "" is "general"
+
+  // digest: XOR of every task's hash
+  uint64_t digest = 0;
+  for (int i = 0; i < n; i++) digest ^= tm_task_hash(s, &s->tasks[i]);
+  CHECK(digest == h->digest, "digest %llx, tasks hash to %llx", (unsigned long long)h->digest,
+        (unsigned long long)digest);
+
+  // dependency graph: prerequisites keyed first, child lists match depends_on
+  tm_graph_ensure(s);
+  CHECK(!h->graph_dirty, "graph still dirty");
+  int linked = 0, dangling = 0;
+  for (int i = 0; i < n; i++) {
+    Task* t = &s->tasks[i];
+    Task* parent = tm_task_by_id(s, t->depends_on);
+    if (parent) {
+      CHECK(parent->ord < t->ord, "task %d keyed before its prerequisite %d", t->id, parent->id);
+    } else if (t->depends_on) {
+      dangling++;
+    }
+    int prev = 0;
+    for (Task* c = tm_task_by_id(s, t->first_child); c; c = tm_task_by_id(s, c->next_sibling)) {
+      CHECK(c->depends_on == t->id, "task %d listed under %d", c->id, t->id);
+      CHECK(c->prev_sibling == prev, "task %d prev_sibling %d, expected %d", c->id, c->prev_sibling, prev);
+      prev = c->id;
+      if (++linked > n) break;  // a loop in the list
+    }
+  }
+  int with_parent = 0;
+  for (int i = 0; i < n; i++) with_parent += tm_task_by_id(s, s->tasks[i].depends_on) != NULL;
+  CHECK(linked == with_parent, "%d tasks linked, %d have a prerequisite", linked, with_parent);
+  CHECK(dangling == h->dangling, "dangling %d, counted %d", h->dangling, dangling);
+
+  // reads
+  int* ids = (int*)malloc(sizeof(int) * (size_t)(n ? n : 1));
+  int got = tm_sorted_ids(s, ids, n);
+  CHECK(got == n, "sorted_ids returned %d of %d", got, n);
+  for (int i = 1; i < got; i++) CHECK(in_order(s, ids[i - 1], ids[i]), "sorted_ids out of order at %d", i);
+  free(ids);
+}
+
+int main(int argc, char** argv) {
+  const char* dir = argc > 1 ? argv[1] : ".";
+  snprintf(snap_path, sizeof snap_path, "%s/stress.snap", dir);
+  snprintf(journal_path, sizeof journal_path, "%s/stress.journal", dir);
+
+  store = tm_store_create();
+  if (!store || !tm_snapshot_save(store, snap_path, 0) || !tm_journal_open(store, journal_path)) {
+    fprintf(stderr, "FAIL: can't set up the store in %s\n", dir);
+    return 1;
+  }
+
+  pthread_t threads[THREADS];
+  for (int i = 0; i < THREADS; i++) pthread_create(&threads[i], NULL, worker, (void*)(intptr_t)i);
+  for (int i = 0; i < THREADS; i++) pthread_join(threads[i], NULL);
+
+  int n = tm_count(store);
+  CHECK(n == added - deleted, "count %d, %lld added - %lld deleted", n, added, deleted);
+  CHECK(n > 0 && deleted > 0, "%d tasks left, %lld deleted: the mix didn't exercise both", n, deleted);
+  check_store(store);
+
+  // Journal records were appended under the write lock, so replaying them
+  // over the last snapshot must rebuild the same store.
+  long long seq_a;
+  int rows_a;
+  unsigned long long digest_a = tm_store_digest(store, &seq_a, &rows_a);
+  tm_journal_close(store);
+  TmStore* again = tm_store_create();
+  CHECK(tm_snapshot_load(again, snap_path, journal_path) >= 0, "snapshot + journal don't load");
+  long long seq_b;
+  int rows_b;
+  unsigned long long digest_b = tm_store_digest(again, &seq_b, &rows_b);
+  CHECK(rows_b == rows_a && digest_b == digest_a, "replay: %d rows / %llx, store: %d rows / %llx", rows_b,
+        digest_b, rows_a, digest_a);
+  check_store(again);
+
+  printf("%d threads x %d ops: %lld added, %lld deleted, %d left, %d failures\n", THREADS, OPS_PER_THREAD,
+         added, deleted, n, failures);
+  tm_store_free(again);
+  tm_store_free(store);
+  return failures ? 1 : 0;
+}
@@ -1,22 +1,193 @@
 #include "task_manager.h"
+#include <stdint.h>
+#include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 
+#ifdef _WIN32
+  #include <windows.h>
+#else
+  #include <errno.h>
+  #include <fcntl.h>
+  #include <pthread.h>
+  #include <sched.h>
+  #include <sys/mman.h>
+  #include <sys/stat.h>
+  #include <time.h>
+  #include <unistd.h>
+#endif
+
+// Compact task: dates/times are packed integers (cheap to compare and to
+// update in place), categories are indexes into the store's intern table and
+// names are offsets into the store's name heap. Nothing in a store holds a
+// pointer, so the same layout works in a shared-memory segment mapped at a
+// different address in every process. 48 bytes + name bytes per task.
+#define TM_NO_DAY -1     // deadline_day when deadline is "" (or unparseable)
+#define TM_NO_MIN -1     // start_min when start_time is ""
+
 typedef struct {
+  uint32_t name;        // offset into the store's name heap
   int id;
-  char* name;
-  char* category;
   int priority;
-  char* deadline;     // YYYY-MM-DD
-  char* start_time;   // HH:MM
   int duration_mins;
-  int status;         // 0 active, 1 done
+  int32_t deadline_day; // days since 1970-01-01
+  int depends_on;       // prerequisite task id, 0 = none
+  int first_child;      // dependency forest, linked by id (see "Dependency graph")
+  int next_sibling;
+  int prev_sibling;
+  uint32_t ord;         // topological key: below every dependent's
+  int16_t start_min;    // minutes since 00:00
+  uint16_t category;    // index into the store's categories
+  uint8_t status;       // 0 active, 1 done
+  uint8_t stress;       // stress_level
 } Task;
 
-static Task* g_tasks = NULL;
-static int g_count = 0;
-static int g_cap = 0;
-static int g_next_id = 1;
+#define TM_MAX_CATEGORIES 65535
+
+// Concurrency: every TM_API entry point takes the store's lock (shared for
+// reads, exclusive for writes) and calls *_locked / *_internal helpers, which
+// never lock. ctypes.CDLL drops the GIL around each call, so Python
+// threadpool workers really do run in here concurrently.
+//
+// Private stores use a reader-writer lock. Shared stores use one exclusive
+// cross-process lock (a robust pthread mutex / a named Windows mutex), so a
+// worker that dies holding it doesn't wedge the others.
+#ifdef _WIN32
+typedef SRWLOCK TmRwLock;
+#else
+typedef pthread_rwlock_t TmRwLock;
+#endif
+
+// Everything two processes must agree on. Private stores malloc it; shared
+// stores keep it at the start of the segment.
+typedef struct {
+  uint64_t magic;         // shared: TM_SHM_MAGIC once the creator has initialised it
+  uint32_t layout;        // shared: TM_SHM_LAYOUT of the build that created it
+  int max_tasks;          // shared: fixed capacity the segment was sized for
+  int attached;           // shared, POSIX: open handles in every process; the last one unlinks it
+  int unlinked;           // shared, POSIX: set with the unlink; an opener that sees it makes a new one
+
+  TmRwLock rwlock;        // private stores
+#ifndef _WIN32
+  pthread_mutex_t mutex;  // shared stores (PTHREAD_PROCESS_SHARED, robust)
+#endif
+
+  int count;
+  int task_cap;
+  int next_id;            // only touched through __atomic builtins
+
+  // Name heap: task names and category strings, bump-allocated.
+  uint32_t names_used;    // bytes handed out
+  uint32_t names_live;    // bytes still referenced
+  uint32_t names_cap;
+
+  int cat_count;
+  int cat_cap;
+  int cat_slot_cap;
+  int id_slot_cap;
+
+  uint32_t ord_next;      // last topological key handed out
+  int graph_dirty;        // links / keys must be rebuilt before use
+  int dangling;           // tasks whose prerequisite isn't in the store
+
+  int journal_entries;
+  uint64_t gen;           // snapshot generation the journal belongs to
+  long long seq;          // caller's write counter this state corresponds to (-1 unknown)
+  uint64_t digest;        // XOR of tm_task_hash over the tasks (see "Consistency digest")
+} TmHeader;
+
+// One independent task set (e.g. one user's tasks).
+struct TmStore {
+  TmHeader* h;
+  Task* tasks;
+  char* names;
+  uint32_t* cat_names;    // category index -> offset into names
+  int* cat_slots;         // open addressing: index + 1, 0 = empty
+  int* id_slots;          // task id -> index + 1, same scheme
+
+  int shared;
+  void* map;
+  size_t map_size;
+#ifdef _WIN32
+  HANDLE mapping;
+  HANDLE mutex;
+#else
+  char* shm_name;         // shared: the POSIX object, unlinked by the last handle
+#endif
+
+  // Persistence: see the "Snapshot + journal" section at the bottom. The
+  // FILE* is per process; a shared store's writers all append to one file.
+  FILE* journal;
+  char* journal_path;
+  uint64_t journal_gen;
+  int journal_batch;      // set by bulk writes: they flush once, before unlocking
+};
+
+static void tm_lock(TmStore* s, int exclusive) {
+  if (!s->shared) {
+#ifdef _WIN32
+    if (exclusive) AcquireSRWLockExclusive(&s->h->rwlock);
+    else AcquireSRWLockShared(&s->h->rwlock);
+#else
+    if (exclusive) pthread_rwlock_wrlock(&s->h->rwlock);
+    else pthread_rwlock_rdlock(&s->h->rwlock);
+#endif
+    return;
+  }
+#ifdef _WIN32
+  DWORD r = WaitForSingleObject(s->mutex, INFINITE);
+  int owner_died = r == WAIT_ABANDONED;
+#else
+  int owner_died = pthread_mutex_lock(&s->h->mutex) == EOWNERDEAD;
+  if (owner_died) pthread_mutex_consistent(&s->h->mutex);
+#endif
+  // The previous holder died mid-call: its change may be half applied.
+  // seq -1 never matches the database, so the next open resyncs.
+  if (owner_died) s->h->seq = -1;
+}
+
+static void tm_unlock(TmStore* s, int exclusive) {
+  if (!s->shared) {
+#ifdef _WIN32
+    if (exclusive) ReleaseSRWLockExclusive(&s->h->rwlock);
+    else ReleaseSRWLockShared(&s->h->rwlock);
+#else
+    (void)exclusive;
+    pthread_rwlock_unlock(&s->h->rwlock);
+#endif
+    return;
+  }
+#ifdef _WIN32
+  (void)exclusive;
+  ReleaseMutex(s->mutex);
+#else
+  (void)exclusive;
+  pthread_mutex_unlock(&s->h->mutex);
+#endif
+}
+
+#define TM_RDLOCK(s)   tm_lock(s, 0)
+#define TM_RDUNLOCK(s) tm_unlock(s, 0)
+#define TM_WRLOCK(s)   tm_lock(s, 1)
+#define TM_WRUNLOCK(s) tm_unlock(s, 1)
+
+static int tm_alloc_id(TmStore* s) {
+  return __atomic_fetch_add(&s->h->next_id, 1, __ATOMIC_SEQ_CST);
+}
+
+// Makes sure future ids are > id (for ids that come from SQLite / replay).
+static void tm_bump_next_id(TmStore* s, int id) {
+  int cur = __atomic_load_n(&s->h->next_id, __ATOMIC_SEQ_CST);
+  while (cur <= id &&
+         !__atomic_compare_exchange_n(&s->h->next_id, &cur, id + 1, 0, __ATOMIC_SEQ_CST, __ATOMIC_SEQ_CST)) {
+  }
+}
+
+static void tm_journal_add(TmStore* s, const Task* t);
+static void tm_journal_update(TmStore* s, int id, const char* name, const char* category,
+                              int priority, int has_day, int32_t day, int has_min, int start_min,
+                              int duration_mins, int status, int depends_on, int stress);
+static void tm_journal_delete(TmStore* s, int id);
 
 static char* tm_strdup(const char* s) {
   if (!s) {
@@ -31,109 +202,882 @@ static char* tm_strdup(const char* s) {
   return out;
 }
 
-static void tm_free_task(Task* t) {
-  if (!t) return;
-  free(t->name);
-  free(t->category);
-  free(t->deadline);
-  free(t->start_time);
-  t->name = t->category = t->deadline = t->start_time = NULL;
+// Grows a private store's array to hold `need` items. Shared stores are
+// sized once when the segment is created, so for them this only checks.
+static int tm_grow(TmStore* s, void** arr, int* cap, int need, size_t item, int first) {
+  if (*cap >= need) return 1;
+  if (s->shared) return 0;
+  int nc = *cap ? *cap : first;
+  while (nc < need) nc *= 2;
+  void* p = realloc(*arr, item * (size_t)nc);
+  if (!p) return 0;
+  *arr = p;
+  *cap = nc;
+  return 1;
+}
+
+// -----------------------------
+// Packed dates / times
+// -----------------------------
+static int tm_digits(const char* s, int n) {
+  int v = 0;
+  for (int i = 0; i < n; i++) {
+    if (s[i] < '0' || s[i] > '9') return -1;
+    v = v * 10 + (s[i] - '0');
+  }
+  return v;
+}
+
+// "YYYY-MM-DD" -> days since 1970-01-01 (proleptic Gregorian).
+static int32_t tm_parse_day(const char* s) {
+  if (!s || strlen(s) != 10 || s[4] != '-' || s[7] != '-') return TM_NO_DAY;
+  int y = tm_digits(s, 4), m = tm_digits(s + 5, 2), d = tm_digits(s + 8, 2);
+  if (y < 0 || m < 1 || m > 12 || d < 1 || d > 31) return TM_NO_DAY;
+
+  y -= m <= 2;
+  int era = (y >= 0 ? y : y - 399) / 400;
+  int yoe = y - era * 400;
+  int doy = (153 * (m + (m > 2 ? -3 : 9)) + 2) / 5 + d - 1;
+  int doe = yoe * 365 + yoe / 4 - yoe / 100 + doy;
+  return (int32_t)(era * 146097 + doe - 719468);
+}
+
+// "HH:MM" -> minutes since midnight.
+static int tm_parse_min(const char* s) {
+  if (!s || strlen(s) != 5 || s[2] != ':') return TM_NO_MIN;
+  int h = tm_digits(s, 2), m = tm_digits(s + 3, 2);
+  if (h < 0 || h > 23 || m < 0 || m > 59) return TM_NO_MIN;
+  return h * 60 + m;
+}
+
+// -----------------------------
+// Name heap
+// -----------------------------
+// Names are never edited in place, so they are bump-allocated. Deleted names
+// become garbage; the heap is compacted once garbage outweighs live bytes
+// (or, for a fixed-size shared heap, when it is full).
+#define TM_NAMES_CHUNK (64 * 1024)
+#define TM_NAMES_COMPACT_MIN (1024 * 1024)
+#define TM_NO_NAME UINT32_MAX
+
+static void tm_names_compact(TmStore* s);
+
+static uint32_t tm_names_put(TmStore* s, const char* str) {
+  size_t n = strlen(str) + 1;
+  TmHeader* h = s->h;
+  if (n > UINT32_MAX - h->names_used) return TM_NO_NAME;
+
+  if (h->names_used + n > h->names_cap) {
+    // full: compact first if garbage outweighs live bytes, rather than
+    // growing a heap that renames keep filling with dead names
+    uint32_t garbage = h->names_used - h->names_live;
+    if (s->shared || (garbage && garbage >= h->names_live)) tm_names_compact(s);
+    if (s->shared) {
+      if (h->names_used + n > h->names_cap) return TM_NO_NAME;
+    } else if (h->names_used + n > h->names_cap) {
+      size_t nc = h->names_cap ? (size_t)h->names_cap : TM_NAMES_CHUNK;
+      while (nc < h->names_used + n) nc *= 2;
+      if (nc > UINT32_MAX) nc = UINT32_MAX;
+      char* p = (char*)realloc(s->names, nc);
+      if (!p) return TM_NO_NAME;
+      s->names = p;
+      h->names_cap = (uint32_t)nc;
+    }
+  }
+  uint32_t off = h->names_used;
+  memcpy(s->names + off, str, n);
+  h->names_used += (uint32_t)n;
+  h->names_live += (uint32_t)n;
+  return off;
+}
+
+static void tm_names_release(TmStore* s, uint32_t off) {
+  s->h->names_live -= (uint32_t)strlen(s->names + off) + 1;
+}
+
+// Rewrites the heap with only live strings (categories first, then names).
+static void tm_names_compact(TmStore* s) {
+  TmHeader* h = s->h;
+  char* tmp = (char*)malloc(h->names_live ? h->names_live : 1);
+  if (!tmp) return;  // OOM: keep the old heap
+  uint32_t used = 0;
+
+  for (int i = 0; i < h->cat_count; i++) {
+    const char* str = s->names + s->cat_names[i];
+    size_t n = strlen(str) + 1;
+    memcpy(tmp + used, str, n);
+    s->cat_names[i] = used;
+    used += (uint32_t)n;
+  }
+  for (int i = 0; i < h->count; i++) {
+    const char* str = s->names + s->tasks[i].name;
+    size_t n = strlen(str) + 1;
+    memcpy(tmp + used, str, n);
+    s->tasks[i].name = used;
+    used += (uint32_t)n;
+  }
+
+  memcpy(s->names, tmp, used);
+  free(tmp);
+  h->names_used = h->names_live = used;
+
+  if (!s->shared && h->names_cap > 2 * (used + TM_NAMES_CHUNK)) {
+    uint32_t nc = used + TM_NAMES_CHUNK;
+    char* p = (char*)realloc(s->names, nc);
+    if (p) {
+      s->names = p;
+      h->names_cap = nc;
+    }
+  }
+}
+
+static void tm_names_maybe_compact(TmStore* s) {
+  uint32_t garbage = s->h->names_used - s->h->names_live;
+  if (garbage < TM_NAMES_COMPACT_MIN || garbage < s->h->names_live) return;
+  tm_names_compact(s);
+}
+
+// -----------------------------
+// Interned categories
+// -----------------------------
+static uint32_t tm_hash_str(const char* s) {
+  uint32_t h = 2166136261u;
+  while (*s) {
+    h ^= (unsigned char)*s++;
+    h *= 16777619u;
+  }
+  return h;
+}
+
+static const char* tm_category_name(TmStore* s, int idx) {
+  return s->names + s->cat_names[idx];
+}
+
+static int tm_cat_rehash(TmStore* s, int slot_cap) {
+  int* slots = (int*)calloc((size_t)slot_cap, sizeof(int));
+  if (!slots) return 0;
+  for (int i = 0; i < s->h->cat_count; i++) {
+    uint32_t h = tm_hash_str(tm_category_name(s, i)) & (uint32_t)(slot_cap - 1);
+    while (slots[h]) h = (h + 1) & (uint32_t)(slot_cap - 1);
+    slots[h] = i + 1;
+  }
+  free(s->cat_slots);
+  s->cat_slots = slots;
+  s->h->cat_slot_cap = slot_cap;
+  return 1;
+}
+
+// Returns the category index, or -1 on OOM / table full.
+static int tm_intern_category(TmStore* s, const char* name) {
+  TmHeader* h = s->h;
+  if (!name || !*name) name = "general";
+
+  if (h->cat_slot_cap) {
+    uint32_t slot = tm_hash_str(name) & (uint32_t)(h->cat_slot_cap - 1);
+    while (s->cat_slots[slot]) {
+      int idx = s->cat_slots[slot] - 1;
+      if (strcmp(tm_category_name(s, idx), name) == 0) return idx;
+      slot = (slot + 1) & (uint32_t)(h->cat_slot_cap - 1);
+    }
+  }
+
+  if (h->cat_count >= TM_MAX_CATEGORIES) return -1;
+  if (!tm_grow(s, (void**)&s->cat_names, &h->cat_cap, h->cat_count + 1, sizeof(uint32_t), 16)) return -1;
+  // keep load factor <= 1/2 (shared stores are created with room for every category)
+  if ((h->cat_count + 1) * 2 > h->cat_slot_cap && !s->shared &&
+      !tm_cat_rehash(s, h->cat_slot_cap ? h->cat_slot_cap * 2 : 32)) {
+    return -1;
+  }
+  uint32_t off = tm_names_put(s, name);
+  if (off == TM_NO_NAME) return -1;
+
+  s->cat_names[h->cat_count++] = off;
+  uint32_t slot = tm_hash_str(name) & (uint32_t)(h->cat_slot_cap - 1);
+  while (s->cat_slots[slot]) slot = (slot + 1) & (uint32_t)(h->cat_slot_cap - 1);
+  s->cat_slots[slot] = h->cat_count;
+  return h->cat_count - 1;
 }
 
-static void tm_ensure_cap(int need) {
-  if (g_cap >= need) return;
-  int new_cap = g_cap == 0 ? 16 : g_cap * 2;
-  while (new_cap < need) new_cap *= 2;
-  Task* nt = (Task*)realloc(g_tasks, sizeof(Task) * new_cap);
-  if (!nt) return; // OOM: leave as-is (caller will fail later gracefully)
-  g_tasks = nt;
-  g_cap = new_cap;
+// -----------------------------
+// Store
+// -----------------------------
+static int tm_ensure_cap(TmStore* s, int need) {
+  return tm_grow(s, (void**)&s->tasks, &s->h->task_cap, need, sizeof(Task), 16);
 }
 
-static int tm_find_index_by_id(int id) {
-  for (int i = 0; i < g_count; i++) {
-    if (g_tasks[i].id == id) return i;
+// id -> index: open addressing over id_slots (index + 1, 0 = empty) at load
+// factor <= 1/2. Indexes move on swap-delete; ids never do.
+static uint32_t tm_hash_id(int id) {
+  uint32_t x = (uint32_t)id;
+  x ^= x >> 16;
+  x *= 0x7feb352du;
+  x ^= x >> 15;
+  x *= 0x846ca68bu;
+  x ^= x >> 16;
+  return x;
+}
+
+static int tm_find_index_by_id(TmStore* s, int id) {
+  if (!s->h->id_slot_cap) return -1;
+  uint32_t mask = (uint32_t)s->h->id_slot_cap - 1;
+  for (uint32_t i = tm_hash_id(id) & mask; s->id_slots[i]; i = (i + 1) & mask) {
+    int idx = s->id_slots[i] - 1;
+    if (s->tasks[idx].id == id) return idx;
   }
   return -1;
 }
 
-TM_API void tm_init(void) {
-  // nothing special; lazy init
-  if (!g_tasks) {
-    g_tasks = NULL;
-    g_count = 0;
-    g_cap = 0;
-    g_next_id = 1;
+static Task* tm_task_by_id(TmStore* s, int id) {
+  int idx = id > 0 ? tm_find_index_by_id(s, id) : -1;
+  return idx < 0 ? NULL : &s->tasks[idx];
+}
+
+// Points id's slot at idx (adding the slot if id is new).
+static void tm_idmap_put(TmStore* s, int id, int idx) {
+  uint32_t mask = (uint32_t)s->h->id_slot_cap - 1;
+  uint32_t i = tm_hash_id(id) & mask;
+  while (s->id_slots[i] && s->tasks[s->id_slots[i] - 1].id != id) i = (i + 1) & mask;
+  s->id_slots[i] = idx + 1;
+}
+
+// Backward-shift delete, so lookups never have to skip tombstones.
+static void tm_idmap_remove(TmStore* s, int id) {
+  uint32_t mask = (uint32_t)s->h->id_slot_cap - 1;
+  uint32_t i = tm_hash_id(id) & mask;
+  while (s->id_slots[i] && s->tasks[s->id_slots[i] - 1].id != id) i = (i + 1) & mask;
+  if (!s->id_slots[i]) return;
+  for (uint32_t j = (i + 1) & mask; s->id_slots[j]; j = (j + 1) & mask) {
+    uint32_t home = tm_hash_id(s->tasks[s->id_slots[j] - 1].id) & mask;
+    // the entry at j stays put if its home slot lies in (i, j]
+    if (i <= j ? (i < home && home <= j) : (i < home || home <= j)) continue;
+    s->id_slots[i] = s->id_slots[j];
+    i = j;
+  }
+  s->id_slots[i] = 0;
+}
+
+static int tm_idmap_rehash(TmStore* s, int slot_cap) {
+  int* slots = (int*)calloc((size_t)slot_cap, sizeof(int));
+  if (!slots) return 0;
+  free(s->id_slots);
+  s->id_slots = slots;
+  s->h->id_slot_cap = slot_cap;
+  for (int i = 0; i < s->h->count; i++) tm_idmap_put(s, s->tasks[i].id, i);
+  return 1;
+}
+
+TM_API TmStore* tm_store_create(void) {
+  TmStore* s = (TmStore*)calloc(1, sizeof(TmStore));
+  if (!s) return NULL;
+  s->h = (TmHeader*)calloc(1, sizeof(TmHeader));
+  if (!s->h) {
+    free(s);
+    return NULL;
+  }
+#ifdef _WIN32
+  InitializeSRWLock(&s->h->rwlock);
+#else
+  pthread_rwlock_init(&s->h->rwlock, NULL);
+#endif
+  s->h->next_id = 1;
+  s->h->seq = -1;
+  return s;
+}
+
+// Empties the store. Private stores give their memory back; a shared
+// segment keeps its (fixed) capacity.
+static void tm_reset_locked(TmStore* s) {
+  TmHeader* h = s->h;
+  if (!s->shared) {
+    free(s->tasks);
+    free(s->names);
+    free(s->cat_names);
+    free(s->cat_slots);
+    free(s->id_slots);
+    s->tasks = NULL;
+    s->names = NULL;
+    s->cat_names = NULL;
+    s->cat_slots = NULL;
+    s->id_slots = NULL;
+    h->task_cap = 0;
+    h->names_cap = 0;
+    h->cat_cap = 0;
+    h->cat_slot_cap = 0;
+    h->id_slot_cap = 0;
+  } else {
+    memset(s->cat_slots, 0, sizeof(int) * (size_t)h->cat_slot_cap);
+    memset(s->id_slots, 0, sizeof(int) * (size_t)h->id_slot_cap);
+  }
+  h->count = 0;
+  h->names_used = h->names_live = 0;
+  h->cat_count = 0;
+  h->ord_next = 0;
+  h->graph_dirty = 0;
+  h->dangling = 0;
+  h->seq = -1;
+  h->digest = 0;
+  __atomic_store_n(&h->next_id, 1, __ATOMIC_SEQ_CST);
+}
+
+TM_API void tm_reset(TmStore* s) {
+  TM_WRLOCK(s);
+  tm_reset_locked(s);
+  TM_WRUNLOCK(s);
+}
+
+static void tm_shm_detach(TmStore* s);
+
+// Closes the journal (it is not deleted) and frees everything. A shared
+// store is unmapped, and removed once no process has it open any more.
+TM_API void tm_store_free(TmStore* s) {
+  if (!s) return;
+  tm_journal_close(s);
+  if (s->shared) {
+    tm_shm_detach(s);
+  } else {
+    tm_reset(s);
+#ifndef _WIN32
+    pthread_rwlock_destroy(&s->h->rwlock);
+#endif
+    free(s->h);
+  }
+  free(s);
+}
+
+TM_API long long tm_store_bytes(TmStore* s) {
+  TM_RDLOCK(s);
+  TmHeader* h = s->h;
+  long long n = (long long)sizeof(TmStore) + (long long)sizeof(TmHeader);
+  if (s->shared) {
+    // pages actually touched, not the reserved segment size
+    n += (long long)h->count * (long long)(sizeof(Task) + 2 * sizeof(int)) + (long long)h->names_used +
+         (long long)h->cat_count * (long long)sizeof(uint32_t);
+  } else {
+    n += (long long)h->task_cap * (long long)sizeof(Task) + (long long)h->names_cap +
+         (long long)h->cat_cap * (long long)sizeof(uint32_t) +
+         (long long)(h->cat_slot_cap + h->id_slot_cap) * (long long)sizeof(int);
+  }
+  TM_RDUNLOCK(s);
+  return n;
+}
+
+TM_API long long tm_store_seq(TmStore* s) {
+  TM_RDLOCK(s);
+  long long seq = s->h->seq;
+  TM_RDUNLOCK(s);
+  return seq;
+}
+
+// A successful write moves the store past the caller's counter: one step per
+// row the database changed for it.
+static void tm_bump_seq(TmStore* s, int steps) {
+  if (s->h->seq >= 0) s->h->seq += steps;
+}
+
+// -----------------------------
+// Consistency digest
+// -----------------------------
+// h->digest is the XOR of one 64-bit hash per task, so it doesn't depend on
+// order and a write only has to take the old row's hash out and put the new
+// one in (every place that changes a hashed field goes through
+// tm_digest_flip before and after). The database computes the same hash in
+// plain SQL inside its triggers (consistency.hash_sql), so it only uses
+// arithmetic SQLite can do on signed 64-bit integers without overflowing:
+// two 32-bit lanes, each a polynomial over the fields (x = (x + v) * prime)
+// finished with murmur3's fmix32, as the high and low halves. The fields are
+// id, priority, duration_mins, status, deadline_day, start_min, depends_on,
+// stress, then the name and the category, each as its length in characters
+// and a polynomial over all of its code points (seed TM_TEXT_SEED, same
+// step), so any edit to the text changes the hash. status and stress are
+// hashed as stored (a byte); consistency.py hashes SQLite's values as they
+// are, so one that doesn't fit shows up as a difference.
+#define TM_HASH_TERMS (8 + 2 * 2)
+#define TM_TEXT_SEED 0x2545F491u
+#define TM_TEXT_PRIME 0x01000193u
+
+// Next code point of a UTF-8 string, decoded the way SQLite's length(),
+// substr() and unicode() do (malformed sequences included).
+static uint32_t tm_utf8_next(const unsigned char** p) {
+  uint32_t c = *(*p)++;
+  if (c < 0xC0) return c;
+  c &= c < 0xE0 ? 0x1F : c < 0xF0 ? 0x0F : c < 0xF8 ? 0x07 : c < 0xFC ? 0x03 : c < 0xFE ? 0x01 : 0;
+  while ((**p & 0xC0) == 0x80) c = (c << 6) + (*(*p)++ & 0x3F);
+  if (c < 0x80 || (c & 0xFFFFF800u) == 0xD800 || (c & 0xFFFFFFFEu) == 0xFFFE) c = 0xFFFD;
+  return c;
+}
+
+// length(s), then x = (x + unicode(substr(s, k, 1))) * prime for k = 1..length(s).
+static uint32_t* tm_hash_text(uint32_t* v, const char* str) {
+  uint32_t x = TM_TEXT_SEED, n = 0;
+  const unsigned char* p = (const unsigned char*)str;
+  while (*p) {
+    x = (x + tm_utf8_next(&p)) * TM_TEXT_PRIME;
+    n++;
+  }
+  *v++ = n;
+  *v++ = x;
+  return v;
+}
+
+static uint32_t tm_fmix32(uint32_t h) {
+  h ^= h >> 16;
+  h *= 0x85EBCA6Bu;
+  h ^= h >> 13;
+  h *= 0xC2B2AE35u;
+  h ^= h >> 16;
+  return h;
+}
+
+static uint64_t tm_task_hash(TmStore* s, const Task* t) {
+  uint32_t v[TM_HASH_TERMS] = {(uint32_t)t->id, (uint32_t)t->priority, (uint32_t)t->duration_mins, t->status,
+                               (uint32_t)t->deadline_day, (uint32_t)(int32_t)t->start_min,
+                               (uint32_t)(t->depends_on > 0 ? t->depends_on : 0), t->stress};
+  tm_hash_text(tm_hash_text(v + 8, s->names + t->name), tm_category_name(s, t->category));
+
+  uint32_t a = 0x811C9DC5u, b = 0x9E3779B9u;
+  for (int i = 0; i < TM_HASH_TERMS; i++) {
+    a = (a + v[i]) * 0x01000193u;
+    b = (b + v[i]) * 0x2C1B3C6Du;
+  }
+  return (uint64_t)tm_fmix32(a) << 32 | tm_fmix32(b);
+}
+
+// Takes t out of the digest, or puts it back after a change.
+static void tm_digest_flip(TmStore* s, const Task* t) {
+  s->h->digest ^= tm_task_hash(s, t);
+}
+
+// -----------------------------
+// Dependency graph
+// -----------------------------
+// A task has at most one prerequisite (depends_on), so the graph is a forest.
+// Dependents are threaded through first_child / next_sibling / prev_sibling
+// by id. `ord` is a topological key, kept incrementally: a new task takes the
+// next key, and re-pointing a dependency only renumbers the tasks whose keys
+// lie between the two ends (Pearce-Kelly). Loading can meet a dependent before
+// its prerequisite; that marks the graph dirty and the next operation that
+// needs the links rebuilds them in O(n). Every walk is iterative, so a chain
+// can be as deep as the store is big.
+typedef struct {
+  uint32_t ord;
+  int idx;
+} TmOrdIdx;
+
+static int tm_cmp_ord(const void* a, const void* b) {
+  uint32_t x = ((const TmOrdIdx*)a)->ord, y = ((const TmOrdIdx*)b)->ord;
+  return x < y ? -1 : x > y;
+}
+
+static int tm_cmp_u32(const void* a, const void* b) {
+  uint32_t x = *(const uint32_t*)a, y = *(const uint32_t*)b;
+  return x < y ? -1 : x > y;
+}
+
+static void tm_link_child(TmStore* s, Task* parent, Task* child) {
+  Task* first = tm_task_by_id(s, parent->first_child);
+  if (first) first->prev_sibling = child->id;
+  child->prev_sibling = 0;
+  child->next_sibling = parent->first_child;
+  parent->first_child = child->id;
+}
+
+// Takes `child` out of its prerequisite's list (depends_on is left alone).
+static void tm_unlink_child(TmStore* s, Task* child) {
+  Task* prev = tm_task_by_id(s, child->prev_sibling);
+  Task* next = tm_task_by_id(s, child->next_sibling);
+  if (prev) {
+    prev->next_sibling = child->next_sibling;
+  } else {
+    Task* parent = tm_task_by_id(s, child->depends_on);
+    if (parent && parent->first_child == child->id) parent->first_child = child->next_sibling;
+  }
+  if (next) next->prev_sibling = child->prev_sibling;
+  child->prev_sibling = child->next_sibling = 0;
+}
+
+// 1 if task `id` is `anc` or (transitively) depends on it. Follows
+// depends_on, so it is exact even while the links are dirty; the step bound
+// only trips on a cycle already present in loaded data.
+static int tm_depends_on(TmStore* s, int id, int anc) {
+  for (int steps = 0; steps <= s->h->count; steps++) {
+    if (id == anc) return 1;
+    Task* t = tm_task_by_id(s, id);
+    if (!t) return 0;
+    id = t->depends_on;
+  }
+  return 1;
+}
+
+// Numbers the subtree under tasks[root] in preorder (prerequisites first).
+static void tm_graph_number(TmStore* s, int root, int* stack, uint32_t* next) {
+  int top = 0;
+  stack[top++] = root;
+  while (top) {
+    Task* t = &s->tasks[stack[--top]];
+    t->ord = ++*next;
+    for (Task* c = tm_task_by_id(s, t->first_child); c; c = tm_task_by_id(s, c->next_sibling)) {
+      stack[top++] = (int)(c - s->tasks);
+    }
+  }
+}
+
+static void tm_graph_rebuild(TmStore* s) {
+  TmHeader* h = s->h;
+  int n = h->count;
+  int* stack = (int*)malloc(sizeof(int) * (size_t)(n ? n : 1));
+  if (!stack) return;  // OOM: stays dirty, retried next time
+
+  for (int i = 0; i < n; i++) {
+    Task* t = &s->tasks[i];
+    t->first_child = t->next_sibling = t->prev_sibling = 0;
+    t->ord = 0;
+  }
+  h->dangling = 0;
+  for (int i = 0; i < n; i++) {
+    Task* t = &s->tasks[i];
+    Task* parent = tm_task_by_id(s, t->depends_on);
+    if (parent == t) {
+      tm_digest_flip(s, t);
+      t->depends_on = 0;
+      tm_digest_flip(s, t);
+    } else if (parent) {
+      tm_link_child(s, parent, t);
+    }
+    else if (t->depends_on) h->dangling++;
+  }
+
+  // Roots have no prerequisite in the store; ord 0 = not numbered yet.
+  uint32_t next = 0;
+  for (int i = 0; i < n; i++) {
+    if (!tm_task_by_id(s, s->tasks[i].depends_on)) tm_graph_number(s, i, stack, &next);
+  }
+  // Anything left hangs off a cycle, which only data written around the API
+  // can contain. n steps up from such a task is on the cycle; cutting that
+  // task's edge turns it into a root.
+  for (int i = 0; i < n; i++) {
+    if (s->tasks[i].ord) continue;
+    Task* t = &s->tasks[i];
+    for (int k = 0; k < n; k++) t = tm_task_by_id(s, t->depends_on);
+    tm_unlink_child(s, t);
+    tm_digest_flip(s, t);
+    t->depends_on = 0;
+    tm_digest_flip(s, t);
+    tm_graph_number(s, (int)(t - s->tasks), stack, &next);
+  }
+
+  free(stack);
+  h->ord_next = next;
+  h->graph_dirty = 0;
+}
+
+static void tm_graph_ensure(TmStore* s) {
+  if (s->h->graph_dirty) tm_graph_rebuild(s);
+}
+
+// Links and numbers a task that was just appended. A task can't have
+// dependents yet unless one was loaded ahead of it (h->dangling).
+static void tm_graph_attach(TmStore* s, Task* t) {
+  TmHeader* h = s->h;
+  if (h->graph_dirty) return;
+  Task* parent = tm_task_by_id(s, t->depends_on);
+  if ((t->depends_on && !parent) || h->dangling || h->ord_next == UINT32_MAX) {
+    h->graph_dirty = 1;
+    return;
+  }
+  if (parent) tm_link_child(s, parent, t);
+  t->ord = ++h->ord_next;
+}
+
+// `child` now depends on `parent` but sits before it in key order. Only
+// child's subtree below parent->ord and parent's prerequisites above
+// child->ord can be out of place; they swap into the same pool of keys,
+// prerequisites first.
+static void tm_graph_reorder(TmStore* s, Task* parent, Task* child) {
+  uint32_t lo = child->ord, hi = parent->ord;
+  size_t n = (size_t)s->h->count;
+  TmOrdIdx* set = (TmOrdIdx*)malloc(sizeof(TmOrdIdx) * n);
+  uint32_t* keys = (uint32_t*)malloc(sizeof(uint32_t) * n);
+  int* stack = (int*)malloc(sizeof(int) * n);
+
+  if (set && keys && stack) {
+    int nb = 0;
+    for (Task* a = parent; a && a->ord > lo; a = tm_task_by_id(s, a->depends_on)) {
+      set[nb].ord = a->ord;
+      set[nb++].idx = (int)(a - s->tasks);
+    }
+    int nf = nb, top = 0;
+    stack[top++] = (int)(child - s->tasks);
+    while (top) {
+      Task* t = &s->tasks[stack[--top]];
+      set[nf].ord = t->ord;
+      set[nf++].idx = (int)(t - s->tasks);
+      for (Task* c = tm_task_by_id(s, t->first_child); c; c = tm_task_by_id(s, c->next_sibling)) {
+        if (c->ord < hi) stack[top++] = (int)(c - s->tasks);
+      }
+    }
+
+    qsort(set, (size_t)nb, sizeof *set, tm_cmp_ord);
+    qsort(set + nb, (size_t)(nf - nb), sizeof *set, tm_cmp_ord);
+    for (int i = 0; i < nf; i++) keys[i] = set[i].ord;
+    qsort(keys, (size_t)nf, sizeof *keys, tm_cmp_u32);
+    for (int i = 0; i < nf; i++) s->tasks[set[i].idx].ord = keys[i];
+  } else {
+    s->h->graph_dirty = 1;  // OOM: renumber from scratch later
   }
+  free(set);
+  free(keys);
+  free(stack);
 }
 
-TM_API void tm_reset(void) {
-  for (int i = 0; i < g_count; i++) {
-    tm_free_task(&g_tasks[i]);
+// Re-points t's prerequisite. 1 ok, -2 it would close a cycle, -3 no such task.
+static int tm_set_depends(TmStore* s, Task* t, int dep) {
+  if (dep == t->depends_on) return 1;
+  Task* parent = NULL;
+  if (dep) {
+    parent = tm_task_by_id(s, dep);
+    if (!parent) return -3;
+    if (tm_depends_on(s, dep, t->id)) return -2;
+  }
+
+  tm_graph_ensure(s);
+  if (s->h->graph_dirty) {
+    t->depends_on = dep;
+    return 1;
   }
-  free(g_tasks);
-  g_tasks = NULL;
-  g_count = 0;
-  g_cap = 0;
-  g_next_id = 1;
+  tm_unlink_child(s, t);
+  t->depends_on = dep;
+  if (parent) {
+    tm_link_child(s, parent, t);
+    if (parent->ord > t->ord) tm_graph_reorder(s, parent, t);
+  }
+  return 1;
 }
 
+// -----------------------------
+// Writes
+// -----------------------------
 static int tm_add_internal(
+  TmStore* s,
   int id,
   const char* name,
-  const char* category,
+  int category,
   int priority,
-  const char* deadline,
-  const char* start_time,
+  int32_t deadline_day,
+  int start_min,
   int duration_mins,
   int status,
+  int depends_on,
+  int stress,
   int force_id
 ) {
-  if (!name || strlen(name) == 0) return -1;
-
-  tm_ensure_cap(g_count + 1);
-  if (g_cap < g_count + 1) return -1;
+  TmHeader* h = s->h;
+  if (!name || strlen(name) == 0 || category < 0) return -1;
+  if (!tm_ensure_cap(s, h->count + 1)) return -1;
+  // shared stores are created with room for max_tasks ids
+  if ((h->count + 1) * 2 > h->id_slot_cap && !s->shared &&
+      !tm_idmap_rehash(s, h->id_slot_cap ? h->id_slot_cap * 2 : 32)) {
+    return -1;
+  }
 
   Task t;
   memset(&t, 0, sizeof(Task));
 
+  t.name = tm_names_put(s, name);
+  if (t.name == TM_NO_NAME) return -1;
+
   if (force_id) {
     t.id = id;
-    if (id >= g_next_id) g_next_id = id + 1;
+    tm_bump_next_id(s, id);
   } else {
-    t.id = g_next_id++;
+    t.id = tm_alloc_id(s);
   }
 
-  t.name = tm_strdup(name);
-  t.category = tm_strdup(category ? category : "general");
+  t.category = (uint16_t)category;
   t.priority = priority;
-  t.deadline = tm_strdup(deadline ? deadline : "");
-  t.start_time = tm_strdup(start_time ? start_time : "");
+  t.deadline_day = deadline_day;
+  t.start_min = (int16_t)start_min;
   t.duration_mins = duration_mins;
-  t.status = status;
+  t.status = (uint8_t)status;
+  t.depends_on = depends_on > 0 ? depends_on : 0;
+  t.stress = (uint8_t)stress;
 
-  if (!t.name || !t.category || !t.deadline || !t.start_time) {
-    tm_free_task(&t);
-    return -1;
+  int idx = h->count++;
+  s->tasks[idx] = t;
+  tm_idmap_put(s, t.id, idx);
+  tm_graph_attach(s, &s->tasks[idx]);
+  tm_digest_flip(s, &s->tasks[idx]);
+  return t.id;
+}
+
+// Returns 1 if updated, 0 if id is unknown, tm_set_depends' error, or -4 if
+// a shared heap has no room for the new name (and then nothing was changed). name NULL / category -1 keep the current one.
+static int tm_update_internal(
+  TmStore* s,
+  int id,
+  const char* name,
+  int category,
+  int priority,
+  int has_day,
+  int32_t deadline_day,
+  int has_min,
+  int start_min,
+  int duration_mins,
+  int status,
+  int depends_on,
+  int stress
+) {
+  int idx = tm_find_index_by_id(s, id);
+  if (idx < 0) return 0;
+
+  // a pending rebuild may cut edges (and re-hash tasks) itself: not in the middle of this
+  tm_graph_ensure(s);
+  Task* t = &s->tasks[idx];
+  uint64_t before = tm_task_hash(s, t);
+
+  // the name goes in first: it is the step that can run out of room, and an
+  // unused one is only garbage if the dependency is refused after it
+  uint32_t off = TM_NO_NAME;
+  if (name && *name && strcmp(name, s->names + t->name) != 0) {
+    off = tm_names_put(s, name);  // may compact: offsets move, t doesn't
+    if (off == TM_NO_NAME) return -4;
   }
+  if (depends_on != -1) {
+    int r = tm_set_depends(s, t, depends_on);
+    if (r < 0) {
+      if (off != TM_NO_NAME) tm_names_release(s, off);
+      return r;
+    }
+  }
+  if (off != TM_NO_NAME) {
+    tm_names_release(s, t->name);
+    t->name = off;
+  }
+  if (category >= 0) t->category = (uint16_t)category;
+  if (priority != -1) t->priority = priority;
+  if (duration_mins != -1) t->duration_mins = duration_mins;
+  if (status != -1) t->status = (uint8_t)status;
+  if (stress != -1) t->stress = (uint8_t)stress;
+  if (has_day) t->deadline_day = deadline_day;
+  if (has_min) t->start_min = (int16_t)start_min;
 
-  g_tasks[g_count++] = t;
-  return t.id;
+  s->h->digest ^= before ^ tm_task_hash(s, t);
+  return 1;
+}
+
+static int tm_add_with_id_internal(
+  TmStore* s,
+  int id,
+  const char* name,
+  int category,
+  int priority,
+  int32_t deadline_day,
+  int start_min,
+  int duration_mins,
+  int status,
+  int depends_on,
+  int stress
+) {
+  if (id <= 0) return -1;
+
+  // If already exists, we update it instead of duplicating.
+  int idx = tm_find_index_by_id(s, id);
+  if (idx >= 0) {
+    tm_update_internal(s, id, name, category, priority, 1, deadline_day, 1, start_min, duration_mins,
+                       status, -1, stress);
+    Task* t = &s->tasks[idx];
+    tm_graph_ensure(s);
+    tm_digest_flip(s, t);
+    if (tm_set_depends(s, t, depends_on > 0 ? depends_on : 0) < 0) {
+      // The database says so: keep it and let the rebuild cut the cycle.
+      tm_unlink_child(s, t);
+      t->depends_on = depends_on;
+      s->h->graph_dirty = 1;
+    }
+    tm_digest_flip(s, t);
+    tm_bump_next_id(s, id);
+    return id;
+  }
+
+  return tm_add_internal(s, id, name, category, priority, deadline_day, start_min, duration_mins,
+                         status, depends_on, stress, 1);
+}
+
+// Returns 1 + the number of dependents that lost their prerequisite (the
+// database's delete trigger clears the same rows), or 0 if id is unknown.
+static int tm_delete_internal(TmStore* s, int id) {
+  int idx = tm_find_index_by_id(s, id);
+  if (idx < 0) return 0;
+
+  tm_graph_ensure(s);
+  Task* t = &s->tasks[idx];
+  int steps = 1;
+  tm_digest_flip(s, t);
+  if (s->h->graph_dirty) {
+    for (int i = 0; i < s->h->count; i++) {
+      if (s->tasks[i].depends_on == id && i != idx) {
+        tm_digest_flip(s, &s->tasks[i]);
+        s->tasks[i].depends_on = 0;
+        tm_digest_flip(s, &s->tasks[i]);
+        steps++;
+      }
+    }
+  } else {
+    Task* c = tm_task_by_id(s, t->first_child);
+    while (c) {
+      Task* next = tm_task_by_id(s, c->next_sibling);
+      tm_digest_flip(s, c);
+      c->depends_on = 0;
+      tm_digest_flip(s, c);
+      c->prev_sibling = c->next_sibling = 0;
+      steps++;
+      c = next;
+    }
+    t->first_child = 0;
+    tm_unlink_child(s, t);
+  }
+
+  tm_names_release(s, t->name);
+  tm_idmap_remove(s, id);
+
+  // swap-delete
+  int last = --s->h->count;
+  if (idx != last) {
+    s->tasks[idx] = s->tasks[last];
+    tm_idmap_put(s, s->tasks[idx].id, idx);
+  }
+
+  tm_names_maybe_compact(s);
+  return steps;
 }
 
 TM_API int tm_add_task(
+  TmStore* s,
   const char* name,
   const char* category,
   int priority,
   const char* deadline,
   const char* start_time,
   int duration_mins,
-  int status
+  int status,
+  int depends_on,
+  int stress
 ) {
-  return tm_add_internal(0, name, category, priority, deadline, start_time, duration_mins, status, 0);
+  int32_t day = tm_parse_day(deadline);
+  int start_min = tm_parse_min(start_time);
+
+  TM_WRLOCK(s);
+  int id = tm_add_internal(s, 0, name, tm_intern_category(s, category), priority,
+                           day, start_min, duration_mins, status, depends_on, stress, 0);
+  if (id > 0) {
+    tm_journal_add(s, &s->tasks[s->h->count - 1]);
+    tm_bump_seq(s, 1);
+  }
+  TM_WRUNLOCK(s);
+  return id;
 }
 
 TM_API int tm_add_task_with_id(
+  TmStore* s,
   int id,
   const char* name,
   const char* category,
@@ -141,62 +1085,1012 @@ TM_API int tm_add_task_with_id(
   const char* deadline,
   const char* start_time,
   int duration_mins,
-  int status
+  int status,
+  int depends_on,
+  int stress
 ) {
-  if (id <= 0) return -1;
+  int32_t day = tm_parse_day(deadline);
+  int start_min = tm_parse_min(start_time);
 
-  // If already exists, we update it instead of duplicating.
-  int idx = tm_find_index_by_id(id);
-  if (idx >= 0) {
-    tm_update_task(id, priority, deadline, start_time, duration_mins, status);
-    if (id >= g_next_id) g_next_id = id + 1;
-    return id;
+  TM_WRLOCK(s);
+  int r = tm_add_with_id_internal(s, id, name, tm_intern_category(s, category), priority,
+                                  day, start_min, duration_mins, status, depends_on, stress);
+  if (r > 0) {
+    tm_journal_add(s, &s->tasks[tm_find_index_by_id(s, r)]);
+    tm_bump_seq(s, 1);
   }
+  TM_WRUNLOCK(s);
+  return r;
+}
 
-  return tm_add_internal(id, name, category, priority, deadline, start_time, duration_mins, status, 1);
+TM_API int tm_add_tasks_with_ids(TmStore* s, const TmTaskRow* rows, int n) {
+  int added = 0;
+  TM_WRLOCK(s);
+  s->journal_batch = 1;
+  for (int i = 0; i < n; i++) {
+    const TmTaskRow* r = &rows[i];
+    int id = tm_add_with_id_internal(s, r->id, r->name, tm_intern_category(s, r->category), r->priority,
+                                     tm_parse_day(r->deadline), tm_parse_min(r->start_time),
+                                     r->duration_mins, r->status, r->depends_on, r->stress);
+    if (id > 0) {
+      tm_journal_add(s, &s->tasks[tm_find_index_by_id(s, id)]);
+      added++;
+    }
+  }
+  s->journal_batch = 0;
+  if (s->journal) fflush(s->journal);
+  tm_bump_seq(s, added);
+  TM_WRUNLOCK(s);
+  return added;
 }
 
 TM_API int tm_update_task(
+  TmStore* s,
   int id,
+  const char* name,
+  const char* category,
   int priority,
   const char* deadline,
   const char* start_time,
   int duration_mins,
-  int status
+  int status,
+  int depends_on,
+  int stress
 ) {
-  int idx = tm_find_index_by_id(id);
-  if (idx < 0) return 0;
+  int has_day = deadline != NULL, has_min = start_time != NULL;
+  int32_t day = tm_parse_day(deadline);
+  int start_min = tm_parse_min(start_time);
 
-  Task* t = &g_tasks[idx];
+  TM_WRLOCK(s);
+  int cat = category && *category ? tm_intern_category(s, category) : -1;
+  int ok = category && *category && cat < 0
+    ? -4
+    : tm_update_internal(s, id, name, cat, priority, has_day, day, has_min, start_min, duration_mins, status,
+                         depends_on, stress);
+  if (ok > 0) {
+    tm_journal_update(s, id, name, category, priority, has_day, day, has_min, start_min,
+                      duration_mins, status, depends_on, stress);
+    tm_bump_seq(s, 1);
+  }
+  TM_WRUNLOCK(s);
+  return ok;
+}
 
-  if (priority != -1) t->priority = priority;
-  if (duration_mins != -1) t->duration_mins = duration_mins;
-  if (status != -1) t->status = status;
+TM_API int tm_delete_task(TmStore* s, int id) {
+  TM_WRLOCK(s);
+  int steps = tm_delete_internal(s, id);
+  if (steps) {
+    tm_journal_delete(s, id);
+    tm_bump_seq(s, steps);
+  }
+  TM_WRUNLOCK(s);
+  return steps > 0;
+}
+
+TM_API int tm_count(TmStore* s) {
+  TM_RDLOCK(s);
+  int n = s->h->count;
+  TM_RDUNLOCK(s);
+  return n;
+}
+
+TM_API unsigned long long tm_store_digest(TmStore* s, long long* seq, int* rows) {
+  TM_RDLOCK(s);
+  uint64_t digest = s->h->digest;
+  if (seq) *seq = s->h->seq;
+  if (rows) *rows = s->h->count;
+  TM_RDUNLOCK(s);
+  return digest;
+}
+
+static int tm_cmp_int(const void* a, const void* b) {
+  int x = *(const int*)a, y = *(const int*)b;
+  return (x > y) - (x < y);
+}
+
+static int tm_cmp_bucket(const void* a, const void* b) {
+  int x = ((const TmBucketDigest*)a)->bucket, y = ((const TmBucketDigest*)b)->bucket;
+  return (x > y) - (x < y);
+}
+
+// Only needed once the totals disagree, so it hashes every task rather than
+// keeping per-bucket digests up to date on every write.
+TM_API int tm_bucket_digests(TmStore* s, int shift, TmBucketDigest* out, int max) {
+  TM_RDLOCK(s);
+  int n = s->h->count;
+  TmBucketDigest* all = (TmBucketDigest*)malloc(sizeof(TmBucketDigest) * (size_t)(n ? n : 1));
+  if (!all) {
+    TM_RDUNLOCK(s);
+    return -1;
+  }
+  for (int i = 0; i < n; i++) {
+    all[i].bucket = s->tasks[i].id >> shift;
+    all[i].rows = 1;
+    all[i].digest = tm_task_hash(s, &s->tasks[i]);
+  }
+  TM_RDUNLOCK(s);
+
+  qsort(all, (size_t)n, sizeof *all, tm_cmp_bucket);
+  int m = 0;
+  for (int i = 0; i < n; i++) {
+    if (m && all[m - 1].bucket == all[i].bucket) {
+      all[m - 1].rows++;
+      all[m - 1].digest ^= all[i].digest;
+    } else {
+      all[m++] = all[i];
+    }
+  }
+  memcpy(out, all, sizeof *all * (size_t)(m < max ? m : max));
+  free(all);
+  return m;
+}
+
+TM_API int tm_resync_rows(TmStore* s, int lo, int hi, const TmTaskRow* rows, int n, long long expect_seq) {
+  TM_WRLOCK(s);
+  if (s->h->seq != expect_seq) {
+    TM_WRUNLOCK(s);
+    return -1;
+  }
+  // Deletes first, in id order like the database's. The ids are collected
+  // up front because a delete moves the last task into the freed slot.
+  int changed = 0, nstale = 0;
+  int* want = (int*)malloc(sizeof(int) * (size_t)(n ? n : 1));
+  int* stale = (int*)malloc(sizeof(int) * (size_t)(s->h->count ? s->h->count : 1));
+  if (want && stale) {
+    for (int k = 0; k < n; k++) want[k] = rows[k].id;
+    qsort(want, (size_t)n, sizeof *want, tm_cmp_int);
+    for (int i = 0; i < s->h->count; i++) {
+      int id = s->tasks[i].id;
+      if (id >= lo && id < hi && !bsearch(&id, want, (size_t)n, sizeof *want, tm_cmp_int)) {
+        stale[nstale++] = id;
+      }
+    }
+    qsort(stale, (size_t)nstale, sizeof *stale, tm_cmp_int);
+    for (int i = 0; i < nstale; i++) changed += tm_delete_internal(s, stale[i]) > 0;
+  }
+  free(want);
+  free(stale);
+  for (int k = 0; k < n; k++) {
+    const TmTaskRow* r = &rows[k];
+    int idx = tm_find_index_by_id(s, r->id);
+    uint64_t before = idx >= 0 ? tm_task_hash(s, &s->tasks[idx]) : 0;
+    int id = tm_add_with_id_internal(s, r->id, r->name, tm_intern_category(s, r->category), r->priority,
+                                     tm_parse_day(r->deadline), tm_parse_min(r->start_time),
+                                     r->duration_mins, r->status, r->depends_on, r->stress);
+    if (id > 0 && (idx < 0 || tm_task_hash(s, &s->tasks[idx]) != before)) changed++;
+  }
+  TM_WRUNLOCK(s);
+  return changed;
+}
+
+// Same order as GET /tasks: status, priority, deadline, start_time.
+static int tm_cmp_tasks(const void* a, const void* b) {
+  const Task* x = (const Task*)a;
+  const Task* y = (const Task*)b;
+  if (x->status != y->status) return x->status < y->status ? -1 : 1;
+  if (x->priority != y->priority) return x->priority < y->priority ? -1 : 1;
+  if (x->deadline_day != y->deadline_day) return x->deadline_day < y->deadline_day ? -1 : 1;
+  if (x->start_min != y->start_min) return x->start_min < y->start_min ? -1 : 1;
+  return 0;
+}
+
+// Sorts a private copy so it only needs the shared lock.
+TM_API int tm_sorted_ids(TmStore* s, int* out, int max) {
+  if (!out || max <= 0) return 0;
 
-  if (deadline != NULL) {
-    free(t->deadline);
-    t->deadline = tm_strdup(deadline);
-    if (!t->deadline) t->deadline = tm_strdup("");
+  TM_RDLOCK(s);
+  int count = s->h->count;
+  Task* copy = (Task*)malloc(sizeof(Task) * (size_t)(count ? count : 1));
+  if (copy && count) memcpy(copy, s->tasks, sizeof(Task) * (size_t)count);
+  TM_RDUNLOCK(s);
+  if (!copy) return 0;
+
+  qsort(copy, (size_t)count, sizeof(Task), tm_cmp_tasks);
+  int n = count < max ? count : max;
+  for (int i = 0; i < n; i++) out[i] = copy[i].id;
+  free(copy);
+  return n;
+}
+
+// One pass forward over the key order gives every task its chain (the
+// longest run of open prerequisites ending at it), one pass backward its
+// tail (the longest run of open dependents hanging off it). Done tasks
+// cost 0 minutes and unblock their dependents.
+TM_API int tm_dependency_order(TmStore* s, TmDepInfo* out, int max) {
+  if (!out || max <= 0) return 0;
+
+  TM_RDLOCK(s);
+  while (s->h->graph_dirty) {
+    TM_RDUNLOCK(s);
+    TM_WRLOCK(s);
+    tm_graph_ensure(s);
+    int dirty = s->h->graph_dirty;
+    TM_WRUNLOCK(s);
+    if (dirty) return 0;  // OOM
+    TM_RDLOCK(s);
   }
 
-  if (start_time != NULL) {
-    free(t->start_time);
-    t->start_time = tm_strdup(start_time);
-    if (!t->start_time) t->start_time = tm_strdup("");
+  int n = s->h->count;
+  size_t cap = (size_t)(n ? n : 1);
+  TmOrdIdx* order = (TmOrdIdx*)malloc(sizeof(TmOrdIdx) * cap);
+  int* pos = (int*)malloc(sizeof(int) * cap);
+  int* parent = (int*)malloc(sizeof(int) * cap);
+  long long* chain = (long long*)calloc(cap, sizeof(long long));
+  long long* tail = (long long*)calloc(cap, sizeof(long long));
+  int w = 0;
+
+  if (order && pos && parent && chain && tail) {
+    for (int i = 0; i < n; i++) {
+      order[i].ord = s->tasks[i].ord;
+      order[i].idx = i;
+    }
+    qsort(order, (size_t)n, sizeof *order, tm_cmp_ord);
+    for (int k = 0; k < n; k++) pos[order[k].idx] = k;
+
+    for (int k = 0; k < n; k++) {
+      const Task* t = &s->tasks[order[k].idx];
+      int p = t->depends_on ? tm_find_index_by_id(s, t->depends_on) : -1;
+      parent[k] = p >= 0 && s->tasks[p].status == 0 ? pos[p] : -1;
+      tail[k] = t->status == 0 && t->duration_mins > 0 ? t->duration_mins : 0;
+      chain[k] = tail[k] + (parent[k] >= 0 ? chain[parent[k]] : 0);
+    }
+    for (int k = n - 1; k >= 0; k--) {
+      int p = parent[k];
+      if (p < 0 || s->tasks[order[k].idx].status != 0) continue;
+      const Task* pt = &s->tasks[order[p].idx];
+      long long via = (pt->duration_mins > 0 ? pt->duration_mins : 0) + tail[k];
+      if (via > tail[p]) tail[p] = via;
+    }
+
+    for (int k = 0; k < n && w < max; k++) {
+      const Task* t = &s->tasks[order[k].idx];
+      if (t->status != 0) continue;
+      TmDepInfo* o = &out[w++];
+      o->id = t->id;
+      o->depends_on = parent[k] >= 0 ? s->tasks[order[parent[k]].idx].id : 0;
+      o->priority = t->priority;
+      o->duration_mins = t->duration_mins;
+      o->deadline_day = t->deadline_day;
+      o->start_min = t->start_min;
+      o->stress = t->stress;
+      o->chain_mins = chain[k];
+      o->tail_mins = tail[k];
+    }
+  }
+  TM_RDUNLOCK(s);
+
+  free(order);
+  free(pos);
+  free(parent);
+  free(chain);
+  free(tail);
+  return w;
+}
+
+// -----------------------------
+// Snapshot + journal
+// -----------------------------
+// Snapshot file:  header | task records
+//   header: "TMSNAP03" u32 count, i32 next_id, u64 seq, u64 gen, u64 body_len, u32 body_sum
+// Journal file:   "TMJRNL03" u64 gen | { u32 len, u32 sum, payload[len] }*
+//   payload: u8 op, then a task record (ADD), update fields (UPD) or i32 id (DEL)
+//   UPD: i32 id, priority, duration_mins, status; u8 flags (1 deadline, 2 start,
+//        4 name/category); i32 deadline_day, start_min, depends_on, stress;
+//        with flag 4, str name, category ("" = keep)
+// Task record: i32 id, priority, duration_mins, status, deadline_day, start_min, depends_on,
+//              stress; str name, category
+// str: u32 len + bytes (no NUL). Integers are host byte order: files are local to this machine.
+//
+// `seq` is an opaque number supplied by the caller (the SQLite write counter),
+// so the caller can tell whether snapshot + journal still match the database.
+// The store also tracks it in memory (tm_store_seq), one step per row written
+// (a delete also counts the dependents it releases).
+
+#define SNAP_MAGIC "TMSNAP03"
+#define JRNL_MAGIC "TMJRNL03"
+#define SNAP_HEADER_SIZE (8 + 4 + 4 + 8 + 8 + 8 + 4)
+#define JRNL_HEADER_SIZE (8 + 8)
+
+enum { OP_ADD = 1, OP_UPD = 2, OP_DEL = 3 };
+
+typedef struct {
+  unsigned char* p;
+  size_t len;
+  size_t cap;
+} Buf;
+
+typedef struct {
+  const unsigned char* p;
+  size_t len;
+  size_t off;
+} Rd;
+
+static uint32_t tm_fnv1a(const unsigned char* p, size_t n) {
+  uint32_t h = 2166136261u;
+  for (size_t i = 0; i < n; i++) {
+    h ^= p[i];
+    h *= 16777619u;
   }
+  return h;
+}
 
+static int buf_put(Buf* b, const void* src, size_t n) {
+  if (b->len + n > b->cap) {
+    size_t nc = b->cap ? b->cap * 2 : 256;
+    while (nc < b->len + n) nc *= 2;
+    unsigned char* np = (unsigned char*)realloc(b->p, nc);
+    if (!np) return 0;
+    b->p = np;
+    b->cap = nc;
+  }
+  memcpy(b->p + b->len, src, n);
+  b->len += n;
   return 1;
 }
 
-TM_API int tm_delete_task(int id) {
-  int idx = tm_find_index_by_id(id);
-  if (idx < 0) return 0;
+static int buf_i32(Buf* b, int32_t v) { return buf_put(b, &v, sizeof v); }
+static int buf_u32(Buf* b, uint32_t v) { return buf_put(b, &v, sizeof v); }
+static int buf_u64(Buf* b, uint64_t v) { return buf_put(b, &v, sizeof v); }
 
-  tm_free_task(&g_tasks[idx]);
+static int buf_str(Buf* b, const char* s) {
+  uint32_t n = (uint32_t)(s ? strlen(s) : 0);
+  return buf_u32(b, n) && buf_put(b, s ? s : "", n);
+}
 
-  // swap-delete
-  g_tasks[idx] = g_tasks[g_count - 1];
-  g_count--;
+static int buf_task(TmStore* s, Buf* b, const Task* t) {
+  return buf_i32(b, t->id) && buf_i32(b, t->priority) &&
+         buf_i32(b, t->duration_mins) && buf_i32(b, t->status) &&
+         buf_i32(b, t->deadline_day) && buf_i32(b, t->start_min) &&
+         buf_i32(b, t->depends_on) && buf_i32(b, t->stress) &&
+         buf_str(b, s->names + t->name) && buf_str(b, tm_category_name(s, t->category));
+}
+
+static int rd_get(Rd* r, void* dst, size_t n) {
+  if (r->off + n > r->len) return 0;
+  memcpy(dst, r->p + r->off, n);
+  r->off += n;
+  return 1;
+}
+
+// Returns a malloc'd NUL-terminated copy, or NULL on truncated input.
+static char* rd_str(Rd* r) {
+  uint32_t n;
+  if (!rd_get(r, &n, sizeof n) || r->off + n > r->len) return NULL;
+  char* out = (char*)malloc((size_t)n + 1);
+  if (!out) return NULL;
+  memcpy(out, r->p + r->off, n);
+  out[n] = '\0';
+  r->off += n;
+  return out;
+}
+
+// Reads a task record and adds it to the store (no journaling).
+static int rd_task_apply(TmStore* s, Rd* r) {
+  int32_t id, priority, duration, status, day, start_min, depends_on, stress;
+  if (!rd_get(r, &id, 4) || !rd_get(r, &priority, 4) || !rd_get(r, &duration, 4) ||
+      !rd_get(r, &status, 4) || !rd_get(r, &day, 4) || !rd_get(r, &start_min, 4) ||
+      !rd_get(r, &depends_on, 4) || !rd_get(r, &stress, 4)) return 0;
+
+  char* name = rd_str(r);
+  char* category = rd_str(r);
+  int ok = name && category &&
+           tm_add_with_id_internal(s, id, name, tm_intern_category(s, category), priority,
+                                   day, start_min, duration, status, depends_on, stress) > 0;
+  free(name);
+  free(category);
+  return ok;
+}
+
+static int tm_journal_open_locked(TmStore* s, const char* path);
+
+static void tm_journal_write(TmStore* s, const Buf* payload) {
+  if (!s->journal || !payload->p) return;
+  if (s->journal_gen != s->h->gen) {
+    // another process wrote a snapshot: follow it to the new journal
+    char* jpath = tm_strdup(s->journal_path);
+    if (!jpath || !tm_journal_open_locked(s, jpath)) {
+      free(jpath);
+      return;
+    }
+    free(jpath);
+  }
+  uint32_t len = (uint32_t)payload->len;
+  uint32_t sum = tm_fnv1a(payload->p, payload->len);
+  fwrite(&len, sizeof len, 1, s->journal);
+  fwrite(&sum, sizeof sum, 1, s->journal);
+  fwrite(payload->p, 1, payload->len, s->journal);
+  if (!s->journal_batch) fflush(s->journal);
+  s->h->journal_entries++;
+}
+
+static void tm_journal_add(TmStore* s, const Task* t) {
+  if (!s->journal) return;
+  Buf b = {0};
+  unsigned char op = OP_ADD;
+  if (buf_put(&b, &op, 1) && buf_task(s, &b, t)) tm_journal_write(s, &b);
+  free(b.p);
+}
+
+static void tm_journal_update(TmStore* s, int id, const char* name, const char* category,
+                              int priority, int has_day, int32_t day, int has_min, int start_min,
+                              int duration_mins, int status, int depends_on, int stress) {
+  if (!s->journal) return;
+  Buf b = {0};
+  unsigned char op = OP_UPD;
+  int renamed = name || category;
+  unsigned char flags = (has_day ? 1 : 0) | (has_min ? 2 : 0) | (renamed ? 4 : 0);
+  if (buf_put(&b, &op, 1) && buf_i32(&b, id) && buf_i32(&b, priority) &&
+      buf_i32(&b, duration_mins) && buf_i32(&b, status) && buf_put(&b, &flags, 1) &&
+      buf_i32(&b, day) && buf_i32(&b, start_min) && buf_i32(&b, depends_on) &&
+      buf_i32(&b, stress) && (!renamed || (buf_str(&b, name) && buf_str(&b, category)))) {
+    tm_journal_write(s, &b);
+  }
+  free(b.p);
+}
+
+static void tm_journal_delete(TmStore* s, int id) {
+  if (!s->journal) return;
+  Buf b = {0};
+  unsigned char op = OP_DEL;
+  if (buf_put(&b, &op, 1) && buf_i32(&b, id)) tm_journal_write(s, &b);
+  free(b.p);
+}
+
+// Applies one journal payload. Returns how many seq steps it stands for
+// (see tm_delete_internal), or 0 if it is malformed.
+static int tm_journal_apply(TmStore* s, Rd* r) {
+  unsigned char op;
+  if (!rd_get(r, &op, 1)) return 0;
+
+  if (op == OP_ADD) return rd_task_apply(s, r);
+
+  if (op == OP_UPD) {
+    int32_t id, priority, duration, status, day, start_min, depends_on, stress;
+    unsigned char flags;
+    if (!rd_get(r, &id, 4) || !rd_get(r, &priority, 4) || !rd_get(r, &duration, 4) ||
+        !rd_get(r, &status, 4) || !rd_get(r, &flags, 1) || !rd_get(r, &day, 4) ||
+        !rd_get(r, &start_min, 4) || !rd_get(r, &depends_on, 4) || !rd_get(r, &stress, 4)) return 0;
+    char* name = NULL;
+    char* category = NULL;
+    if (flags & 4) {
+      name = rd_str(r);
+      category = rd_str(r);
+      if (!name || !category) {
+        free(name);
+        free(category);
+        return 0;
+      }
+    }
+    tm_update_internal(s, id, name, category && *category ? tm_intern_category(s, category) : -1,
+                       priority, flags & 1, day, flags & 2, start_min, duration, status, depends_on, stress);
+    free(name);
+    free(category);
+    return 1;
+  }
+
+  if (op == OP_DEL) {
+    int32_t id;
+    if (!rd_get(r, &id, 4)) return 0;
+    int steps = tm_delete_internal(s, id);
+    return steps ? steps : 1;
+  }
 
+  return 0;
+}
+
+// Read-only memory map of a whole file. Returns NULL if missing or empty.
+typedef struct {
+  const unsigned char* data;
+  size_t size;
+#ifdef _WIN32
+  HANDLE file;
+  HANDLE mapping;
+#endif
+} MappedFile;
+
+static int tm_map_file(const char* path, MappedFile* m) {
+  memset(m, 0, sizeof *m);
+#ifdef _WIN32
+  m->file = CreateFileA(path, GENERIC_READ, FILE_SHARE_READ, NULL, OPEN_EXISTING,
+                        FILE_ATTRIBUTE_NORMAL, NULL);
+  if (m->file == INVALID_HANDLE_VALUE) return 0;
+  LARGE_INTEGER sz;
+  if (!GetFileSizeEx(m->file, &sz) || sz.QuadPart == 0) {
+    CloseHandle(m->file);
+    return 0;
+  }
+  m->mapping = CreateFileMappingA(m->file, NULL, PAGE_READONLY, 0, 0, NULL);
+  if (!m->mapping) {
+    CloseHandle(m->file);
+    return 0;
+  }
+  m->data = (const unsigned char*)MapViewOfFile(m->mapping, FILE_MAP_READ, 0, 0, 0);
+  if (!m->data) {
+    CloseHandle(m->mapping);
+    CloseHandle(m->file);
+    return 0;
+  }
+  m->size = (size_t)sz.QuadPart;
+#else
+  int fd = open(path, O_RDONLY);
+  if (fd < 0) return 0;
+  struct stat st;
+  if (fstat(fd, &st) != 0 || st.st_size == 0) {
+    close(fd);
+    return 0;
+  }
+  void* p = mmap(NULL, (size_t)st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+  close(fd);
+  if (p == MAP_FAILED) return 0;
+  m->data = (const unsigned char*)p;
+  m->size = (size_t)st.st_size;
+#endif
   return 1;
-}
\ No newline at end of file
+}
+
+static void tm_unmap_file(MappedFile* m) {
+  if (!m->data) return;
+#ifdef _WIN32
+  UnmapViewOfFile(m->data);
+  CloseHandle(m->mapping);
+  CloseHandle(m->file);
+#else
+  munmap((void*)m->data, m->size);
+#endif
+  m->data = NULL;
+}
+
+static int tm_replace_file(const char* tmp, const char* path) {
+#ifdef _WIN32
+  return MoveFileExA(tmp, path, MOVEFILE_REPLACE_EXISTING) != 0;
+#else
+  return rename(tmp, path) == 0;
+#endif
+}
+
+static int tm_write_journal_header(FILE* f, uint64_t gen) {
+  return fwrite(JRNL_MAGIC, 1, 8, f) == 8 && fwrite(&gen, sizeof gen, 1, f) == 1;
+}
+
+static void tm_journal_close_locked(TmStore* s);
+
+static int tm_snapshot_save_locked(TmStore* s, const char* path, unsigned long long seq) {
+  if (!path) return 0;
+
+  Buf body = {0};
+  for (int i = 0; i < s->h->count; i++) {
+    if (!buf_task(s, &body, &s->tasks[i])) {
+      free(body.p);
+      return 0;
+    }
+  }
+
+  uint64_t gen = s->h->gen + 1;
+  Buf head = {0};
+  int ok = buf_put(&head, SNAP_MAGIC, 8) && buf_u32(&head, (uint32_t)s->h->count) &&
+           buf_i32(&head, __atomic_load_n(&s->h->next_id, __ATOMIC_SEQ_CST)) && buf_u64(&head, (uint64_t)seq) &&
+           buf_u64(&head, gen) && buf_u64(&head, (uint64_t)body.len) &&
+           buf_u32(&head, tm_fnv1a(body.p, body.len));
+
+  size_t n = strlen(path);
+  char* tmp = (char*)malloc(n + 5);
+  FILE* f = NULL;
+  if (ok && tmp) {
+    memcpy(tmp, path, n);
+    memcpy(tmp + n, ".tmp", 5);
+    f = fopen(tmp, "wb");
+  }
+  if (f) {
+    ok = fwrite(head.p, 1, head.len, f) == head.len &&
+         (body.len == 0 || fwrite(body.p, 1, body.len, f) == body.len);
+    ok = (fclose(f) == 0) && ok;
+    ok = ok && tm_replace_file(tmp, path);
+  } else {
+    ok = 0;
+  }
+  free(tmp);
+  free(head.p);
+  free(body.p);
+  if (!ok) return 0;
+
+  // The new snapshot covers everything: start an empty journal for its generation.
+  s->h->gen = gen;
+  s->h->journal_entries = 0;
+  s->h->seq = (long long)seq;
+  if (s->journal) {
+    char* jpath = s->journal_path;
+    s->journal_path = NULL;
+    tm_journal_close_locked(s);
+    tm_journal_open_locked(s, jpath);  // generation changed: truncates
+    free(jpath);
+  }
+  return 1;
+}
+
+// Exclusive: the snapshot and the journal truncation must see the same state.
+TM_API int tm_snapshot_save(TmStore* s, const char* path, unsigned long long seq) {
+  TM_WRLOCK(s);
+  int ok = tm_snapshot_save_locked(s, path, seq);
+  TM_WRUNLOCK(s);
+  return ok;
+}
+
+static long long tm_snapshot_load_locked(TmStore* s, const char* snap_path, const char* journal_path) {
+  if (!snap_path) return -1;
+  tm_journal_close_locked(s);
+  tm_reset_locked(s);
+
+  MappedFile m;
+  if (!tm_map_file(snap_path, &m)) return -1;
+
+  long long result = -1;
+  Rd r = {m.data, m.size, 0};
+  char magic[8];
+  uint32_t count, sum;
+  int32_t next_id;
+  uint64_t seq, gen, body_len;
+
+  if (rd_get(&r, magic, 8) && memcmp(magic, SNAP_MAGIC, 8) == 0 &&
+      rd_get(&r, &count, 4) && rd_get(&r, &next_id, 4) && rd_get(&r, &seq, 8) &&
+      rd_get(&r, &gen, 8) && rd_get(&r, &body_len, 8) && rd_get(&r, &sum, 4) &&
+      body_len == m.size - SNAP_HEADER_SIZE &&
+      tm_fnv1a(m.data + SNAP_HEADER_SIZE, (size_t)body_len) == sum) {
+    tm_ensure_cap(s, (int)count);
+    uint32_t i = 0;
+    while (i < count && rd_task_apply(s, &r)) i++;
+    if (i == count) {
+      tm_bump_next_id(s, next_id - 1);
+      s->h->gen = gen;
+      result = (long long)seq;
+    }
+  }
+  tm_unmap_file(&m);
+  if (result < 0) {
+    tm_reset_locked(s);
+    return -1;
+  }
+
+  // Journal tail: only records written after this snapshot (same generation).
+  MappedFile j;
+  if (journal_path && tm_map_file(journal_path, &j)) {
+    Rd jr = {j.data, j.size, 0};
+    uint64_t jgen;
+    if (rd_get(&jr, magic, 8) && memcmp(magic, JRNL_MAGIC, 8) == 0 &&
+        rd_get(&jr, &jgen, 8) && jgen == s->h->gen) {
+      while (jr.off < jr.len) {
+        uint32_t len;
+        if (!rd_get(&jr, &len, 4) || !rd_get(&jr, &sum, 4) || jr.off + len > jr.len ||
+            tm_fnv1a(jr.p + jr.off, len) != sum) {
+          result = -1;  // torn or corrupt tail: caller must resync
+          break;
+        }
+        Rd rec = {jr.p + jr.off, len, 0};
+        int steps = tm_journal_apply(s, &rec);
+        if (!steps) {
+          result = -1;
+          break;
+        }
+        jr.off += len;
+        s->h->journal_entries++;
+        result += steps;
+      }
+    }
+    tm_unmap_file(&j);
+  }
+
+  if (result < 0) tm_reset_locked(s);
+  else s->h->seq = result;
+  return result;
+}
+
+TM_API long long tm_snapshot_load(TmStore* s, const char* snap_path, const char* journal_path) {
+  TM_WRLOCK(s);
+  long long r = tm_snapshot_load_locked(s, snap_path, journal_path);
+  TM_WRUNLOCK(s);
+  return r;
+}
+
+static int tm_journal_open_locked(TmStore* s, const char* path) {
+  if (!path) return 0;
+  tm_journal_close_locked(s);
+
+  // Keep an existing journal of the current generation, otherwise start fresh.
+  int keep = 0;
+  FILE* f = fopen(path, "rb");
+  if (f) {
+    char magic[8];
+    uint64_t gen;
+    keep = fread(magic, 1, 8, f) == 8 && memcmp(magic, JRNL_MAGIC, 8) == 0 &&
+           fread(&gen, sizeof gen, 1, f) == 1 && gen == s->h->gen;
+    fclose(f);
+  }
+
+  s->journal = fopen(path, keep ? "ab" : "wb");
+  if (!s->journal) return 0;
+  s->journal_path = tm_strdup(path);
+  s->journal_gen = s->h->gen;
+  if (!keep) {
+    s->h->journal_entries = 0;
+    if (!tm_write_journal_header(s->journal, s->h->gen)) {
+      tm_journal_close_locked(s);
+      return 0;
+    }
+    fflush(s->journal);
+  }
+  return 1;
+}
+
+TM_API int tm_journal_open(TmStore* s, const char* path) {
+  TM_WRLOCK(s);
+  int ok = tm_journal_open_locked(s, path);
+  TM_WRUNLOCK(s);
+  return ok;
+}
+
+static void tm_journal_close_locked(TmStore* s) {
+  if (s->journal) fclose(s->journal);
+  s->journal = NULL;
+  free(s->journal_path);
+  s->journal_path = NULL;
+}
+
+TM_API void tm_journal_close(TmStore* s) {
+  TM_WRLOCK(s);
+  tm_journal_close_locked(s);
+  TM_WRUNLOCK(s);
+}
+
+TM_API int tm_journal_entries(TmStore* s) {
+  TM_RDLOCK(s);
+  int n = s->h->journal_entries;
+  TM_RDUNLOCK(s);
+  return n;
+}
+
+
+// -----------------------------
+// Shared memory
+// -----------------------------
+// Segment: header page | cat_names | cat_slots | tasks | id_slots | names, each part
+// page aligned and sized from max_tasks when the segment is created. On
+// POSIX the object is sparse, so only pages that are touched use memory.
+// Every uvicorn worker maps the same segment, so they all see one task set
+// and one id allocator.
+#define TM_SHM_MAGIC 0x3130304d4853544full  // "OTSHM001" little-endian
+#define TM_SHM_LAYOUT ((uint32_t)(sizeof(TmHeader) << 8 | sizeof(Task)))
+#define TM_SHM_NAME_BYTES 64                // average name budget per task
+#define TM_SHM_SLOTS (2 * (TM_MAX_CATEGORIES + 1))
+#define TM_SHM_WAIT_MS 5000                 // for a concurrent creator to finish
+
+static size_t tm_page_up(size_t n) {
+  return (n + 4095) & ~(size_t)4095;
+}
+
+typedef struct {
+  size_t cat_names, cat_slots, tasks, id_slots, names, total;
+  int id_slot_cap;
+} ShmLayout;
+
+static ShmLayout tm_shm_layout(int max_tasks) {
+  ShmLayout l;
+  l.cat_names = tm_page_up(sizeof(TmHeader));
+  l.cat_slots = l.cat_names + tm_page_up(sizeof(uint32_t) * TM_MAX_CATEGORIES);
+  l.tasks = l.cat_slots + tm_page_up(sizeof(int) * TM_SHM_SLOTS);
+  l.id_slots = l.tasks + tm_page_up(sizeof(Task) * (size_t)max_tasks);
+  for (l.id_slot_cap = 32; l.id_slot_cap < 2 * max_tasks; l.id_slot_cap *= 2) {
+  }
+  l.names = l.id_slots + tm_page_up(sizeof(int) * (size_t)l.id_slot_cap);
+  l.total = l.names + tm_page_up((size_t)TM_SHM_NAME_BYTES * (size_t)max_tasks);
+  return l;
+}
+
+static void tm_sleep_ms(int ms) {
+#ifdef _WIN32
+  Sleep((DWORD)ms);
+#else
+  struct timespec ts = {ms / 1000, (long)(ms % 1000) * 1000000L};
+  nanosleep(&ts, NULL);
+#endif
+}
+
+static void tm_shm_init_header(TmHeader* h, int max_tasks) {
+  ShmLayout l = tm_shm_layout(max_tasks);
+  memset(h, 0, sizeof *h);
+  h->max_tasks = max_tasks;
+  h->layout = TM_SHM_LAYOUT;
+  h->task_cap = max_tasks;
+  h->names_cap = (uint32_t)(l.total - l.names);
+  h->cat_cap = TM_MAX_CATEGORIES;
+  h->cat_slot_cap = TM_SHM_SLOTS;
+  h->id_slot_cap = l.id_slot_cap;
+  h->next_id = 1;
+  h->seq = -1;
+  h->attached = 1;        // the creator (POSIX only counts)
+#ifndef _WIN32
+  pthread_mutexattr_t a;
+  pthread_mutexattr_init(&a);
+  pthread_mutexattr_setpshared(&a, PTHREAD_PROCESS_SHARED);
+  pthread_mutexattr_setrobust(&a, PTHREAD_MUTEX_ROBUST);
+  pthread_mutex_init(&h->mutex, &a);
+  pthread_mutexattr_destroy(&a);
+#endif
+}
+
+// Waits for the creator to publish the header. 1 = usable, 0 = give up.
+static int tm_shm_wait_ready(TmHeader* h, size_t size) {
+  for (int waited = 0; waited < TM_SHM_WAIT_MS; waited += 10) {
+    if (__atomic_load_n(&h->magic, __ATOMIC_ACQUIRE) == TM_SHM_MAGIC) {
+      return h->layout == TM_SHM_LAYOUT && h->max_tasks > 0 &&
+             tm_shm_layout(h->max_tasks).total <= size;
+    }
+    tm_sleep_ms(10);
+  }
+  return 0;
+}
+
+static TmStore* tm_shm_wrap(void* map, size_t size) {
+  TmStore* s = (TmStore*)calloc(1, sizeof(TmStore));
+  if (!s) return NULL;
+  TmHeader* h = (TmHeader*)map;
+  ShmLayout l = tm_shm_layout(h->max_tasks);
+  s->shared = 1;
+  s->map = map;
+  s->map_size = size;
+  s->h = h;
+  s->cat_names = (uint32_t*)((char*)map + l.cat_names);
+  s->cat_slots = (int*)((char*)map + l.cat_slots);
+  s->tasks = (Task*)((char*)map + l.tasks);
+  s->id_slots = (int*)((char*)map + l.id_slots);
+  s->names = (char*)map + l.names;
+  return s;
+}
+
+#ifdef _WIN32
+
+TM_API TmStore* tm_store_open_shared(const char* name, int max_tasks, int* created) {
+  if (!name || max_tasks <= 0) return NULL;
+  char full[300], lock_name[320];
+  snprintf(full, sizeof full, "Local\\%s", name);
+  snprintf(lock_name, sizeof lock_name, "Local\\%s.lock", name);
+
+  HANDLE mutex = CreateMutexA(NULL, FALSE, lock_name);
+  if (!mutex) return NULL;
+
+  size_t size = tm_shm_layout(max_tasks).total;
+  HANDLE mapping = CreateFileMappingA(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE,
+                                      (DWORD)((unsigned long long)size >> 32), (DWORD)size, full);
+  int creator = mapping && GetLastError() != ERROR_ALREADY_EXISTS;
+  void* map = mapping ? MapViewOfFile(mapping, FILE_MAP_ALL_ACCESS, 0, 0, 0) : NULL;
+  MEMORY_BASIC_INFORMATION mi;
+  if (map && VirtualQuery(map, &mi, sizeof mi)) size = mi.RegionSize;
+
+  TmStore* s = NULL;
+  if (map) {
+    TmHeader* h = (TmHeader*)map;
+    if (creator) {
+      tm_shm_init_header(h, max_tasks);
+      __atomic_store_n(&h->magic, TM_SHM_MAGIC, __ATOMIC_RELEASE);
+    }
+    if (creator || tm_shm_wait_ready(h, size)) s = tm_shm_wrap(map, size);
+  }
+  if (!s) {
+    if (map) UnmapViewOfFile(map);
+    if (mapping) CloseHandle(mapping);
+    CloseHandle(mutex);
+    return NULL;
+  }
+  s->mapping = mapping;
+  s->mutex = mutex;
+  if (created) *created = creator;
+  return s;
+}
+
+// Windows frees a named mapping with its last handle: nothing to unlink.
+static void tm_shm_detach(TmStore* s) {
+  UnmapViewOfFile(s->map);
+  CloseHandle(s->mapping);
+  CloseHandle(s->mutex);
+}
+
+
+#else
+
+TM_API TmStore* tm_store_open_shared(const char* name, int max_tasks, int* created) {
+  if (!name || max_tasks <= 0) return NULL;
+  char full[256];
+  snprintf(full, sizeof full, "/%s", name);
+
+  // A few rounds: a segment left behind by a different build (or by a
+  // creator that died half-way) is unlinked and made again, and so is one
+  // its last user unlinked while we were opening it.
+  for (int round = 0; round < 3; round++) {
+    int creator = 1;
+    int fd = shm_open(full, O_RDWR | O_CREAT | O_EXCL, 0600);
+    if (fd < 0 && errno == EEXIST) {
+      creator = 0;
+      fd = shm_open(full, O_RDWR, 0600);
+    }
+    if (fd < 0) {
+      if (errno == ENOENT) continue;  // unlinked in between: create it
+      return NULL;
+    }
+
+    size_t size = tm_shm_layout(max_tasks).total;
+    if (creator) {
+      if (ftruncate(fd, (off_t)size) != 0) {
+        close(fd);
+        shm_unlink(full);
+        return NULL;
+      }
+    } else {
+      struct stat st;
+      int waited = 0;
+      while (fstat(fd, &st) == 0 && st.st_size == 0 && waited < TM_SHM_WAIT_MS) {
+        tm_sleep_ms(10);
+        waited += 10;
+      }
+      size = (size_t)st.st_size;
+    }
+
+    void* map = size ? mmap(NULL, size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0) : MAP_FAILED;
+    close(fd);
+    if (map == MAP_FAILED) {
+      if (creator) shm_unlink(full);
+      return NULL;
+    }
+
+    TmHeader* h = (TmHeader*)map;
+    if (creator) {
+      tm_shm_init_header(h, max_tasks);
+      __atomic_store_n(&h->magic, TM_SHM_MAGIC, __ATOMIC_RELEASE);
+    } else if (!tm_shm_wait_ready(h, size)) {
+      munmap(map, size);
+      shm_unlink(full);
+      continue;
+    }
+
+    TmStore* s = tm_shm_wrap(map, size);
+    if (s) s->shm_name = tm_strdup(full);
+    if (!s || !s->shm_name) {
+      free(s);
+      munmap(map, size);
+      if (creator) shm_unlink(full);
+      return NULL;
+    }
+    if (!creator) {
+      // The last handle may have unlinked it since our shm_open; then this
+      // mapping is orphaned and the next round creates a fresh segment.
+      TM_WRLOCK(s);
+      int gone = s->h->unlinked;
+      if (!gone) s->h->attached++;
+      TM_WRUNLOCK(s);
+      if (gone) {
+        free(s->shm_name);
+        free(s);
+        munmap(map, size);
+        continue;
+      }
+    }
+    if (created) *created = creator;
+    return s;
+  }
+  return NULL;
+}
+
+// The last handle out unlinks the segment, under the lock so that an opener
+// either counts itself in first or sees `unlinked` and starts a new one.
+// A process that dies without detaching keeps it alive until reboot (or a
+// new build's layout replaces it).
+static void tm_shm_detach(TmStore* s) {
+  TM_WRLOCK(s);
+  if (--s->h->attached <= 0) {
+    s->h->unlinked = 1;
+    shm_unlink(s->shm_name);
+  }
+  TM_WRUNLOCK(s);
+  munmap(s->map, s->map_size);
+  free(s->shm_name);
+}
+
+
+#endif
@@ -10,20 +10,41 @@
 extern "C" {
 #endif
 
-TM_API void tm_init(void);
-TM_API void tm_reset(void);
+// Opaque handle to one independent task set. Every tm_* call takes one;
+// calls on different stores never contend with each other.
+typedef struct TmStore TmStore;
+
+TM_API TmStore* tm_store_create(void);
+// Opens the store called `name` in shared memory, creating it (sized for
+// max_tasks) if no process has it yet; *created tells the caller whether it
+// must load it. Every process that opens the same name sees the same tasks
+// and ids. tm_store_free only unmaps it. Returns NULL on failure.
+TM_API TmStore* tm_store_open_shared(const char* name, int max_tasks, int* created);
+TM_API void tm_store_free(TmStore* s);
+// Approximate heap bytes held by the store (tasks, names, categories).
+TM_API long long tm_store_bytes(TmStore* s);
+// The caller's write counter this state matches (set by snapshot save/load,
+// +1 per row a successful write changes; a delete also counts each dependent
+// it releases), or -1 after a reset or a crashed lock holder.
+TM_API long long tm_store_seq(TmStore* s);
+
+TM_API void tm_reset(TmStore* s);
 
 TM_API int tm_add_task(
+  TmStore* s,
   const char* name,
   const char* category,
   int priority,
   const char* deadline,
   const char* start_time,
   int duration_mins,
-  int status
+  int status,
+  int depends_on,          // prerequisite task id, 0 = none
+  int stress               // stress_level
 );
 
 TM_API int tm_add_task_with_id(
+  TmStore* s,
   int id,
   const char* name,
   const char* category,
@@ -31,20 +52,109 @@ TM_API int tm_add_task_with_id(
   const char* deadline,
   const char* start_time,
   int duration_mins,
-  int status
+  int status,
+  int depends_on,
+  int stress
 );
 
+// One row for tm_add_tasks_with_ids; same meaning as tm_add_task_with_id's arguments.
+typedef struct {
+  int id;
+  const char* name;
+  const char* category;
+  int priority;
+  const char* deadline;
+  const char* start_time;
+  int duration_mins;
+  int status;
+  int depends_on;
+  int stress;
+} TmTaskRow;
+
+// Bulk load (imports): tm_add_task_with_id for each row under one write lock
+// and one journal flush. Returns how many rows were added.
+TM_API int tm_add_tasks_with_ids(TmStore* s, const TmTaskRow* rows, int n);
+
+// Returns 1 if updated, 0 if id is unknown, -2 if the new depends_on would
+// close a cycle, -3 if it names a task that doesn't exist, -4 if a shared
+// store has no room left for the new name or category. On an error nothing
+// is changed.
 TM_API int tm_update_task(
+  TmStore* s,
   int id,
+  const char* name,        // NULL keep
+  const char* category,    // NULL keep
   int priority,            // -1 keep
   const char* deadline,    // NULL keep
   const char* start_time,  // NULL keep
   int duration_mins,       // -1 keep
-  int status               // -1 keep
+  int status,              // -1 keep
+  int depends_on,          // -1 keep, 0 none
+  int stress               // -1 keep
 );
 
-TM_API int tm_delete_task(int id);
+// Dependents of a deleted task lose their prerequisite (depends_on = 0).
+TM_API int tm_delete_task(TmStore* s, int id);
+
+TM_API int tm_count(TmStore* s);
+
+// Fills `out` with up to `max` ids ordered by status, priority, deadline,
+// start_time (the GET /tasks order). Returns how many were written.
+TM_API int tm_sorted_ids(TmStore* s, int* out, int max);
+
+// Dependency graph: each task has at most one prerequisite (depends_on). The
+// store keeps a topological order up to date on every write and rejects
+// writes that would close a cycle.
+typedef struct {
+  int id;
+  int depends_on;          // prerequisite that is still open, 0 if none
+  int priority;
+  int duration_mins;
+  int deadline_day;        // days since 1970-01-01, -1 none
+  int start_min;           // minutes since 00:00, -1 unscheduled
+  int stress;
+  long long chain_mins;    // longest chain of open prerequisites ending here, this task included
+  long long tail_mins;     // longest chain of open dependents starting here, this task included
+} TmDepInfo;
+
+// Fills `out` with up to `max` open tasks, prerequisites before dependents.
+// The critical path is the largest chain_mins. Returns how many were written.
+TM_API int tm_dependency_order(TmStore* s, TmDepInfo* out, int max);
+
+// Consistency digest: XOR of a 64-bit hash of every task (tm_task_hash in
+// task_manager.c; consistency.py computes the same hash for the SQLite side).
+// Kept up to date on every write, so comparing it with the database is O(1).
+// Returns the digest; *seq (see tm_store_seq) and *rows are read with it.
+TM_API unsigned long long tm_store_digest(TmStore* s, long long* seq, int* rows);
+
+typedef struct {
+  int bucket;              // id >> shift
+  int rows;
+  unsigned long long digest;
+} TmBucketDigest;
+
+// Digest per id range of 1 << shift ids, ascending. Writes up to `max` and
+// returns how many buckets there are (call again with more room if > max).
+TM_API int tm_bucket_digests(TmStore* s, int shift, TmBucketDigest* out, int max);
+
+// Repairs ids lo..hi-1 to exactly `rows` (all in that range): tasks missing
+// from rows are deleted, the others added or overwritten. Not journaled and
+// leaves tm_store_seq alone (take a snapshot afterwards). Returns how many
+// tasks it deleted or wrote, or -1 without touching anything if the store's
+// seq isn't expect_seq (a write came in since the rows were read).
+TM_API int tm_resync_rows(TmStore* s, int lo, int hi, const TmTaskRow* rows, int n, long long expect_seq);
+
+// Persistence: binary snapshot + append-only journal of add/update/delete.
+// `seq` is an opaque caller-supplied version stored in the snapshot header.
+TM_API int tm_snapshot_save(TmStore* s, const char* path, unsigned long long seq);
+// Replaces the store with snapshot + journal tail. Returns seq plus the
+// writes the replayed journal records stand for (see tm_store_seq), or -1 if
+// the files are missing or corrupt.
+TM_API long long tm_snapshot_load(TmStore* s, const char* snap_path, const char* journal_path);
+TM_API int tm_journal_open(TmStore* s, const char* path);
+TM_API void tm_journal_close(TmStore* s);
+TM_API int tm_journal_entries(TmStore* s);
 
 #ifdef __cplusplus
 }
-#endif
\ No newline at end of file
+#endif
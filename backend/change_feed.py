@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ChangeFeed:
+    """
+    Monotonic store version + bounded log of task changes.
+
+    Every write path calls record(op, task_id). Clients remember the version
+    they last saw and ask for changes_since(version); if that version has
+    already fallen out of the log (or came from a previous server run),
+    they get reset=True and should reload the full list.
+
+    The version is global, but entries carry the owning user_id so each user
+    only sees their own ids, and a user's ETag is the version of their own
+    last change (user_version), so other users' writes don't change it.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self._lock = threading.Lock()
+        self._log = deque(maxlen=max_entries)   # (version, op, task_id, user_id)
+        # Seed from wall-clock ms so versions keep increasing across restarts.
+        self._version = int(time.time() * 1000)
+        self._floor = self._version              # oldest version we can diff from
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._last_by_user: Dict[int, int] = {}  # user_id -> version of their last change
+        self._user_floor: Dict[int, int] = {}    # user_id -> version of their last reset()
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def user_version(self, user_id: int = 0) -> int:
+        """
+        Version of the user's last change or reset. A user not seen yet this
+        run is given a fresh version of their own, so no two users share one.
+        """
+        user_id = int(user_id)
+        with self._lock:
+            if user_id not in self._last_by_user:
+                self._version += 1
+                self._last_by_user[user_id] = self._version
+            return max(self._last_by_user[user_id], self._user_floor.get(user_id, 0))
+
+    def etag(self, user_id: int = 0) -> str:
+        return f'"{self.user_version(user_id)}"'
+
+    def add_listener(self, fn: Callable[[Dict[str, Any]], None]) -> None:
+        """fn(event) is called for every record, in version order. Keep it cheap."""
+        self._listeners.append(fn)
+
+    def record(self, op: str, task_id: int, row: Optional[Dict[str, Any]] = None, user_id: int = 0) -> int:
+        """op is 'upsert' or 'delete'. Returns the new version."""
+        with self._lock:
+            self._version += 1
+            if len(self._log) == self._log.maxlen:
+                # the entry about to be evicted becomes the new floor
+                self._floor = self._log[0][0]
+            self._log.append((self._version, op, int(task_id), int(user_id)))
+            prev = self._last_by_user.get(int(user_id), self._floor)
+            self._last_by_user[int(user_id)] = self._version
+
+            if self._listeners:
+                # prev lets a client spot a gap in its own user's stream even
+                # though other users' writes also advance the version.
+                event = {"version": self._version, "prev": prev, "op": op, "id": int(task_id), "user_id": int(user_id)}
+                if row is not None:
+                    event["task"] = row
+                for fn in self._listeners:
+                    fn(event)
+            return self._version
+
+    def reset(self, user_id: int = 0) -> int:
+        """
+        After a bulk write (an import): rather than an entry per row, make
+        the user's clients reload. Their older versions get reset=True and
+        listeners receive one {"op": "reset"} event. Returns the new version.
+        """
+        with self._lock:
+            self._version += 1
+            prev = self._last_by_user.get(int(user_id), self._floor)
+            self._last_by_user[int(user_id)] = self._version
+            self._user_floor[int(user_id)] = self._version
+            if self._listeners:
+                event = {"version": self._version, "prev": prev, "op": "reset", "id": 0, "user_id": int(user_id)}
+                for fn in self._listeners:
+                    fn(event)
+            return self._version
+
+    def changes_since(self, since: int, user_id: int = 0) -> Dict:
+        """
+        Returns {"version", "reset", "upserted_ids", "deleted_ids"}.
+        Only the last op per id counts.
+        """
+        with self._lock:
+            version = self._version
+            # before the floor is only a problem if the user changed something since
+            evicted = since < self._floor and self._last_by_user.get(user_id, since + 1) > since
+            if evicted or since < self._user_floor.get(user_id, 0) or since > version:
+                return {"version": version, "reset": True, "upserted_ids": [], "deleted_ids": []}
+
+            last_op: Dict[int, str] = {}
+            for v, op, task_id, uid in self._log:
+                if v > since and uid == user_id:
+                    last_op[task_id] = op
+
+        upserted: List[int] = [i for i, op in last_op.items() if op == "upsert"]
+        deleted: List[int] = [i for i, op in last_op.items() if op == "delete"]
+        return {"version": version, "reset": False, "upserted_ids": upserted, "deleted_ids": deleted}
+
+
+change_feed = ChangeFeed()
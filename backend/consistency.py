@@ -0,0 +1,165 @@
+import sqlite3
+
+from migrate_db import DB_PATH, MIGRATIONS_TABLE, day_sql, minute_sql
+
+# task_digest holds, per user, the XOR of a hash of each of their tasks: one
+# row per range of 1 << DIGEST_BUCKET_BITS ids plus a total (bucket -1).
+# Triggers keep it in step with tasks, and the C store keeps the same total
+# (tm_store_digest), so "does the C store match SQLite?" is two integer
+# reads; on a mismatch the buckets say which id ranges to resync.
+DIGEST_BUCKET_BITS = 10
+DIGEST_TOTAL = -1
+DIGEST_MASK = (1 << 64) - 1    # SQLite integers are signed, the C digest isn't
+
+DIGEST_TABLE = """
+CREATE TABLE IF NOT EXISTS task_digest (
+  user_id INTEGER NOT NULL,
+  bucket INTEGER NOT NULL,
+  digest INTEGER NOT NULL DEFAULT 0,
+  tasks INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, bucket)
+) WITHOUT ROWID;
+"""
+
+# The per-row hash is plain SQL arithmetic, so the triggers run in any
+# connection (a sqlite3 shell, a backup script) and never call back into
+# Python. tm_task_hash in task_manager.c computes the same value from the C
+# store's fields. Two 32-bit lanes each run a polynomial over the fields
+# (x = (x + v) * prime mod 2**32) and murmur3's fmix32; the lanes are the
+# high and low halves. Every intermediate stays below 2**63: SQLite turns an
+# overflowing integer into a float. Text enters as its length and a 32-bit
+# polynomial over all of its code points (a recursive CTE), so any edit to a
+# name or category changes the hash. Integers enter as stored: a status of
+# 300 in SQLite doesn't match the C store's byte.
+_M32 = (1 << 32) - 1
+_LANES = ((0x811C9DC5, 0x01000193), (0x9E3779B9, 0x2C1B3C6D))   # (seed, prime)
+_TEXT = (0x2545F491, 0x01000193)                                  # (seed, prime) over a text's code points
+_FMIX = (0x85EBCA6B, 0xC2B2AE35)
+
+# bump when hash_sql (and tm_task_hash) change: db_init then rebuilds task_digest
+HASH_VERSION = 2
+HASH_MIGRATION = "task_digest_hash"     # migrations row: last_id is the HASH_VERSION task_digest holds
+
+
+def _text_terms(col: str) -> list:
+    seed, prime = _TEXT
+    step = _mul32(f"(x + unicode(substr({col}, k + 1, 1)))", prime)
+    text_hash = (
+        f"(WITH RECURSIVE r(k, x) AS (SELECT 0, {seed} UNION ALL SELECT k + 1, {step} FROM r "
+        f"WHERE k < length({col})) SELECT x FROM r WHERE k = length({col}))"
+    )
+    return [f"length({col})", text_hash]
+
+
+def _xorshift(col: str, bits: int) -> str:
+    # a ^ b as (a | b) - (a & b): SQLite has no XOR operator (nor precedence
+    # between | & >>, hence the parentheses)
+    return f"(({col} | ({col} >> {bits})) - ({col} & ({col} >> {bits})))"
+
+
+def _mul32(col: str, k: int) -> str:
+    # col * k mod 2**32 in two 16-bit halves of k
+    return f"((({col} * {k & 0xFFFF}) + ((({col} * {k >> 16}) & 65535) << 16)) & {_M32})"
+
+
+def hash_sql(row: str) -> str:
+    """SQL for tm_task_hash of the tasks row `row` (NEW, OLD, a table name), as a signed 64-bit integer."""
+    terms = [
+        f"{row}.id", f"{row}.priority", f"{row}.duration", f"{row}.status",
+        day_sql(f"{row}.deadline"), minute_sql(f"{row}.start_time"),
+        f"CASE WHEN {row}.depends_on_id > 0 THEN {row}.depends_on_id ELSE 0 END", f"{row}.stress_level",
+        *_text_terms(f"{row}.name"), *_text_terms(f"{row}.category"),
+    ]
+    # Horner's rule nests too deep for SQLite's parser; expanded, the lane is
+    # seed * prime**n + sum(v[i] * prime**(n - i)), each product taken mod 2**32
+    n = len(terms)
+    lanes = []
+    for seed, prime in _LANES:
+        products = [_mul32(f"(v{i} & {_M32})", pow(prime, n - i, 1 << 32)) for i in range(n)]
+        lanes.append(f"({seed * pow(prime, n, 1 << 32) & _M32} + {' + '.join(products)}) & {_M32}")
+    # fmix32 reads its input more than once per step. OFFSET 0 keeps SQLite
+    # from flattening the subqueries, which would paste the whole inner
+    # expression in at every reference.
+    q = f"SELECT {', '.join(f'{t} AS v{i}' for i, t in enumerate(terms))}"
+    q = f"SELECT {lanes[0]} AS a, {lanes[1]} AS b FROM ({q} LIMIT -1 OFFSET 0)"
+    for bits, k in zip((16, 13), _FMIX):
+        a, b = (_mul32(_xorshift(c, bits), k) for c in "ab")
+        q = f"SELECT {a} AS a, {b} AS b FROM ({q} LIMIT -1 OFFSET 0)"
+    return f"(SELECT ({_xorshift('a', 16)} << 32) | {_xorshift('b', 16)} FROM ({q} LIMIT -1 OFFSET 0))"
+
+
+def _flip(row: str, tasks: int) -> str:
+    # the row's hash into its bucket and the total; a ^ b as (a | b) & ~(a & b)
+    return f"""
+          INSERT INTO task_digest(user_id, bucket, digest, tasks)
+          SELECT {row}.user_id, bucket, h, {tasks}
+          FROM (SELECT {hash_sql(row)} AS h),
+               (SELECT {row}.id >> {DIGEST_BUCKET_BITS} AS bucket UNION ALL SELECT {DIGEST_TOTAL})
+          WHERE true
+          ON CONFLICT(user_id, bucket) DO UPDATE SET
+            digest = (digest | excluded.digest) & ~(digest & excluded.digest), tasks = tasks + excluded.tasks;"""
+
+
+# Recreated on every start, so they always carry the current hash_sql (and
+# replace tasks_digest_*, which called a Python task_hash() function).
+DIGEST_TRIGGERS = f"""
+DROP TRIGGER IF EXISTS tasks_digest_ins;
+DROP TRIGGER IF EXISTS tasks_digest_upd;
+DROP TRIGGER IF EXISTS tasks_digest_del;
+DROP TRIGGER IF EXISTS tasks_hash_ins;
+DROP TRIGGER IF EXISTS tasks_hash_upd;
+DROP TRIGGER IF EXISTS tasks_hash_del;
+CREATE TRIGGER IF NOT EXISTS tasks_hash_ins AFTER INSERT ON tasks BEGIN{_flip("NEW", 1)}
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_hash_upd AFTER UPDATE OF
+  user_id, name, category, priority, deadline, start_time, duration, status, depends_on_id, stress_level
+ON tasks BEGIN{_flip("OLD", -1)}{_flip("NEW", 1)}
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_hash_del AFTER DELETE ON tasks BEGIN{_flip("OLD", -1)}
+END;
+"""
+
+# what the C store holds of a row (and the hash covers); _task_rows in main.py reads them in this order
+HASH_COLUMNS = "id, name, category, priority, deadline, start_time, duration, status, depends_on_id, stress_level"
+
+
+def digests_current(conn) -> bool:
+    """Whether task_digest was built with this HASH_VERSION."""
+    conn.execute(MIGRATIONS_TABLE)
+    row = conn.execute("SELECT last_id FROM migrations WHERE name=?", (HASH_MIGRATION,)).fetchone()
+    return bool(row and row[0] == HASH_VERSION)
+
+
+def rebuild_digests(conn) -> int:
+    """Recompute task_digest from tasks in one transaction. Returns the tasks hashed."""
+    digests = {}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(MIGRATIONS_TABLE)
+        n = 0
+        for user_id, task_id, h in conn.execute(f"SELECT user_id, id, {hash_sql('tasks')} FROM tasks"):
+            for key in ((user_id, task_id >> DIGEST_BUCKET_BITS), (user_id, DIGEST_TOTAL)):
+                d, c = digests.get(key, (0, 0))
+                digests[key] = (d ^ h, c + 1)
+            n += 1
+        conn.execute("DELETE FROM task_digest")
+        conn.executemany(
+            "INSERT INTO task_digest(user_id, bucket, digest, tasks) VALUES(?,?,?,?)",
+            [(u, b, d, c) for (u, b), (d, c) in digests.items()],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO migrations(name, last_id, done) VALUES(?, ?, 1)", (HASH_MIGRATION, HASH_VERSION)
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return n
+
+
+if __name__ == "__main__":
+    # python consistency.py: rebuild the digests, e.g. after writing to tasks
+    # with the triggers dropped. The server must have created the schema.
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    print(f"Rebuilt task_digest over {rebuild_digests(conn)} tasks")
+    conn.close()
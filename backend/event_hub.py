@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+from typing import Any, Dict, Optional, Set
+
+
+class Subscriber:
+    def __init__(self, buffer_size: int, user_id: int = 0):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.user_id = user_id
+        self.dropped = False
+
+
+class EventHub:
+    """
+    Fan-out of task change events to connected /events clients.
+
+    publish() may be called from any thread (sync endpoints run in the
+    threadpool); delivery happens on the event loop. Each client has its own
+    bounded queue: a client that falls behind is dropped rather than letting
+    its buffer grow, and is expected to reconnect and catch up through
+    /tasks/changes.
+    """
+
+    def __init__(self, buffer_size: int = 256):
+        self.buffer_size = buffer_size
+        self._subs: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.dropped_total = 0
+
+    def subscribe(self, user_id: int = 0) -> Subscriber:
+        # Called from the loop; remember it so worker threads can reach it.
+        self._loop = asyncio.get_running_loop()
+        sub = Subscriber(self.buffer_size, user_id)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    @property
+    def client_count(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None or not self._subs:
+            return
+        data = json.dumps(event, separators=(",", ":"))
+        try:
+            loop.call_soon_threadsafe(self._fanout, event.get("version"), event.get("user_id", 0), data)
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+    def _fanout(self, version: Optional[int], user_id: int, data: str) -> None:
+        with self._lock:
+            subs = [s for s in self._subs if s.user_id == user_id]
+        for sub in subs:
+            try:
+                sub.queue.put_nowait((version, data))
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def _drop(self, sub: Subscriber) -> None:
+        self.unsubscribe(sub)
+        sub.dropped = True
+        self.dropped_total += 1
+        # Make room for the sentinel so the stream wakes up and closes.
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    async def stream(self, sub: Subscriber, keepalive: float = 15.0):
+        """Server-Sent Events generator for one subscriber."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                version, data = item
+                yield f"id: {version}\nevent: task\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+event_hub = EventHub()
@@ -1,80 +1,233 @@
+import hashlib
+import operator
 import os
+import re
 import sqlite3
-from datetime import datetime
-from typing import Optional
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 import ctypes
+import heapq
+import numpy as np
 from nl_parser import parse_command, validate_date_time
-from ai_assistant import process_message as ai_process_message
+from ai_assistant import llm_gate, process_message as ai_process_message
+from analytics import ROLLUP_TABLE, ROLLUP_TRIGGERS, rebuild_rollups
+from change_feed import change_feed
+from consistency import (
+    DIGEST_BUCKET_BITS, DIGEST_MASK, DIGEST_TABLE, DIGEST_TOTAL, DIGEST_TRIGGERS, HASH_COLUMNS,
+    digests_current, rebuild_digests,
+)
+from event_hub import event_hub
+from migrate_db import TIME_BACKFILL, TIME_INDEXES, backfill_done, backfill_time_columns, day_sql, minute_sql
+from ml_suggester import MLSuggester
+from recurrence import expand, normalize_rule, occurrences
+from fast_response import FastJSONResponse, check_shape, table_response
+from store_pool import StorePool
+from task_io import FORMATS, TASK_FIELDS, RecordReader, encode_rows
+from task_index import TaskIndex
 
 
 # -----------------------------
 # Paths
 # -----------------------------
+# OPTITASK_DB / OPTITASK_STORE_DIR / OPTITASK_C_CORE move the database, the
+# C store files and the built core elsewhere (the tests use a scratch dir).
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "tasks.db")
+DB_PATH = os.environ.get("OPTITASK_DB") or os.path.join(BASE_DIR, "tasks.db")
 
 C_CORE_DIR = os.path.join(BASE_DIR, "c_core")
-DLL_PATH = os.path.join(C_CORE_DIR, "task_manager.dll")
+DLL_PATH = os.environ.get("OPTITASK_C_CORE") or os.path.join(C_CORE_DIR, "task_manager.dll")
+
+# C core persistence: one snapshot + append-only journal per user store
+STORE_DIR = os.environ.get("OPTITASK_STORE_DIR") or os.path.join(BASE_DIR, "c_store")
+JOURNAL_COMPACT_AT = 5000   # journal records before we write a fresh snapshot
+C_STORE_MEMORY_CAP = 256 * 1024 * 1024   # resident C stores before LRU eviction
+
+# Running several workers (uvicorn --workers N)? Set OPTITASK_SHARED_STORE=1
+# so they all map one shared-memory C store per user instead of each loading
+# a private copy that drifts as soon as another worker writes.
+C_STORE_SHARED = os.environ.get("OPTITASK_SHARED_STORE") == "1"
+C_SHARED_MAX_TASKS = 100_000   # per user; fixed when the segment is created
+SUGGESTER_DIR = os.path.join(STORE_DIR, "suggester")   # one saved category/priority model per user
+SUGGESTER_MEMORY_CAP = 64 * 1024 * 1024   # resident suggestion models before LRU eviction
+SUGGESTER_SAVE_EVERY = 200   # updates to a user's model before it is written out again
+
+# Completed tasks move to tasks_archive (out of the C stores) this many days
+# after they were done; 0 keeps everything live.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("OPTITASK_ARCHIVE_AFTER_DAYS", "30"))
 
 
 # -----------------------------
 # C Core (ctypes)
 # -----------------------------
+class TmDepInfo(ctypes.Structure):
+    # mirrors TmDepInfo in task_manager.h
+    _fields_ = [
+        ("id", ctypes.c_int),
+        ("depends_on", ctypes.c_int),
+        ("priority", ctypes.c_int),
+        ("duration_mins", ctypes.c_int),
+        ("deadline_day", ctypes.c_int),
+        ("start_min", ctypes.c_int),
+        ("stress", ctypes.c_int),
+        ("chain_mins", ctypes.c_longlong),
+        ("tail_mins", ctypes.c_longlong),
+    ]
+
+
+class TmTaskRow(ctypes.Structure):
+    # mirrors TmTaskRow in task_manager.h
+    _fields_ = [
+        ("id", ctypes.c_int),
+        ("name", ctypes.c_char_p),
+        ("category", ctypes.c_char_p),
+        ("priority", ctypes.c_int),
+        ("deadline", ctypes.c_char_p),
+        ("start_time", ctypes.c_char_p),
+        ("duration_mins", ctypes.c_int),
+        ("status", ctypes.c_int),
+        ("depends_on", ctypes.c_int),
+        ("stress", ctypes.c_int),
+    ]
+
+
+class TmBucketDigest(ctypes.Structure):
+    # mirrors TmBucketDigest in task_manager.h
+    _fields_ = [
+        ("bucket", ctypes.c_int),
+        ("rows", ctypes.c_int),
+        ("digest", ctypes.c_ulonglong),
+    ]
+
+
 def load_c_core():
     if not os.path.exists(DLL_PATH):
         raise RuntimeError(
             f"task_manager.dll not found at: {DLL_PATH}\n"
-            f"Build it first: backend\\c_core\\build.bat"
+            f"Build it first: backend\\c_core\\build.bat (Windows) or backend/c_core/build.sh"
         )
 
     lib = ctypes.CDLL(DLL_PATH)
-
-    # void tm_init(void);
-    lib.tm_init.argtypes = []
-    lib.tm_init.restype = None
-
-    # void tm_reset(void);
-    lib.tm_reset.argtypes = []
+    if not hasattr(lib, "tm_resync_rows"):   # newest export: anything older is a stale build
+        raise RuntimeError(
+            f"{DLL_PATH} was built from an older task_manager.c.\n"
+            f"Rebuild it: backend\\c_core\\build.bat (Windows) or backend/c_core/build.sh"
+        )
+    store = ctypes.c_void_p   # TmStore*
+
+    # TmStore* tm_store_create(void); void tm_store_free(TmStore*); long long tm_store_bytes(TmStore*);
+    lib.tm_store_create.argtypes = []
+    lib.tm_store_create.restype = store
+    lib.tm_store_free.argtypes = [store]
+    lib.tm_store_free.restype = None
+    lib.tm_store_bytes.argtypes = [store]
+    lib.tm_store_bytes.restype = ctypes.c_longlong
+
+    # TmStore* tm_store_open_shared(const char* name, int max_tasks, int* created);
+    lib.tm_store_open_shared.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int)]
+    lib.tm_store_open_shared.restype = store
+
+    # long long tm_store_seq(TmStore*);
+    lib.tm_store_seq.argtypes = [store]
+    lib.tm_store_seq.restype = ctypes.c_longlong
+
+    # void tm_reset(TmStore*);
+    lib.tm_reset.argtypes = [store]
     lib.tm_reset.restype = None
 
-    # int tm_add_task(const char*, const char*, int, const char*, const char*, int, int);
+    # int tm_add_task(TmStore*, const char*, const char*, int, const char*, const char*, int, int, int, int);
     lib.tm_add_task.argtypes = [
+        store,
         ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int,
-        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int
+        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int,
+        ctypes.c_int, ctypes.c_int
     ]
     lib.tm_add_task.restype = ctypes.c_int
 
-    # int tm_add_task_with_id(int, const char*, const char*, int, const char*, const char*, int, int);
+    # int tm_add_task_with_id(TmStore*, int, const char*, const char*, int, const char*, const char*, int, int, int, int);
     lib.tm_add_task_with_id.argtypes = [
-        ctypes.c_int,
+        store, ctypes.c_int,
         ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int,
-        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int
+        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_int,
+        ctypes.c_int, ctypes.c_int
     ]
     lib.tm_add_task_with_id.restype = ctypes.c_int
 
-    # int tm_update_task(int, int, const char*, const char*, int, int);
-    # priority=-1 keep, deadline NULL keep, start_time NULL keep, duration=-1 keep, status=-1 keep
+    # int tm_add_tasks_with_ids(TmStore*, const TmTaskRow* rows, int n);
+    lib.tm_add_tasks_with_ids.argtypes = [store, ctypes.POINTER(TmTaskRow), ctypes.c_int]
+    lib.tm_add_tasks_with_ids.restype = ctypes.c_int
+
+    # int tm_update_task(TmStore*, int, const char*, const char*, int, const char*, const char*, int, int, int, int);
+    # name/category NULL keep, priority=-1 keep, deadline NULL keep, start_time NULL keep, duration=-1 keep,
+    # status=-1 keep, depends_on=-1 keep, stress=-1 keep. Returns -2 if depends_on would close a cycle,
+    # -3 if it names no task, -4 if a shared store has no room for the new name or category.
     lib.tm_update_task.argtypes = [
-        ctypes.c_int, ctypes.c_int,
+        store, ctypes.c_int,
+        ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int,
         ctypes.c_char_p, ctypes.c_char_p,
+        ctypes.c_int, ctypes.c_int,
         ctypes.c_int, ctypes.c_int
     ]
     lib.tm_update_task.restype = ctypes.c_int
 
-    # int tm_delete_task(int);
-    lib.tm_delete_task.argtypes = [ctypes.c_int]
+    # int tm_delete_task(TmStore*, int);
+    lib.tm_delete_task.argtypes = [store, ctypes.c_int]
     lib.tm_delete_task.restype = ctypes.c_int
 
+    # int tm_count(TmStore*);
+    lib.tm_count.argtypes = [store]
+    lib.tm_count.restype = ctypes.c_int
+
+    # int tm_sorted_ids(TmStore*, int* out, int max);
+    lib.tm_sorted_ids.argtypes = [store, ctypes.POINTER(ctypes.c_int), ctypes.c_int]
+    lib.tm_sorted_ids.restype = ctypes.c_int
+
+    # unsigned long long tm_store_digest(TmStore*, long long* seq, int* rows);
+    lib.tm_store_digest.argtypes = [store, ctypes.POINTER(ctypes.c_longlong), ctypes.POINTER(ctypes.c_int)]
+    lib.tm_store_digest.restype = ctypes.c_ulonglong
+
+    # int tm_bucket_digests(TmStore*, int shift, TmBucketDigest* out, int max);
+    lib.tm_bucket_digests.argtypes = [store, ctypes.c_int, ctypes.POINTER(TmBucketDigest), ctypes.c_int]
+    lib.tm_bucket_digests.restype = ctypes.c_int
+
+    # int tm_resync_rows(TmStore*, int lo, int hi, const TmTaskRow* rows, int n, long long expect_seq);
+    lib.tm_resync_rows.argtypes = [
+        store, ctypes.c_int, ctypes.c_int, ctypes.POINTER(TmTaskRow), ctypes.c_int, ctypes.c_longlong
+    ]
+    lib.tm_resync_rows.restype = ctypes.c_int
+
+    # int tm_dependency_order(TmStore*, TmDepInfo* out, int max);
+    lib.tm_dependency_order.argtypes = [store, ctypes.POINTER(TmDepInfo), ctypes.c_int]
+    lib.tm_dependency_order.restype = ctypes.c_int
+
+    # int tm_snapshot_save(TmStore*, const char* path, unsigned long long seq);
+    lib.tm_snapshot_save.argtypes = [store, ctypes.c_char_p, ctypes.c_ulonglong]
+    lib.tm_snapshot_save.restype = ctypes.c_int
+
+    # long long tm_snapshot_load(TmStore*, const char* snap_path, const char* journal_path);
+    lib.tm_snapshot_load.argtypes = [store, ctypes.c_char_p, ctypes.c_char_p]
+    lib.tm_snapshot_load.restype = ctypes.c_longlong
+
+    # int tm_journal_open(TmStore*, const char*); void tm_journal_close(TmStore*); int tm_journal_entries(TmStore*);
+    lib.tm_journal_open.argtypes = [store, ctypes.c_char_p]
+    lib.tm_journal_open.restype = ctypes.c_int
+    lib.tm_journal_close.argtypes = [store]
+    lib.tm_journal_close.restype = None
+    lib.tm_journal_entries.argtypes = [store]
+    lib.tm_journal_entries.restype = ctypes.c_int
+
     return lib
 
 
 lib = load_c_core()
-lib.tm_init()
 
 
 # -----------------------------
@@ -86,40 +239,319 @@ def db_conn():
     return conn
 
 
+# AUTOINCREMENT: an id is never handed out twice, so archived rows (which
+# keep theirs) and import_ids mappings can't collide with newer tasks
+TASKS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  category TEXT NOT NULL DEFAULT 'general',
+  priority INTEGER NOT NULL DEFAULT 3,
+  deadline TEXT NOT NULL DEFAULT '',
+  start_time TEXT NOT NULL DEFAULT '',
+  duration INTEGER NOT NULL DEFAULT 30,
+  status INTEGER NOT NULL DEFAULT 0,
+  user_id INTEGER NOT NULL DEFAULT 0,
+  stress_level INTEGER NOT NULL DEFAULT 5,
+  depends_on_id INTEGER NOT NULL DEFAULT 0,
+  series_id INTEGER NOT NULL DEFAULT 0,
+  occurrence TEXT NOT NULL DEFAULT '',
+  deadline_day INTEGER,
+  start_min INTEGER,
+  completed_day INTEGER
+);
+"""
+
+
+def _tasks_autoincrement(conn) -> None:
+    """
+    Rebuild a tasks table from before AUTOINCREMENT with it, the counter
+    starting above every id in tasks and tasks_archive. The table's indexes
+    and triggers go with the old one; db_init creates them again after this.
+    """
+    columns = ", ".join(r[1] for r in conn.execute("PRAGMA table_info(tasks)").fetchall())
+    has_archive = conn.execute("SELECT 1 FROM sqlite_master WHERE name='tasks_archive'").fetchone()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DROP TABLE IF EXISTS tasks_autoinc")
+        conn.execute(TASKS_TABLE.format(name="tasks_autoinc"))
+        conn.execute(f"INSERT INTO tasks_autoinc({columns}) SELECT {columns} FROM tasks")
+        top = conn.execute(
+            "SELECT MAX(COALESCE((SELECT MAX(id) FROM tasks), 0), "
+            + ("COALESCE((SELECT MAX(id) FROM tasks_archive), 0))" if has_archive else "0)")
+        ).fetchone()[0]
+        conn.execute("DROP TABLE tasks")
+        conn.execute("ALTER TABLE tasks_autoinc RENAME TO tasks")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name IN ('tasks', 'tasks_autoinc')")
+        conn.execute("INSERT INTO sqlite_sequence(name, seq) VALUES('tasks', ?)", (top,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
 def db_init():
     conn = db_conn()
-    conn.execute(
+    conn.execute(TASKS_TABLE.format(name="tasks"))
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(tasks)").fetchall()]
+    if "user_id" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN user_id INTEGER NOT NULL DEFAULT 0")
+    # same columns migrate_db.py adds, for databases that never ran it
+    if "stress_level" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN stress_level INTEGER NOT NULL DEFAULT 5")
+    if "depends_on_id" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN depends_on_id INTEGER NOT NULL DEFAULT 0")
+    # occurrence of a recurring series that was completed or edited (see task_series)
+    if "series_id" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN series_id INTEGER NOT NULL DEFAULT 0")
+    if "occurrence" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN occurrence TEXT NOT NULL DEFAULT ''")
+    # Integer copies of deadline/start_time for range queries and sorting:
+    # days since 1970-01-01 and minutes since midnight, -1 = none. NULL until
+    # the backfill (migrate_db.backfill_time_columns) reaches the row.
+    if "deadline_day" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN deadline_day INTEGER")
+        conn.execute("ALTER TABLE tasks ADD COLUMN start_min INTEGER")
+    if "completed_day" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN completed_day INTEGER")
+    conn.commit()
+    tasks_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='tasks'").fetchone()[0]
+    if "AUTOINCREMENT" not in tasks_sql.upper():
+        _tasks_autoincrement(conn)
+
+    # tenant_seq counts row writes per user; a user's C store snapshot records
+    # the value it was taken at, so a lazy load can tell if snapshot+journal
+    # are current. (Replaces the old global meta.write_seq triggers.)
+    conn.executescript(
         """
-        CREATE TABLE IF NOT EXISTS tasks (
+        -- (user_id, rowid): keyset paging in id order for /tasks/export
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id);
+
+        CREATE TABLE IF NOT EXISTS tenant_seq (
+          user_id INTEGER PRIMARY KEY,
+          seq INTEGER NOT NULL
+        );
+
+        DROP TRIGGER IF EXISTS tasks_seq_ins;
+        DROP TRIGGER IF EXISTS tasks_seq_upd;
+        DROP TRIGGER IF EXISTS tasks_seq_del;
+        DROP TRIGGER IF EXISTS tasks_tseq_upd;
+
+        CREATE TRIGGER IF NOT EXISTS tasks_tseq_ins AFTER INSERT ON tasks BEGIN
+          INSERT OR IGNORE INTO tenant_seq(user_id, seq) VALUES(NEW.user_id, 0);
+          UPDATE tenant_seq SET seq = seq + 1 WHERE user_id = NEW.user_id;
+        END;
+        -- Every column except deadline_day/start_min, which are derived (a
+        -- new column must be added here, under a new trigger name).
+        CREATE TRIGGER IF NOT EXISTS tasks_tseq_set AFTER UPDATE OF
+          name, category, priority, deadline, start_time, duration, status, user_id,
+          stress_level, depends_on_id, series_id, occurrence
+        ON tasks BEGIN
+          INSERT OR IGNORE INTO tenant_seq(user_id, seq) VALUES(NEW.user_id, 0);
+          UPDATE tenant_seq SET seq = seq + 1 WHERE user_id = NEW.user_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS tasks_tseq_del AFTER DELETE ON tasks BEGIN
+          INSERT OR IGNORE INTO tenant_seq(user_id, seq) VALUES(OLD.user_id, 0);
+          UPDATE tenant_seq SET seq = seq + 1 WHERE user_id = OLD.user_id;
+        END;
+
+        -- Deleting a prerequisite releases its dependents (the C store does
+        -- the same, and counts each released row as a write). A partial
+        -- index (depends_on_id != 0) can't serve `depends_on_id = OLD.id`,
+        -- so every delete scanned the user's rows; this one can.
+        DROP INDEX IF EXISTS idx_tasks_depends_on;
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_dep ON tasks(user_id, depends_on_id);
+        CREATE TRIGGER IF NOT EXISTS tasks_dep_release AFTER DELETE ON tasks BEGIN
+          UPDATE tasks SET depends_on_id = 0
+          WHERE depends_on_id = OLD.id AND user_id = OLD.user_id;
+        END;
+
+        -- Recurring tasks: one rule row per series. Occurrences are generated
+        -- per requested window (recurrence.py); only the ones a user completed
+        -- or edited become tasks rows, at most one per (series, date).
+        CREATE TABLE IF NOT EXISTS task_series (
           id INTEGER PRIMARY KEY,
+          user_id INTEGER NOT NULL DEFAULT 0,
           name TEXT NOT NULL,
           category TEXT NOT NULL DEFAULT 'general',
           priority INTEGER NOT NULL DEFAULT 3,
-          deadline TEXT NOT NULL DEFAULT '',
           start_time TEXT NOT NULL DEFAULT '',
           duration INTEGER NOT NULL DEFAULT 30,
-          status INTEGER NOT NULL DEFAULT 0
+          stress_level INTEGER NOT NULL DEFAULT 5,
+          rule TEXT NOT NULL,
+          start_date TEXT NOT NULL,
+          until_date TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_task_series_user ON task_series(user_id, start_date);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_occurrence
+          ON tasks(series_id, occurrence) WHERE series_id != 0;
+        """
+    )
+    conn.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS tasks_time_ins AFTER INSERT ON tasks BEGIN
+          UPDATE tasks SET deadline_day = {day_sql("NEW.deadline")}, start_min = {minute_sql("NEW.start_time")}
+          WHERE id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS tasks_time_upd AFTER UPDATE OF deadline, start_time ON tasks BEGIN
+          UPDATE tasks SET deadline_day = {day_sql("NEW.deadline")}, start_min = {minute_sql("NEW.start_time")}
+          WHERE id = NEW.id;
+        END;
+
+        -- The local day a task was completed (days since 1970-01-01), for the
+        -- archiver: set when status flips, or when a row is inserted done
+        -- (POST /tasks, imports, completed occurrences). Rows completed
+        -- before this column existed have NULL; see archive_completed().
+        CREATE TRIGGER IF NOT EXISTS tasks_done_day AFTER UPDATE OF status ON tasks
+        WHEN NEW.status != OLD.status BEGIN
+          UPDATE tasks SET completed_day =
+            CASE WHEN NEW.status = 1 THEN CAST(julianday('now', 'localtime') - 2440587.5 AS INTEGER) END
+          WHERE id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS tasks_done_day_ins AFTER INSERT ON tasks
+        WHEN NEW.status = 1 BEGIN
+          UPDATE tasks SET completed_day = CAST(julianday('now', 'localtime') - 2440587.5 AS INTEGER)
+          WHERE id = NEW.id;
+        END;
+
+        -- Cold tier: completed tasks past ARCHIVE_AFTER_DAYS. Rows keep their
+        -- tasks.id (never handed out again); archive_id is its own key as
+        -- databases archived before AUTOINCREMENT may hold an id twice.
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+          archive_id INTEGER PRIMARY KEY,
+          id INTEGER NOT NULL,
+          user_id INTEGER NOT NULL,
+          name TEXT NOT NULL,
+          category TEXT NOT NULL,
+          priority INTEGER NOT NULL,
+          deadline TEXT NOT NULL,
+          start_time TEXT NOT NULL,
+          duration INTEGER NOT NULL,
+          status INTEGER NOT NULL,
+          depends_on_id INTEGER NOT NULL,
+          stress_level INTEGER NOT NULL,
+          series_id INTEGER NOT NULL,
+          occurrence TEXT NOT NULL,
+          done_day INTEGER NOT NULL
         );
+        CREATE INDEX IF NOT EXISTS idx_archive_user ON tasks_archive(user_id, done_day, archive_id);
+        CREATE INDEX IF NOT EXISTS idx_archive_occurrence
+          ON tasks_archive(series_id, occurrence) WHERE series_id != 0;
         """
     )
+
+    # /analytics counters (analytics.py); rows written before the triggers
+    # existed are counted once, here
+    has_rollup = conn.execute("SELECT 1 FROM sqlite_master WHERE name='task_rollup'").fetchone()
+    conn.executescript(ROLLUP_TABLE + ROLLUP_TRIGGERS)
+    if not has_rollup:
+        rebuild_rollups(conn)
+    # C store / SQLite consistency digests (consistency.py), same deal; also
+    # when they were kept with an older hash
+    conn.executescript(DIGEST_TABLE + DIGEST_TRIGGERS)
+    if not digests_current(conn):
+        rebuild_digests(conn)
+    if not backfill_done(conn) and not conn.execute("SELECT 1 FROM tasks WHERE deadline_day IS NULL LIMIT 1").fetchone():
+        # nothing predates the columns (e.g. a new database): no backfill to run
+        conn.execute("INSERT OR REPLACE INTO migrations(name, last_id, done) VALUES(?, 0, 1)", (TIME_BACKFILL,))
+    if backfill_done(conn):
+        conn.executescript(TIME_INDEXES)
+    else:
+        # TEXT ordering for queries until the backfill swaps in TIME_INDEXES
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks(user_id, status, priority, deadline, start_time)")
+
+    # Full-text index over name/category for /tasks/search. External content:
+    # the text lives in tasks, the index is kept in step by triggers.
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name='tasks_fts'").fetchone()
+    try:
+        conn.executescript(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+              name, category,
+              content='tasks', content_rowid='id',
+              tokenize='unicode61 remove_diacritics 2'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_ins AFTER INSERT ON tasks BEGIN
+              INSERT INTO tasks_fts(rowid, name, category) VALUES (NEW.id, NEW.name, NEW.category);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_del AFTER DELETE ON tasks BEGIN
+              INSERT INTO tasks_fts(tasks_fts, rowid, name, category) VALUES ('delete', OLD.id, OLD.name, OLD.category);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_upd AFTER UPDATE OF name, category ON tasks BEGIN
+              INSERT INTO tasks_fts(tasks_fts, rowid, name, category) VALUES ('delete', OLD.id, OLD.name, OLD.category);
+              INSERT INTO tasks_fts(rowid, name, category) VALUES (NEW.id, NEW.name, NEW.category);
+            END;
+            """
+        )
+        if not has_fts:
+            # existing database: index the rows that predate the table
+            conn.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        pass  # SQLite built without FTS5: search_tasks() falls back to LIKE
     conn.commit()
     conn.close()
 
 
-def sync_db_to_c():
+def db_has_fts() -> bool:
+    conn = db_conn()
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name='tasks_fts'").fetchone()
+    conn.close()
+    return row is not None
+
+
+def db_user_seq(conn, user_id: int) -> int:
+    row = conn.execute("SELECT seq FROM tenant_seq WHERE user_id=?", (user_id,)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def db_user_digest(conn, user_id: int):
+    """(digest, rows) of the user's tasks from task_digest; the digest as the C store's unsigned value."""
+    row = conn.execute(
+        "SELECT digest, tasks FROM task_digest WHERE user_id=? AND bucket=?", (user_id, DIGEST_TOTAL)
+    ).fetchone()
+    return (int(row[0]) & DIGEST_MASK, int(row[1])) if row else (0, 0)
+
+
+def c_store_digest(store):
+    """(digest, rows, seq) of a C store, read under one lock."""
+    seq, rows = ctypes.c_longlong(), ctypes.c_int()
+    digest = lib.tm_store_digest(store, ctypes.byref(seq), ctypes.byref(rows))
+    return digest, rows.value, seq.value
+
+
+def _store_paths(user_id: int):
+    base = os.path.join(STORE_DIR, str(int(user_id)))
+    return (base + ".snap").encode("utf-8"), (base + ".journal").encode("utf-8")
+
+
+def _shm_name(user_id: int) -> bytes:
+    # one segment per database + user, so two checkouts on a box don't collide
+    db_key = hashlib.sha1(DB_PATH.encode("utf-8")).hexdigest()[:12]
+    return f"optitask-{db_key}-{int(user_id)}".encode("utf-8")
+
+
+def sync_db_to_c(store, user_id: int) -> int:
     """
-    Load DB rows into the C core with the SAME ids.
+    Load one user's DB rows into their C store with the SAME ids.
+    Returns the tenant_seq the rows were read at.
     """
-    lib.tm_reset()
-
     conn = db_conn()
+    conn.execute("BEGIN")   # rows and seq from one read transaction
+    seq = db_user_seq(conn, user_id)
     rows = conn.execute(
-        "SELECT id, name, category, priority, deadline, start_time, duration, status FROM tasks"
+        "SELECT id, name, category, priority, deadline, start_time, duration, status, depends_on_id, stress_level "
+        "FROM tasks WHERE user_id=?",
+        (user_id,),
     ).fetchall()
+    conn.commit()
     conn.close()
 
+    lib.tm_reset(store)
+
     for r in rows:
         lib.tm_add_task_with_id(
+            store,
             int(r["id"]),
             str(r["name"]).encode("utf-8"),
             str(r["category"]).encode("utf-8"),
@@ -128,17 +560,145 @@ def sync_db_to_c():
             str(r["start_time"]).encode("utf-8"),
             int(r["duration"]),
             int(r["status"]),
+            int(r["depends_on_id"]),
+            int(r["stress_level"]),
         )
+    return seq
+
+
+def snapshot_c_store(store, user_id: int):
+    seq = lib.tm_store_seq(store)
+    if seq < 0:
+        return  # state unknown (mid-resync / crashed writer): the next open resyncs
+    snap, _ = _store_paths(user_id)
+    lib.tm_snapshot_save(store, snap, seq)
+
+
+def open_c_store(user_id: int):
+    """
+    A user's first request: map their C snapshot and replay the journal tail,
+    or attach to the shared store another worker already loaded.
+    Falls back to sync_db_to_c() when it doesn't match SQLite's tenant_seq /
+    row count / digest.
+    """
+    if C_STORE_SHARED:
+        created = ctypes.c_int(0)
+        store = lib.tm_store_open_shared(_shm_name(user_id), C_SHARED_MAX_TASKS, ctypes.byref(created))
+        fresh = bool(created.value)
+    else:
+        store = lib.tm_store_create()
+        fresh = True
+    if not store:
+        raise MemoryError("could not create the C store")
+    snap, journal = _store_paths(user_id)
+
+    have = lib.tm_snapshot_load(store, snap, journal) if fresh else lib.tm_store_seq(store)
+    for _ in range(3):
+        conn = db_conn()
+        conn.execute("BEGIN")
+        seq = db_user_seq(conn, user_id)
+        digest, count = db_user_digest(conn, user_id)
+        conn.commit()
+        conn.close()
+        if have == seq and c_store_digest(store)[:2] == (digest, count):
+            break
+        # Other workers may write to a shared store while we reload it, so
+        # check again afterwards rather than trusting one pass.
+        lib.tm_snapshot_save(store, snap, sync_db_to_c(store, user_id))
+        have = lib.tm_store_seq(store)
+
+    if lib.tm_journal_entries(store) >= JOURNAL_COMPACT_AT:
+        snapshot_c_store(store, user_id)
+
+    lib.tm_journal_open(store, journal)
+    return store
+
+
+def close_c_store(user_id: int, store) -> None:
+    """Evicted: persist as a fresh snapshot so the next load is a straight read."""
+    snapshot_c_store(store, user_id)
+    lib.tm_store_free(store)
 
 
 db_init()
-sync_db_to_c()
+FTS_ENABLED = db_has_fts()
+os.makedirs(STORE_DIR, exist_ok=True)
+
+# Queries use deadline_day/start_min once every row has them; until the
+# backfill thread gets there they compare the TEXT columns instead.
+time_columns_ready = threading.Event()
+
+
+def _backfill_time_columns():
+    try:
+        backfill_time_columns(DB_PATH)
+    except sqlite3.Error as e:
+        print(f"deadline_day/start_min backfill stopped, resumes on next start: {e}")
+        return
+    time_columns_ready.set()
+
+
+def start_time_backfill():
+    conn = db_conn()
+    done = backfill_done(conn)
+    conn.commit()
+    conn.close()
+    if done:
+        time_columns_ready.set()
+    else:
+        threading.Thread(target=_backfill_time_columns, name="time-backfill", daemon=True).start()
+
+
+start_time_backfill()
+
+c_stores = StorePool(open_c_store, close_c_store, lib.tm_store_bytes, C_STORE_MEMORY_CAP)
+
+
+def _index_rows(user_id: int):
+    conn = db_conn()
+    conn.execute("BEGIN")   # rows and seq from one read transaction
+    seq = db_user_seq(conn, user_id)
+    rows = conn.execute("SELECT id, name, status FROM tasks WHERE user_id=?", (user_id,)).fetchall()
+    conn.commit()
+    conn.close()
+    return seq, [(int(r["id"]), r["name"], int(r["status"])) for r in rows]
+
+
+task_index = TaskIndex(_index_rows)
+
+
+def ensure_task_index(conn, user_id: int) -> None:
+    """(Re)build a user's similarity index if it's missing or behind SQLite."""
+    if task_index.seq(user_id) != db_user_seq(conn, user_id):
+        task_index.load_user(user_id)
+
+
+def _suggester_rows(user_id: int):
+    conn = db_conn()
+    conn.execute("BEGIN")   # rows and seq from one read transaction
+    seq = db_user_seq(conn, user_id)
+    rows = conn.execute(
+        "SELECT id, name, category, priority, deadline, start_time FROM tasks WHERE user_id=?", (user_id,)
+    ).fetchall()
+    conn.commit()
+    conn.close()
+    return seq, rows
+
+
+ml_suggester = MLSuggester(_suggester_rows, SUGGESTER_DIR, SUGGESTER_MEMORY_CAP, SUGGESTER_SAVE_EVERY)
+
+
+def ensure_suggester(conn, user_id: int) -> None:
+    """Load (or retrain) a user's suggestion model if it's missing or behind SQLite."""
+    seq = db_user_seq(conn, user_id)
+    if ml_suggester.seq(user_id) != seq:
+        ml_suggester.load_user(user_id, seq)
 
 
 # -----------------------------
 # FastAPI
 # -----------------------------
-app = FastAPI(title="Smart Task Prioritizer API")
+app = FastAPI(title="Smart Task Prioritizer API", default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -146,9 +706,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 
+@app.on_event("shutdown")
+def _flush_c_stores():
+    # snapshot every loaded store so the next start skips journal replay
+    c_stores.close_all()
+
+
+@app.on_event("shutdown")
+def _save_suggester():
+    # models are also written every SUGGESTER_SAVE_EVERY updates; this saves the rest
+    ml_suggester.save_all()
+
+
 # -----------------------------
 # Models
 # -----------------------------
@@ -160,6 +733,8 @@ class TaskCreate(BaseModel):
     start_time: str = ""        # HH:MM
     duration: int = 30          # minutes
     status: int = 0             # 0=active, 1=done
+    depends_on_id: int = 0      # prerequisite task id, 0 = none
+    stress_level: int = 5       # 1 (easy) .. 10 (draining)
 
 
 class TaskPatch(BaseModel):
@@ -170,6 +745,20 @@ class TaskPatch(BaseModel):
     start_time: Optional[str] = None
     duration: Optional[int] = None
     status: Optional[int] = None
+    depends_on_id: Optional[int] = None
+    stress_level: Optional[int] = None
+
+
+class SeriesCreate(BaseModel):
+    name: str
+    rule: str                   # "daily", "weekly", "weekly:0,2,4" (0=Mon), "every:N" (days)
+    category: str = "general"
+    priority: int = 3
+    start_date: str = ""        # YYYY-MM-DD, first day it can occur (default today)
+    until_date: str = ""        # last day it can occur, "" = no end
+    start_time: str = ""        # HH:MM
+    duration: int = 30          # minutes
+    stress_level: int = 5
 
 
 class CommandIn(BaseModel):
@@ -180,6 +769,16 @@ class ChatIn(BaseModel):
     message: str
 
 
+class SuggestItem(BaseModel):
+    text: str
+    date: str = ""              # YYYY-MM-DD, if the task will have one
+    time: str = ""              # HH:MM
+
+
+class SuggestIn(BaseModel):
+    items: List[SuggestItem]
+
+
 # -----------------------------
 # Helpers
 # -----------------------------
@@ -195,22 +794,198 @@ def _norm_time(t: str) -> str:
     return (t or "").strip()
 
 
+STRESS_MIN, STRESS_MAX, STRESS_DEFAULT = 1, 10, 5
+# 1 (top) .. 5; the C core's update calls read -1 as "keep"
+PRIORITY_MIN, PRIORITY_MAX = 1, 5
+DURATION_MAX = 365 * 24 * 60    # minutes; the C core keeps an int32
+
+
+def _check_stress(level: int) -> int:
+    if not STRESS_MIN <= int(level) <= STRESS_MAX:
+        raise HTTPException(status_code=400, detail=f"stress_level must be {STRESS_MIN}-{STRESS_MAX}")
+    return int(level)
+
+
+def _check_priority(priority: int) -> int:
+    if not PRIORITY_MIN <= int(priority) <= PRIORITY_MAX:
+        raise HTTPException(status_code=400, detail=f"priority must be {PRIORITY_MIN}-{PRIORITY_MAX}")
+    return int(priority)
+
+
+def _check_status(status: int) -> int:
+    # the C core keeps a byte: anything else would be stored truncated
+    if int(status) not in (0, 1):
+        raise HTTPException(status_code=400, detail="status must be 0 (active) or 1 (done)")
+    return int(status)
+
+
+def _check_duration(minutes: int) -> int:
+    if not 1 <= int(minutes) <= DURATION_MAX:
+        raise HTTPException(status_code=400, detail=f"duration must be 1-{DURATION_MAX} minutes")
+    return int(minutes)
+
+
+def _check_prerequisite(conn, user_id: int, depends_on_id: int) -> int:
+    if depends_on_id and not conn.execute(
+        "SELECT 1 FROM tasks WHERE id=? AND user_id=?", (int(depends_on_id), user_id)
+    ).fetchone():
+        raise HTTPException(status_code=400, detail="depends_on_id: prerequisite task not found")
+    return int(depends_on_id or 0)
+
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _day_number(d: date) -> int:
+    """Days since 1970-01-01: the deadline_day column and the C core's day numbers."""
+    return (d - _EPOCH).days
+
+
+def _parse_day(value: str, field: str) -> date:
+    try:
+        return date.fromisoformat((value or "").strip())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field} must be YYYY-MM-DD")
+
+
+def current_user(x_user_id: int = Header(0)) -> int:
+    """
+    Tenant for this request, from the X-User-Id header (0 = single-user default).
+    Auth is out of scope here: put this behind something that sets the header.
+    """
+    return int(x_user_id)
+
+
+def _task_changed(op: str, task_id: int, user_id: int, store) -> None:
+    """
+    Record a write in the change feed; /events subscribers get the row payload.
+    Keeps the user's suggestion model, and similarity index if it has been
+    built, current.
+    `store` is the user's (pinned) C store, compacted here when its journal is long.
+    """
+    row = None
+    conn = db_conn()
+    if op == "upsert":
+        r = conn.execute(
+            "SELECT id, name, category, priority, deadline, start_time, duration, status, depends_on_id, stress_level "
+            "FROM tasks WHERE id=?",
+            (int(task_id),),
+        ).fetchone()
+        if r is None:
+            op = "delete"
+        else:
+            row = dict(r)
+    seq = db_user_seq(conn, user_id)
+    conn.close()
+    change_feed.record(op, task_id, row, user_id=user_id)
+    if task_index.is_loaded(user_id):
+        task_index.apply(user_id, op, task_id, row, seq)
+    ml_suggester.apply(user_id, op, task_id, row, seq)
+
+    if lib.tm_journal_entries(store) >= JOURNAL_COMPACT_AT:
+        snapshot_c_store(store, user_id)
+
+
+change_feed.add_listener(event_hub.publish)
+
+
 # -----------------------------
 # Core endpoints
 # -----------------------------
+# GET /tasks?from=&to= columns; occurrences (id=None) are merged in as tuples
+WINDOW_COLUMNS = TASK_FIELDS + ("series_id", "occurrence")
+_window_order = operator.itemgetter(
+    *(WINDOW_COLUMNS.index(c) for c in ("status", "priority", "deadline", "start_time"))
+)
+
+
 @app.get("/tasks")
-def list_tasks():
+def list_tasks(
+    request: Request,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    shape: str = "rows",
+    user_id: int = Depends(current_user),
+):
+    """
+    All of the user's task rows. With ?from=&to= (YYYY-MM-DD, inclusive) only
+    rows due in that window, plus the recurring occurrences that fall in it
+    (id=null, series_id, occurrence; see /series). Windowed lists carry no
+    ETag: they change with the rules and the calendar, not just row writes.
+    ?shape=columns returns {"columns", "rows"} instead of one object per row;
+    Accept: application/x-msgpack returns either shape as MessagePack.
+    """
+    check_shape(shape)
+    if start is not None or end is not None:
+        first = _parse_day(start or _today_iso(), "from")
+        last = _parse_day(end, "to") if end else first
+        if not 0 <= (last - first).days < SERIES_MAX_WINDOW_DAYS:
+            raise HTTPException(status_code=400, detail=f"to must be on or after from, at most {SERIES_MAX_WINDOW_DAYS} days")
+        if time_columns_ready.is_set():
+            where, bounds = "deadline_day BETWEEN ? AND ?", (_day_number(first), _day_number(last))
+        else:
+            where, bounds = "deadline BETWEEN ? AND ?", (first.isoformat(), last.isoformat())
+        conn = db_conn()
+        cur = conn.cursor()
+        cur.row_factory = None   # plain tuples, encoded without a dict per row
+        rows = cur.execute(
+            f"SELECT {', '.join(WINDOW_COLUMNS)} FROM tasks WHERE user_id=? AND {where}", (user_id, *bounds)
+        ).fetchall()
+        rows += [tuple(o[c] for c in WINDOW_COLUMNS) for o in series_window(conn, user_id, first, last)]
+        conn.close()
+        rows.sort(key=_window_order)
+        return table_response(request, WINDOW_COLUMNS, rows, shape)
+
+    # Read the version BEFORE the query: a write racing with us can only make
+    # the ETag older than the body, never newer. The ETag is this user's
+    # version, so it only matches their own list.
+    etag = change_feed.etag(user_id)
+    headers = {"ETag": etag, "Vary": "X-User-Id"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "X-User-Id, Accept"})
+
+    order = "deadline_day ASC, start_min ASC" if time_columns_ready.is_set() else "deadline ASC, start_time ASC"
     conn = db_conn()
-    rows = conn.execute(
-        "SELECT id, name, category, priority, deadline, start_time, duration, status "
-        "FROM tasks ORDER BY status ASC, priority ASC, deadline ASC, start_time ASC"
+    cur = conn.cursor()
+    cur.row_factory = None
+    rows = cur.execute(
+        f"SELECT {', '.join(TASK_FIELDS)} FROM tasks WHERE user_id=? ORDER BY status ASC, priority ASC, {order}",
+        (user_id,),
     ).fetchall()
     conn.close()
-    return [dict(r) for r in rows]
+    return table_response(request, TASK_FIELDS, rows, shape, headers=headers)
+
+
+@app.get("/tasks/changes")
+def task_changes(since: int, user_id: int = Depends(current_user)):
+    """
+    Rows upserted or deleted since the given store version.
+    reset=True means `since` is too old (or from another server run): reload /tasks.
+    """
+    feed = change_feed.changes_since(since, user_id=user_id)
+    if feed["reset"]:
+        return {"version": feed["version"], "reset": True, "upserted": [], "deleted": []}
+
+    upserted = []
+    deleted = list(feed["deleted_ids"])
+    ids = feed["upserted_ids"]
+    if ids:
+        conn = db_conn()
+        rows = conn.execute(
+            "SELECT id, name, category, priority, deadline, start_time, duration, status, depends_on_id, stress_level "
+            f"FROM tasks WHERE user_id=? AND id IN ({','.join('?' * len(ids))})",
+            [user_id, *ids],
+        ).fetchall()
+        conn.close()
+        upserted = [dict(r) for r in rows]
+        found = {r["id"] for r in upserted}
+        deleted += [i for i in ids if i not in found]
+
+    return {"version": feed["version"], "reset": False, "upserted": upserted, "deleted": deleted}
 
 
 @app.post("/tasks")
-def create_task(t: TaskCreate):
+def create_task(t: TaskCreate, user_id: int = Depends(current_user)):
     name = (t.name or "").strip()
     if not name:
         raise HTTPException(status_code=400, detail="name is required")
@@ -222,36 +997,58 @@ def create_task(t: TaskCreate):
     validation = validate_date_time(deadline, start_time)
     if not validation["valid"]:
         raise HTTPException(status_code=400, detail=validation["error"])
+    stress = _check_stress(t.stress_level)
+    priority = _check_priority(t.priority)
+    status = _check_status(t.status)
+    duration = _check_duration(t.duration)
+
+    # SQLite is the ID authority: ids are unique across every user's C store.
+    # Pin (and if need be load) the store BEFORE writing the row, so a load
+    # doesn't pick the row up and then count the add below a second time.
+    with c_stores.use(user_id) as store:
+        conn = db_conn()
+        try:
+            depends_on = _check_prerequisite(conn, user_id, t.depends_on_id)
+        except HTTPException:
+            conn.close()
+            raise
+        cur = conn.execute(
+            "INSERT INTO tasks(name, category, priority, deadline, start_time, duration, status, user_id, "
+            "depends_on_id, stress_level) VALUES(?,?,?,?,?,?,?,?,?,?)",
+            (
+                name, t.category or "general", priority, deadline, start_time, duration, status,
+                user_id, depends_on, stress,
+            ),
+        )
+        new_id = int(cur.lastrowid)
+        conn.commit()
+        conn.close()
 
-    # Use C-core as ID authority
-    new_id = lib.tm_add_task(
-        name.encode("utf-8"),
-        (t.category or "general").encode("utf-8"),
-        int(t.priority),
-        deadline.encode("utf-8"),
-        start_time.encode("utf-8"),
-        int(t.duration),
-        int(t.status),
-    )
-
-    conn = db_conn()
-    conn.execute(
-        "INSERT INTO tasks(id, name, category, priority, deadline, start_time, duration, status) "
-        "VALUES(?,?,?,?,?,?,?,?)",
-        (int(new_id), name, t.category or "general", int(t.priority), deadline, start_time, int(t.duration), int(t.status)),
-    )
-    conn.commit()
-    conn.close()
+        lib.tm_add_task_with_id(
+            store,
+            new_id,
+            name.encode("utf-8"),
+            (t.category or "general").encode("utf-8"),
+            priority,
+            deadline.encode("utf-8"),
+            start_time.encode("utf-8"),
+            duration,
+            status,
+            depends_on,
+            stress,
+        )
+        _task_changed("upsert", new_id, user_id, store)
 
-    return {"id": int(new_id)}
+    return {"id": new_id}
 
 
 @app.patch("/tasks/{task_id}")
-def patch_task(task_id: int, p: TaskPatch):
+def patch_task(task_id: int, p: TaskPatch, user_id: int = Depends(current_user)):
     conn = db_conn()
     row = conn.execute(
-        "SELECT id, name, category, priority, deadline, start_time, duration, status FROM tasks WHERE id=?",
-        (task_id,),
+        "SELECT id, name, category, priority, deadline, start_time, duration, status, depends_on_id, stress_level "
+        "FROM tasks WHERE id=? AND user_id=?",
+        (task_id, user_id),
     ).fetchone()
 
     if not row:
@@ -265,124 +1062,1156 @@ def patch_task(task_id: int, p: TaskPatch):
     new_start_time = (_norm_time(p.start_time) if p.start_time is not None else row["start_time"])
     new_duration = (p.duration if p.duration is not None else row["duration"])
     new_status = (p.status if p.status is not None else row["status"])
-
-    if not str(new_name).strip():
+    new_depends_on = (p.depends_on_id if p.depends_on_id is not None else row["depends_on_id"])
+    new_stress = (p.stress_level if p.stress_level is not None else row["stress_level"])
+
+    new_name = str(new_name).strip()
+    new_category = str(new_category).strip() or "general"
+    try:
+        if not new_name:
+            raise HTTPException(status_code=400, detail="name cannot be empty")
+        new_stress = _check_stress(new_stress)
+        new_priority = _check_priority(new_priority)
+        # only what is being set: older rows may hold values these refuse
+        if p.status is not None:
+            new_status = _check_status(new_status)
+        if p.duration is not None:
+            new_duration = _check_duration(new_duration)
+        moved = int(new_depends_on or 0) != int(row["depends_on_id"])
+        if moved:
+            new_depends_on = _check_prerequisite(conn, user_id, new_depends_on)
+    finally:
         conn.close()
-        raise HTTPException(status_code=400, detail="name cannot be empty")
 
-    conn.execute(
-        "UPDATE tasks SET name=?, category=?, priority=?, deadline=?, start_time=?, duration=?, status=? WHERE id=?",
-        (
-            str(new_name).strip(),
-            str(new_category).strip() or "general",
-            int(new_priority),
-            str(new_deadline).strip(),
-            str(new_start_time).strip(),
-            int(new_duration),
-            int(new_status),
-            int(task_id),
-        ),
-    )
-    conn.commit()
-    conn.close()
+    with c_stores.use(user_id) as store:
+        def apply_to_c(name, category, priority, deadline, start_time, duration, status, depends_on, stress):
+            return lib.tm_update_task(
+                store, int(task_id), str(name).encode("utf-8"), str(category).encode("utf-8"), int(priority),
+                str(deadline).encode("utf-8"), str(start_time).encode("utf-8"), int(duration), int(status),
+                int(depends_on) if moved else -1, int(stress),
+            )
 
-    # Sync to C
-    lib.tm_update_task(
-        int(task_id),
-        int(new_priority),
-        str(new_deadline).encode("utf-8"),
-        str(new_start_time).encode("utf-8"),
-        int(new_duration),
-        int(new_status),
-    )
+        # SQLite first, scoped to the user, with its transaction held open
+        # while the C store applies the change: C rejects a dependency that
+        # would close a cycle under its write lock, and then the row is rolled
+        # back. Two racing patches queue on SQLite's write lock meanwhile.
+        conn = db_conn()
+        try:
+            cur = conn.execute(
+                "UPDATE tasks SET name=?, category=?, priority=?, deadline=?, start_time=?, duration=?, status=?, "
+                "depends_on_id=?, stress_level=? WHERE id=? AND user_id=?",
+                (
+                    new_name,
+                    new_category,
+                    int(new_priority),
+                    str(new_deadline).strip(),
+                    str(new_start_time).strip(),
+                    int(new_duration),
+                    int(new_status),
+                    int(new_depends_on or 0),
+                    new_stress,
+                    int(task_id),
+                    user_id,
+                ),
+            )
+            if not cur.rowcount:
+                raise HTTPException(status_code=404, detail="task not found")     # deleted meanwhile
+            r = apply_to_c(new_name, new_category, new_priority, new_deadline, new_start_time, new_duration,
+                           new_status, new_depends_on, new_stress)
+            if r == -2:
+                raise HTTPException(status_code=409, detail="depends_on_id would create a dependency cycle")
+            if r == -3:
+                raise HTTPException(status_code=400, detail="depends_on_id: prerequisite task not found")
+            if r == -4:
+                raise HTTPException(status_code=507, detail="no room for the new name in the shared task store")
+            try:
+                conn.commit()
+            except sqlite3.Error:
+                # the row stays as it was: so does the C task
+                apply_to_c(*(row[c] for c in (
+                    "name", "category", "priority", "deadline", "start_time", "duration", "status", "depends_on_id",
+                    "stress_level",
+                )))
+                raise
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        _task_changed("upsert", task_id, user_id, store)
 
     return {"ok": True}
 
 
-@app.delete("/tasks/{task_id}")
-def delete_task(task_id: int):
-    conn = db_conn()
-    cur = conn.execute("DELETE FROM tasks WHERE id=?", (task_id,))
-    conn.commit()
-    conn.close()
+def _dependents(conn, user_id: int, task_id: int):
+    rows = conn.execute(
+        "SELECT id FROM tasks WHERE depends_on_id=? AND user_id=?", (int(task_id), user_id)
+    ).fetchall()
+    return [int(r[0]) for r in rows]
 
-    if cur.rowcount == 0:
-        raise HTTPException(status_code=404, detail="task not found")
 
-    lib.tm_delete_task(int(task_id))
+@app.delete("/tasks/{task_id}")
+def delete_task(task_id: int, user_id: int = Depends(current_user)):
+    with c_stores.use(user_id) as store:
+        conn = db_conn()
+        released = _dependents(conn, user_id, task_id)
+        cur = conn.execute("DELETE FROM tasks WHERE id=? AND user_id=?", (task_id, user_id))
+        conn.commit()
+        conn.close()
+
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="task not found")
+        lib.tm_delete_task(store, int(task_id))
+        _task_changed("delete", task_id, user_id, store)
+        for dep_id in released:   # depends_on_id was cleared by tasks_dep_release
+            _task_changed("upsert", dep_id, user_id, store)
     return {"ok": True}
 
 
+@app.get("/events")
+async def events(user_id: Optional[int] = None, header_user: int = Depends(current_user)):
+    """
+    Server-Sent Events stream of task changes:
+      event: task  data: {"version", "prev", "op": "upsert"|"delete", "id", "task"?}
+    Only the caller's own tasks are streamed; EventSource can't set headers,
+    so ?user_id= is accepted in place of X-User-Id.
+    A client that can't keep up receives `event: dropped` and should
+    reconnect and catch up with /tasks/changes.
+    """
+    sub = event_hub.subscribe(header_user if user_id is None else int(user_id))
+    return StreamingResponse(
+        event_hub.stream(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # -----------------------------
-# Phase 1: Command Bar endpoint
+# Recurring tasks
 # -----------------------------
-@app.post("/command")
-def command(cmd: CommandIn):
-    parsed = parse_command(cmd.text)
+SERIES_MAX_WINDOW_DAYS = 366     # widest window a list expands
 
-    # Check for parse error (including past date validation done in parser)
-    if not parsed["valid"]:
-        error_msg = parsed.get("error") or "Could not parse that command"
-        raise HTTPException(status_code=400, detail=error_msg)
 
-    deadline = parsed["deadline"] or _today_iso()
-    start_time = parsed["start_time"] or ""
+def series_window(conn, user_id: int, first: date, last: date):
+    """
+    Lazily yields virtual task rows for the user's series occurrences in
+    [first, last], minus the ones already stored as exception rows.
+    """
+    series = conn.execute(
+        "SELECT id, name, category, priority, start_time, duration, stress_level, rule, start_date, until_date "
+        "FROM task_series WHERE user_id=? AND start_date<=? AND (until_date='' OR until_date>=?)",
+        (user_id, last.isoformat(), first.isoformat()),
+    ).fetchall()
+    if not series:
+        return iter(())
+    ids = [s["id"] for s in series]
+    marks = ",".join("?" * len(ids))
+    taken = {
+        (r[0], r[1])
+        for r in conn.execute(
+            f"SELECT series_id, occurrence FROM tasks WHERE series_id IN ({marks}) AND occurrence BETWEEN ? AND ? "
+            f"UNION ALL SELECT series_id, occurrence FROM tasks_archive WHERE series_id IN ({marks}) "
+            "AND occurrence BETWEEN ? AND ?",
+            [*ids, first.isoformat(), last.isoformat()] * 2,
+        )
+    }
+    return expand([dict(s) for s in series], first, last, taken)
+
+
+def _insert_series(conn, user_id: int, name: str, rule: str, category: str, priority: int, start_date: date,
+                   until_date: str, start_time: str, duration: int, stress: int) -> int:
+    try:
+        rule = normalize_rule(rule, start_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cur = conn.execute(
+        "INSERT INTO task_series(user_id, name, category, priority, start_time, duration, stress_level, rule, "
+        "start_date, until_date) VALUES(?,?,?,?,?,?,?,?,?,?)",
+        (user_id, name, category or "general", int(priority), start_time, int(duration), stress, rule,
+         start_date.isoformat(), until_date),
+    )
+    return int(cur.lastrowid)
 
-    # Validate date/time is not in the past
-    validation = validate_date_time(deadline, start_time)
-    if not validation["valid"]:
-        raise HTTPException(status_code=400, detail=validation["error"])
 
-    new_id = lib.tm_add_task(
-        parsed["name"].encode("utf-8"),
-        parsed["category"].encode("utf-8"),
-        int(parsed["priority"]),
-        deadline.encode("utf-8"),
-        start_time.encode("utf-8"),
-        int(parsed["duration"]),
-        int(parsed["status"]),
-    )
+@app.post("/series")
+def create_series(sc: SeriesCreate, user_id: int = Depends(current_user)):
+    """A recurring task. Nothing is written to tasks until an occurrence is completed or edited."""
+    name = (sc.name or "").strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="name is required")
+    start_date = _parse_day(sc.start_date or _today_iso(), "start_date")
+    until_date = _norm_date(sc.until_date)
+    if until_date and _parse_day(until_date, "until_date") < start_date:
+        raise HTTPException(status_code=400, detail="until_date is before start_date")
 
     conn = db_conn()
-    conn.execute(
-        "INSERT INTO tasks(id, name, category, priority, deadline, start_time, duration, status) "
-        "VALUES(?,?,?,?,?,?,?,?)",
-        (
-            int(new_id),
-            parsed["name"],
-            parsed["category"],
-            int(parsed["priority"]),
-            deadline,
-            start_time,
-            int(parsed["duration"]),
-            int(parsed["status"]),
-        ),
-    )
-    conn.commit()
-    conn.close()
-
-    return {"id": int(new_id), "parsed": parsed}
+    try:
+        series_id = _insert_series(
+            conn, user_id, name, sc.rule, sc.category, _check_priority(sc.priority), start_date, until_date,
+            _norm_time(sc.start_time), _check_duration(sc.duration), _check_stress(sc.stress_level),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return {"id": series_id}
+
+
+@app.get("/series")
+def list_series(user_id: int = Depends(current_user)):
+    conn = db_conn()
+    rows = conn.execute(
+        "SELECT id, name, category, priority, start_time, duration, stress_level, rule, start_date, until_date "
+        "FROM task_series WHERE user_id=? ORDER BY id",
+        (user_id,),
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@app.delete("/series/{series_id}")
+def delete_series(series_id: int, user_id: int = Depends(current_user)):
+    """Stops the series. Occurrences already stored as tasks (done or edited) are kept."""
+    conn = db_conn()
+    cur = conn.execute("DELETE FROM task_series WHERE id=? AND user_id=?", (series_id, user_id))
+    conn.commit()
+    conn.close()
+    if cur.rowcount == 0:
+        raise HTTPException(status_code=404, detail="series not found")
+    return {"ok": True}
+
+
+@app.patch("/series/{series_id}/occurrences/{occurrence}")
+def patch_occurrence(series_id: int, occurrence: str, p: TaskPatch, user_id: int = Depends(current_user)):
+    """
+    Complete or edit one occurrence. The first write stores it as a tasks row
+    (series_id + occurrence) with the patch applied; later ones patch that row.
+    Returns the task id.
+    """
+    day = _parse_day(occurrence, "occurrence")
+    conn = db_conn()
+    s = conn.execute(
+        "SELECT id, name, category, priority, start_time, duration, stress_level, rule, start_date, until_date "
+        "FROM task_series WHERE id=? AND user_id=?",
+        (series_id, user_id),
+    ).fetchone()
+    existing = conn.execute(
+        "SELECT id FROM tasks WHERE series_id=? AND occurrence=? AND user_id=?", (series_id, day.isoformat(), user_id)
+    ).fetchone()
+    archived = conn.execute(
+        "SELECT 1 FROM tasks_archive WHERE series_id=? AND occurrence=? AND user_id=?",
+        (series_id, day.isoformat(), user_id),
+    ).fetchone()
+    conn.close()
+    if archived:
+        raise HTTPException(status_code=409, detail="that occurrence was completed and has been archived")
+    if existing:
+        patch_task(int(existing["id"]), p, user_id)
+        return {"id": int(existing["id"])}
+    if not s:
+        raise HTTPException(status_code=404, detail="series not found")
+    until = date.fromisoformat(s["until_date"]) if s["until_date"] else None
+    if next(occurrences(s["rule"], date.fromisoformat(s["start_date"]), day, day, until), None) is None:
+        raise HTTPException(status_code=404, detail="the series has no occurrence on that date")
+
+    name = (p.name if p.name is not None else s["name"]).strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="name cannot be empty")
+    category = (p.category if p.category is not None else s["category"]).strip() or "general"
+    priority = _check_priority(p.priority if p.priority is not None else s["priority"])
+    deadline = _norm_date(p.deadline) if p.deadline is not None else day.isoformat()
+    start_time = _norm_time(p.start_time) if p.start_time is not None else s["start_time"]
+    duration = _check_duration(p.duration) if p.duration is not None else int(s["duration"])
+    status = _check_status(p.status if p.status is not None else 0)
+    stress = _check_stress(p.stress_level if p.stress_level is not None else s["stress_level"])
+
+    with c_stores.use(user_id) as store:
+        conn = db_conn()
+        try:
+            depends_on = _check_prerequisite(conn, user_id, p.depends_on_id or 0)
+            cur = conn.execute(
+                "INSERT INTO tasks(name, category, priority, deadline, start_time, duration, status, user_id, "
+                "depends_on_id, stress_level, series_id, occurrence) VALUES(?,?,?,?,?,?,?,?,?,?,?,?)",
+                (
+                    name, category, priority, deadline, start_time, duration, status, user_id,
+                    depends_on, stress, series_id, day.isoformat(),
+                ),
+            )
+            new_id = int(cur.lastrowid)
+            conn.commit()
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=409, detail="occurrence was stored by another request; retry")
+        finally:
+            conn.close()
+
+        lib.tm_add_task_with_id(
+            store,
+            new_id,
+            name.encode("utf-8"),
+            category.encode("utf-8"),
+            priority,
+            deadline.encode("utf-8"),
+            start_time.encode("utf-8"),
+            duration,
+            status,
+            depends_on,
+            stress,
+        )
+        _task_changed("upsert", new_id, user_id, store)
+
+    return {"id": new_id}
+
+
+# -----------------------------
+# Import / export
+# -----------------------------
+EXPORT_CHUNK_ROWS = 2000
+IMPORT_CHUNK_ROWS = 5000        # rows per transaction (and per C bulk load)
+IMPORT_MAX_ERRORS = 20          # rejected rows listed in the response
+
+
+@app.get("/tasks/export")
+def export_tasks(fmt: str = Query("ndjson", alias="format"), user_id: int = Depends(current_user)):
+    """
+    Streams all of the user's tasks, in id order, as NDJSON (default) or
+    CSV (?format=csv), in the GET /tasks row shape. Rows are read
+    EXPORT_CHUNK_ROWS at a time by keyset (id > last), so memory stays flat
+    and no read lock is held while a slow client downloads.
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    def chunks():
+        # the generator is resumed on whichever threadpool thread is free
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        try:
+            last_id = 0
+            first = True
+            while True:
+                rows = conn.execute(
+                    f"SELECT {', '.join(TASK_FIELDS)} FROM tasks WHERE user_id=? AND id>? ORDER BY id LIMIT ?",
+                    (user_id, last_id, EXPORT_CHUNK_ROWS),
+                ).fetchall()
+                if rows or first:
+                    yield encode_rows(fmt, rows, header=first)
+                first = False
+                if len(rows) < EXPORT_CHUNK_ROWS:
+                    break
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    return StreamingResponse(
+        chunks(),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{fmt}"'},
+    )
+
+
+def _int_field(rec: dict, field: str, default: int) -> int:
+    """An integer from JSON (int, or a float with nothing after the point) or CSV (digits); never a bool."""
+    value = rec.get(field)
+    if value is None or value == "":
+        return default
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise ValueError(f"{field} must be an integer")
+
+
+class TaskImport:
+    """
+    One POST /tasks/import: validates records, inserts them a chunk per
+    transaction and bulk-loads each chunk into the user's C store.
+
+    Rows get new ids. A depends_on_id naming the "id" of a row earlier in
+    the same upload is mapped to that row's new id (an export lists tasks in
+    id order); anything else is dropped and counted. The id map lives in a
+    temp table, so memory doesn't grow with the upload.
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.imported = 0
+        self.skipped = 0
+        self.dependencies_dropped = 0
+        self.errors = []
+        # used from whichever threadpool thread runs the next chunk, one at a time
+        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30)
+        self.conn.execute("CREATE TEMP TABLE import_ids (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+
+    def _reject(self, record_no: int, error: str) -> None:
+        self.skipped += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"record": record_no, "error": error})
+
+    @staticmethod
+    def _validate(rec: dict):
+        name = str(rec.get("name") or "").strip()
+        if not name:
+            raise ValueError("name is required")
+        status = _int_field(rec, "status", 0)
+        if status not in (0, 1):
+            raise ValueError("status must be 0 or 1")
+        deadline = _norm_date(str(rec.get("deadline") or "")) or _today_iso()
+        start_time = _norm_time(str(rec.get("start_time") or ""))
+        # done tasks keep their (past) dates; open ones follow POST /tasks
+        validation = validate_date_time(deadline, start_time, allow_past=status == 1)
+        if not validation["valid"]:
+            raise ValueError(validation["error"])
+        duration = _int_field(rec, "duration", 30)
+        if duration < 0:
+            raise ValueError("duration must be >= 0")
+        stress = _int_field(rec, "stress_level", STRESS_DEFAULT)
+        if not STRESS_MIN <= stress <= STRESS_MAX:
+            raise ValueError(f"stress_level must be {STRESS_MIN}-{STRESS_MAX}")
+        priority = _int_field(rec, "priority", 3)
+        if not PRIORITY_MIN <= priority <= PRIORITY_MAX:
+            raise ValueError(f"priority must be {PRIORITY_MIN}-{PRIORITY_MAX}")
+        return (
+            _int_field(rec, "id", 0),
+            name,
+            str(rec.get("category") or "").strip() or "general",
+            priority,
+            deadline,
+            start_time,
+            duration,
+            status,
+            _int_field(rec, "depends_on_id", 0),
+            stress,
+        )
+
+    def add(self, records) -> None:
+        """records: (record_no, dict | error) pairs from RecordReader."""
+        valid = []
+        for record_no, rec in records:
+            if isinstance(rec, str):
+                self._reject(record_no, rec)
+                continue
+            try:
+                valid.append(self._validate(rec))
+            except ValueError as e:
+                self._reject(record_no, str(e))
+        if not valid:
+            return
+
+        conn = self.conn
+        # pinned before the INSERT so a first load can't count these rows twice
+        with c_stores.use(self.user_id) as store:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # SQLite stays the id authority: we hold the write lock, so
+                # past max(id) and AUTOINCREMENT's high-water mark is exactly
+                # what it would have assigned (archived ids stay taken)
+                next_id = conn.execute(
+                    "SELECT MAX(COALESCE((SELECT MAX(id) FROM tasks), 0), "
+                    "COALESCE((SELECT seq FROM sqlite_sequence WHERE name='tasks'), 0))"
+                ).fetchone()[0] + 1
+                wanted = list({r[8] for r in valid if r[8]})
+                earlier = dict(
+                    conn.execute(
+                        f"SELECT old, new FROM import_ids WHERE old IN ({','.join('?' * len(wanted))})", wanted
+                    ).fetchall()
+                ) if wanted else {}
+
+                rows, id_map = [], []
+                for file_id, name, category, priority, deadline, start_time, duration, status, dep, stress in valid:
+                    new_id = next_id
+                    next_id += 1
+                    depends_on = earlier.get(dep, 0) if dep else 0
+                    if dep and not depends_on:
+                        self.dependencies_dropped += 1
+                    rows.append(
+                        (new_id, name, category, priority, deadline, start_time, duration, status, self.user_id,
+                         depends_on, stress)
+                    )
+                    if file_id:
+                        earlier[file_id] = new_id
+                        id_map.append((file_id, new_id))
+
+                conn.executemany(
+                    "INSERT INTO tasks(id, name, category, priority, deadline, start_time, duration, status, "
+                    "user_id, depends_on_id, stress_level) VALUES(?,?,?,?,?,?,?,?,?,?,?)",
+                    rows,
+                )
+                conn.executemany("INSERT OR REPLACE INTO import_ids(old, new) VALUES(?,?)", id_map)
+                seq = db_user_seq(conn, self.user_id)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+            batch = (TmTaskRow * len(rows))()
+            for slot, r in zip(batch, rows):
+                slot.id, slot.priority, slot.duration_mins, slot.status = r[0], r[3], r[6], r[7]
+                slot.name = r[1].encode("utf-8")
+                slot.category = r[2].encode("utf-8")
+                slot.deadline = r[4].encode("utf-8")
+                slot.start_time = r[5].encode("utf-8")
+                slot.depends_on, slot.stress = r[9], r[10]
+            lib.tm_add_tasks_with_ids(store, batch, len(rows))
+            if lib.tm_journal_entries(store) >= JOURNAL_COMPACT_AT:
+                snapshot_c_store(store, self.user_id)
+        ml_suggester.add_rows(self.user_id, (r[:6] for r in rows), seq)
+        self.imported += len(rows)
+
+    def close(self) -> None:
+        self.conn.close()
+        if self.imported:
+            # one "reload" for the user's clients instead of a feed entry per row
+            change_feed.reset(self.user_id)
+
+
+@app.post("/tasks/import")
+async def import_tasks(
+    request: Request, fmt: Optional[str] = Query(None, alias="format"), user_id: int = Depends(current_user)
+):
+    """
+    Bulk-adds tasks from a streamed NDJSON or CSV body (?format=, else
+    from Content-Type; same fields as /tasks/export). The body is parsed as
+    it arrives and written IMPORT_CHUNK_ROWS rows per transaction, so the
+    upload is never held in memory. Invalid rows are skipped and reported.
+    Chunks commit independently: an interrupted upload keeps what was
+    imported up to that point.
+    """
+    fmt = fmt or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    job = await run_in_threadpool(TaskImport, user_id)
+    reader = RecordReader(fmt)
+    pending = []
+    try:
+        async for data in request.stream():
+            pending += reader.feed(data)
+            if len(pending) >= IMPORT_CHUNK_ROWS:
+                await run_in_threadpool(job.add, pending)
+                pending = []
+        pending += reader.feed(b"", final=True)
+        if pending:
+            await run_in_threadpool(job.add, pending)
+    finally:
+        await run_in_threadpool(job.close)
+
+    return {
+        "imported": job.imported,
+        "skipped": job.skipped,
+        "dependencies_dropped": job.dependencies_dropped,
+        "errors": job.errors,
+    }
+
+
+# -----------------------------
+# Archive
+# -----------------------------
+ARCHIVE_BATCH = 1000            # rows per transaction
+ARCHIVE_PAUSE = 0.05            # seconds between batches, at least
+ARCHIVE_EVERY_SECS = 6 * 3600
+ARCHIVE_PAGE_MAX = 200
+
+_ARCHIVE_COLUMNS = (
+    "id, user_id, name, category, priority, deadline, start_time, duration, status, "
+    "depends_on_id, stress_level, series_id, occurrence"
+)
+
+
+def _archive_rows(conn, user_id: int, ids, cutoff: int) -> int:
+    """Move one user's batch to tasks_archive and out of their C store."""
+    with c_stores.use(user_id) as store:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # re-checked under the write lock: a row may have been reopened meanwhile
+            ids = [
+                r[0]
+                for r in conn.execute(
+                    f"SELECT id FROM tasks WHERE id IN ({','.join('?' * len(ids))}) AND user_id=? AND status=1 "
+                    "AND COALESCE(completed_day, deadline_day) < ? ORDER BY id",
+                    (*ids, user_id, cutoff),
+                )
+            ]
+            if ids:
+                conn.execute(
+                    f"INSERT INTO tasks_archive({_ARCHIVE_COLUMNS}, done_day) "
+                    f"SELECT {_ARCHIVE_COLUMNS}, COALESCE(completed_day, deadline_day) FROM tasks "
+                    f"WHERE id IN ({','.join('?' * len(ids))}) ORDER BY id",
+                    ids,
+                )
+                # one at a time in id order, as the C store does them: each
+                # delete releases the row's dependents (tasks_dep_release), and
+                # tenant_seq must count those writes exactly as the store does
+                conn.executemany("DELETE FROM tasks WHERE id=?", [(i,) for i in ids])
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        for i in ids:
+            lib.tm_delete_task(store, i)
+        if lib.tm_journal_entries(store) >= JOURNAL_COMPACT_AT:
+            snapshot_c_store(store, user_id)
+    return len(ids)
+
+
+def archive_completed(after_days: int = ARCHIVE_AFTER_DAYS, batch: int = ARCHIVE_BATCH,
+                      pause: float = ARCHIVE_PAUSE) -> int:
+    """
+    Move tasks completed more than `after_days` days ago into tasks_archive,
+    `batch` rows per transaction. Age is counted from completed_day. Done
+    rows without one (completed before the column existed) count from
+    their deadline; undated ones are stamped with today on the first pass
+    that sees them, so they wait `after_days` like any other.
+    Pauses between batches like the time-column backfill. Each affected
+    user's clients get one change-feed reset at the end. Returns the rows
+    moved.
+    """
+    today = _day_number(date.today())
+    cutoff = today - after_days
+    moved = 0
+    touched = set()
+    last_id = 0
+    conn = db_conn()
+    try:
+        conn.execute(
+            "UPDATE tasks SET completed_day = ? WHERE status=1 AND completed_day IS NULL AND deadline_day = -1",
+            (today,),
+        )
+        conn.commit()
+        while True:
+            found = conn.execute(
+                "SELECT id, user_id FROM tasks WHERE id > ? AND status=1 "
+                "AND COALESCE(completed_day, deadline_day) < ? ORDER BY id LIMIT ?",
+                (last_id, cutoff, batch),
+            ).fetchall()
+            if not found:
+                break
+            last_id = found[-1][0]
+            by_user = {}
+            for task_id, uid in found:
+                by_user.setdefault(uid, []).append(task_id)
+            for uid, ids in by_user.items():
+                started = time.perf_counter()
+                n = _archive_rows(conn, uid, ids, cutoff)
+                if n:
+                    moved += n
+                    touched.add(uid)
+                time.sleep(max(pause, time.perf_counter() - started))
+    finally:
+        conn.close()
+        for uid in touched:
+            change_feed.reset(uid)
+    return moved
+
+
+def _archive_loop():
+    time_columns_ready.wait()   # deadline_day is NULL until the backfill fills it
+    while True:
+        try:
+            moved = archive_completed()
+            if moved:
+                print(f"Archived {moved} completed tasks")
+        except sqlite3.Error as e:
+            print(f"Archiving stopped, retrying in {ARCHIVE_EVERY_SECS}s: {e}")
+        time.sleep(ARCHIVE_EVERY_SECS)
+
+
+def start_archiver():
+    if ARCHIVE_AFTER_DAYS > 0:
+        threading.Thread(target=_archive_loop, name="archiver", daemon=True).start()
+
+
+start_archiver()
+
+
+@app.get("/archive")
+def list_archive(limit: int = 50, cursor: Optional[str] = None, user_id: int = Depends(current_user)):
+    """
+    Archived tasks, most recently completed first, `limit` per page
+    ("completed" is null for old rows with neither a completion day nor a
+    deadline). Pass next_cursor back as ?cursor= for the next page; it is
+    null on the last one.
+    """
+    limit = max(1, min(int(limit), ARCHIVE_PAGE_MAX))
+    after, args = "", ()
+    if cursor:
+        try:
+            done_day, archive_id = (int(x) for x in cursor.split(":"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid cursor")
+        after, args = " AND (done_day, archive_id) < (?, ?)", (done_day, archive_id)
+
+    conn = db_conn()
+    rows = conn.execute(
+        f"SELECT archive_id, done_day, {', '.join(TASK_FIELDS)}, series_id, occurrence FROM tasks_archive "
+        f"WHERE user_id=?{after} ORDER BY done_day DESC, archive_id DESC LIMIT ?",
+        (user_id, *args, limit + 1),
+    ).fetchall()
+    conn.close()
+
+    results = []
+    for r in rows[:limit]:
+        row = dict(r)
+        archive_id, done_day = row.pop("archive_id"), row.pop("done_day")
+        row["completed"] = (_EPOCH + timedelta(days=done_day)).isoformat() if done_day >= 0 else None
+        results.append(row)
+    last = rows[limit - 1] if len(rows) > limit else None
+    return {"results": results, "next_cursor": f"{last['done_day']}:{last['archive_id']}" if last else None}
+
+
+# -----------------------------
+# Analytics
+# -----------------------------
+ANALYTICS_MAX_DAYS = 3660
+ANALYTICS_DEFAULT_DAYS = 30
+
+# day number -> first day number of its bucket (1970-01-01 was a Thursday)
+_BUCKET_SQL = {
+    "day": "day",
+    "week": "day - ((day + 3) % 7)",
+    "month": "CAST(julianday(date(day * 86400, 'unixepoch', 'start of month')) - 2440587.5 AS INTEGER)",
+}
+
+
+def _rollup_stats(tasks: int, completed: int, duration_sum: int):
+    return {
+        "tasks": tasks,
+        "completed": completed,
+        "completion_rate": round(completed / tasks, 3) if tasks else None,
+        "avg_duration": round(duration_sum / tasks, 1) if tasks else None,
+    }
+
+
+@app.get("/analytics")
+def analytics(
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    bucket: str = "week",
+    user_id: int = Depends(current_user),
+):
+    """
+    Completion rate and average duration for tasks due in [from, to]
+    (default: the last 30 days), per day/week/month bucket and overall by
+    category and priority, plus the busiest start hours. Archived tasks
+    count. Served from task_rollup, so the cost follows the days in the
+    range, not the number of tasks. Empty buckets are left out.
+    """
+    if bucket not in _BUCKET_SQL:
+        raise HTTPException(status_code=400, detail="bucket must be 'day', 'week' or 'month'")
+    last = _parse_day(end, "to") if end else date.today()
+    first = _parse_day(start, "from") if start else last - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    if not 0 <= (last - first).days < ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"to must be on or after from, at most {ANALYTICS_MAX_DAYS} days")
+    span = (user_id, _day_number(first), _day_number(last))
+
+    conn = db_conn()
+    # every task has exactly one priority row, so those sum to the totals
+    series = conn.execute(
+        f"SELECT {_BUCKET_SQL[bucket]} AS b, SUM(tasks), SUM(completed), SUM(duration_sum) FROM task_rollup "
+        "WHERE user_id=? AND day BETWEEN ? AND ? AND dim='priority' GROUP BY b HAVING SUM(tasks) > 0 ORDER BY b",
+        span,
+    ).fetchall()
+    by_dim = conn.execute(
+        "SELECT dim, key, SUM(tasks), SUM(completed), SUM(duration_sum) FROM task_rollup "
+        "WHERE user_id=? AND day BETWEEN ? AND ? GROUP BY dim, key HAVING SUM(tasks) > 0",
+        span,
+    ).fetchall()
+    conn.close()
+
+    dims = {"category": [], "priority": [], "hour": []}
+    for dim, key, tasks, completed, duration_sum in by_dim:
+        dims[dim].append((key, tasks, completed, duration_sum))
+    hours = sorted((r for r in dims["hour"] if r[0] >= 0), key=lambda r: (-r[1], r[0]))
+    return {
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "bucket": bucket,
+        "totals": _rollup_stats(*(sum(r[i] for r in series) for i in (1, 2, 3))),
+        "buckets": [{"start": (_EPOCH + timedelta(days=b)).isoformat(), **_rollup_stats(t, c, d)} for b, t, c, d in series],
+        "by_category": [
+            {"category": k, **_rollup_stats(t, c, d)} for k, t, c, d in sorted(dims["category"], key=lambda r: -r[1])
+        ],
+        "by_priority": [{"priority": k, **_rollup_stats(t, c, d)} for k, t, c, d in sorted(dims["priority"])],
+        "busiest_hours": [{"hour": h, "tasks": t, "minutes": d} for h, t, c, d in hours],
+        "untimed": sum(r[1] for r in dims["hour"] if r[0] < 0),
+    }
+
+
+# -----------------------------
+# Consistency check
+# -----------------------------
+CONSISTENCY_TRIES = 5       # reads before giving up on a moment with no write in flight
+CONSISTENCY_WAIT = 0.02     # seconds between them
+
+
+def _task_rows(rows):
+    """TmTaskRow array for HASH_COLUMNS tuples (the array keeps the encoded strings alive)."""
+    batch = (TmTaskRow * len(rows))()
+    for slot, r in zip(batch, rows):
+        slot.id, slot.priority, slot.duration_mins, slot.status = r[0], r[3], r[6], r[7]
+        slot.name = str(r[1]).encode("utf-8")
+        slot.category = str(r[2]).encode("utf-8")
+        slot.deadline = str(r[4]).encode("utf-8")
+        slot.start_time = str(r[5]).encode("utf-8")
+        slot.depends_on, slot.stress = r[8], r[9]
+    return batch
+
+
+def _compare_digests(store, user_id: int):
+    """
+    (seq, SQLite (digest, rows), C (digest, rows)), read while no write sits
+    between the two stores (the store's seq equals tenant_seq: a write
+    commits to SQLite, then applies to C). None if there always was one.
+    """
+    for attempt in range(CONSISTENCY_TRIES):
+        if attempt:
+            time.sleep(CONSISTENCY_WAIT)
+        conn = db_conn()
+        conn.execute("BEGIN")
+        seq = db_user_seq(conn, user_id)
+        db = db_user_digest(conn, user_id)
+        digest, rows, c_seq = c_store_digest(store)
+        conn.commit()
+        conn.close()
+        if c_seq == seq:
+            return seq, db, (digest, rows)
+    return None
+
+
+def _diverged_buckets(store, user_id: int):
+    """Buckets whose SQLite and C digests differ: {bucket: ((digest, rows), (digest, rows))}."""
+    conn = db_conn()
+    db = {
+        b: (d & DIGEST_MASK, n)
+        for b, d, n in conn.execute(
+            "SELECT bucket, digest, tasks FROM task_digest WHERE user_id=? AND bucket != ?", (user_id, DIGEST_TOTAL)
+        )
+    }
+    conn.close()
+    n = lib.tm_count(store) + 16
+    while True:
+        out = (TmBucketDigest * n)()
+        m = lib.tm_bucket_digests(store, DIGEST_BUCKET_BITS, out, n)
+        if m <= n:
+            break
+        n = m   # tasks were added in between
+    c = {b.bucket: (b.digest, b.rows) for b in out[:max(m, 0)]}
+    none = (0, 0)
+    return {b: (db.get(b, none), c.get(b, none)) for b in db.keys() | c.keys() if db.get(b, none) != c.get(b, none)}
+
+
+def check_consistency(user_id: int, repair: bool = True) -> dict:
+    """
+    Compare a user's C store with SQLite and, with `repair`, reload the id
+    ranges that differ from SQLite. The comparison is two integer reads;
+    only a mismatch walks the buckets.
+    """
+    with c_stores.use(user_id) as store:
+        seen = _compare_digests(store, user_id)
+        if seen is None:
+            return {"status": "busy"}
+        seq, (digest, rows), c = seen
+        result = {"status": "ok", "seq": seq, "tasks": rows, "digest": f"{digest:016x}"}
+        if c == (digest, rows):
+            return result
+
+        diverged = _diverged_buckets(store, user_id)
+        result.update(
+            status="diverged",
+            store_tasks=c[1],
+            store_digest=f"{c[0]:016x}",
+            buckets=[
+                {
+                    "ids": [b << DIGEST_BUCKET_BITS, ((b + 1) << DIGEST_BUCKET_BITS) - 1],
+                    "tasks": db[1],
+                    "store_tasks": mem[1],
+                }
+                for b, (db, mem) in sorted(diverged.items())
+            ],
+        )
+        if not repair:
+            return result
+
+        repaired = 0
+        for b in sorted(diverged):
+            lo, hi = b << DIGEST_BUCKET_BITS, (b + 1) << DIGEST_BUCKET_BITS
+            conn = db_conn()
+            conn.row_factory = None
+            conn.execute("BEGIN")
+            seq = db_user_seq(conn, user_id)
+            found = conn.execute(
+                f"SELECT {HASH_COLUMNS} FROM tasks WHERE user_id=? AND id >= ? AND id < ? ORDER BY id",
+                (user_id, lo, hi),
+            ).fetchall()
+            conn.commit()
+            conn.close()
+            n = lib.tm_resync_rows(store, lo, hi, _task_rows(found), len(found), seq)
+            if n < 0:
+                break   # a write came in: the next check picks up what's left
+            repaired += n
+        if repaired:
+            # resyncs aren't journaled: a snapshot makes them stick
+            snapshot_c_store(store, user_id)
+        after = _compare_digests(store, user_id)
+        result["repaired"] = repaired
+        if after is not None and after[1] == after[2]:
+            result["status"] = "repaired"
+        return result
+
+
+@app.get("/health/consistency")
+def consistency(repair: bool = True, user_id: int = Depends(current_user)):
+    return check_consistency(user_id, repair)
+
+
+# -----------------------------
+# Search
+# -----------------------------
+_SEARCH_WORD = re.compile(r"\w+", re.UNICODE)
+SEARCH_MAX_LIMIT = 100
+CHAT_CONTEXT_TASKS = 5          # process_message only shows the LLM this many
+CHAT_CONTEXT_MIN_SCORE = 0.2    # cosine below this is noise for hashed n-grams
+
+
+def fts_query(text: str) -> str:
+    """
+    User text -> FTS5 query: every word must match, as a prefix.
+    "client rep" -> '"client"* "rep"*'. Quoting keeps FTS syntax out of user input.
+    """
+    return " ".join(f'"{w}"*' for w in _SEARCH_WORD.findall(text.lower()))
+
+
+def search_tasks(conn, user_id: int, text: str, limit: int, offset: int = 0):
+    """
+    One user's tasks matching `text`: open tasks first, then by relevance
+    (name hits weigh more than category hits), then priority.
+    """
+    match = fts_query(text)
+    if not match:
+        return []
+
+    if FTS_ENABLED:
+        rows = conn.execute(
+            "SELECT t.id, t.name, t.category, t.priority, t.deadline, t.start_time, t.duration, t.status, "
+            "t.depends_on_id, t.stress_level, bm25(tasks_fts, 10.0, 2.0) AS rank "
+            "FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid "
+            "WHERE tasks_fts MATCH ? AND t.user_id=? "
+            "ORDER BY t.status ASC, rank ASC, t.priority ASC, t.deadline ASC "
+            "LIMIT ? OFFSET ?",
+            (match, user_id, limit, offset),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    # No FTS5: substring match on every word, unranked
+    words = _SEARCH_WORD.findall(text.lower())
+    where = " AND ".join(["(lower(name) LIKE ? OR lower(category) LIKE ?)"] * len(words))
+    params = [p for w in words for p in (f"%{w}%", f"%{w}%")]
+    rows = conn.execute(
+        "SELECT id, name, category, priority, deadline, start_time, duration, status, "
+        "depends_on_id, stress_level, 0.0 AS rank "
+        f"FROM tasks WHERE user_id=? AND {where} "
+        "ORDER BY status ASC, priority ASC, deadline ASC LIMIT ? OFFSET ?",
+        (user_id, *params, limit, offset),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+@app.get("/tasks/search")
+def search(q: str, limit: int = 20, offset: int = 0, user_id: int = Depends(current_user)):
+    """
+    Full-text search over task name and category with prefix matching:
+    /tasks/search?q=client%20rep&limit=20&offset=0.
+    next_offset is null on the last page.
+    """
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+    offset = max(0, int(offset))
+
+    conn = db_conn()
+    rows = search_tasks(conn, user_id, q, limit + 1, offset)
+    conn.close()
+
+    more = len(rows) > limit
+    return {"query": q, "results": rows[:limit], "next_offset": offset + limit if more else None}
+
+
+@app.get("/tasks/similar")
+def similar_tasks(
+    q: Optional[str] = None,
+    task_id: Optional[int] = None,
+    k: int = 10,
+    active_only: bool = False,
+    user_id: int = Depends(current_user),
+):
+    """
+    Tasks whose names are closest to `q` (or to task `task_id`, which is left
+    out of the results), best first, with a cosine `score`.
+    """
+    k = max(1, min(int(k), SEARCH_MAX_LIMIT))
+    conn = db_conn()
+    exclude = ()
+    if task_id is not None:
+        row = conn.execute("SELECT name FROM tasks WHERE id=? AND user_id=?", (task_id, user_id)).fetchone()
+        if not row:
+            conn.close()
+            raise HTTPException(status_code=404, detail="task not found")
+        q = row["name"]
+        exclude = (task_id,)
+    if not (q or "").strip():
+        conn.close()
+        raise HTTPException(status_code=400, detail="q or task_id is required")
+
+    ensure_task_index(conn, user_id)
+    hits = task_index.top_k(user_id, [q], k, active_only=active_only, exclude=exclude)[0]
+    rows = _tasks_by_id(conn, user_id, [i for i, _ in hits])
+    conn.close()
+
+    results = []
+    for i, score in hits:
+        if i in rows:
+            results.append({**rows[i], "score": round(score, 4)})
+    return {"query": q, "results": results}
+
+
+def _tasks_by_id(conn, user_id: int, ids):
+    if not ids:
+        return {}
+    rows = conn.execute(
+        "SELECT id, name, category, priority, deadline, start_time, duration, status, depends_on_id, stress_level "
+        f"FROM tasks WHERE user_id=? AND id IN ({','.join('?' * len(ids))})",
+        [user_id, *ids],
+    ).fetchall()
+    return {r["id"]: dict(r) for r in rows}
+
+
+# -----------------------------
+# Suggestions
+# -----------------------------
+SUGGEST_MAX_ITEMS = 500
+
+
+@app.get("/tasks/suggest")
+def suggest(
+    text: str,
+    day: str = Query("", alias="date"),
+    at: str = Query("", alias="time"),
+    user_id: int = Depends(current_user),
+):
+    """Category and priority for a task being typed, learned from this user's tasks."""
+    conn = db_conn()
+    ensure_suggester(conn, user_id)
+    conn.close()
+    return ml_suggester.get_smart_suggestions(text, day, at, user_id=user_id)
+
+
+@app.post("/tasks/suggest")
+def suggest_many(body: SuggestIn, user_id: int = Depends(current_user)):
+    """GET /tasks/suggest for up to SUGGEST_MAX_ITEMS titles at once, results in order."""
+    if len(body.items) > SUGGEST_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"at most {SUGGEST_MAX_ITEMS} items")
+    conn = db_conn()
+    ensure_suggester(conn, user_id)
+    conn.close()
+    return {"results": ml_suggester.suggest(user_id, [(i.text, i.date, i.time) for i in body.items])}
+
+
+# -----------------------------
+# Phase 1: Command Bar endpoint
+# -----------------------------
+@app.post("/command")
+def command(cmd: CommandIn, user_id: int = Depends(current_user)):
+    parsed = parse_command(cmd.text)
+
+    # Check for parse error (including past date validation done in parser)
+    if not parsed["valid"]:
+        error_msg = parsed.get("error") or "Could not parse that command"
+        raise HTTPException(status_code=400, detail=error_msg)
+
+    deadline = parsed["deadline"] or _today_iso()
+    start_time = parsed["start_time"] or ""
+
+    # Validate date/time is not in the past
+    validation = validate_date_time(deadline, start_time)
+    if not validation["valid"]:
+        raise HTTPException(status_code=400, detail=validation["error"])
+
+    if parsed["recurrence"]:
+        # "gym every mon/wed/fri": one series row, starting at the first occurrence
+        conn = db_conn()
+        series_id = _insert_series(
+            conn, user_id, parsed["name"], parsed["recurrence"], parsed["category"], parsed["priority"],
+            date.fromisoformat(deadline), "", start_time, parsed["duration"], STRESS_DEFAULT,
+        )
+        conn.commit()
+        conn.close()
+        return {"series_id": series_id, "parsed": parsed}
+
+    with c_stores.use(user_id) as store:
+        conn = db_conn()
+        cur = conn.execute(
+            "INSERT INTO tasks(name, category, priority, deadline, start_time, duration, status, user_id) "
+            "VALUES(?,?,?,?,?,?,?,?)",
+            (
+                parsed["name"],
+                parsed["category"],
+                int(parsed["priority"]),
+                deadline,
+                start_time,
+                int(parsed["duration"]),
+                int(parsed["status"]),
+                user_id,
+            ),
+        )
+        new_id = int(cur.lastrowid)
+        conn.commit()
+        conn.close()
+
+        lib.tm_add_task_with_id(
+            store,
+            new_id,
+            parsed["name"].encode("utf-8"),
+            parsed["category"].encode("utf-8"),
+            int(parsed["priority"]),
+            deadline.encode("utf-8"),
+            start_time.encode("utf-8"),
+            int(parsed["duration"]),
+            int(parsed["status"]),
+            0,
+            STRESS_DEFAULT,
+        )
+        _task_changed("upsert", new_id, user_id, store)
+
+    return {"id": new_id, "parsed": parsed}
 
 
 # -----------------------------
 # AI Assistant Chat
 # -----------------------------
 @app.post("/chat")
-def chat(chat_in: ChatIn):
+def chat(chat_in: ChatIn, user_id: int = Depends(current_user)):
     """
     AI Assistant endpoint. Processes natural language and returns response + action.
     """
     # Get current tasks for context
     conn = db_conn()
     rows = conn.execute(
-        "SELECT id, name, priority, deadline, status FROM tasks WHERE status=0 ORDER BY priority ASC LIMIT 10"
+        "SELECT id, name, priority, deadline, status FROM tasks WHERE user_id=? AND status=0 ORDER BY priority ASC LIMIT 10",
+        (user_id,),
     ).fetchall()
-    conn.close()
-    
     tasks = [dict(r) for r in rows]
+
+    # Tasks that look like what the message is about go first in the context
+    ensure_task_index(conn, user_id)
+    hits = task_index.top_k(user_id, [chat_in.message], k=CHAT_CONTEXT_TASKS, active_only=True)[0]
+    relevant = _tasks_by_id(conn, user_id, [i for i, score in hits if score >= CHAT_CONTEXT_MIN_SCORE])
+    conn.close()
+    context = [relevant[i] for i, _ in hits if i in relevant]
+    context += [t for t in tasks if t["id"] not in relevant]
     
     # Process with AI assistant
-    result = ai_process_message(chat_in.message, tasks)
+    result = ai_process_message(chat_in.message, context)
     
     action = result.get("action", "reply")
     response = result.get("response", "I understand.")
@@ -391,47 +2220,94 @@ def chat(chat_in: ChatIn):
     if action == "add_task" and result.get("task_text"):
         from nl_parser import parse_command
         parsed = parse_command(result["task_text"])
-        if parsed["valid"]:
+        if parsed["valid"] and parsed["recurrence"]:
             deadline = parsed["deadline"] or _today_iso()
-            start_time = parsed["start_time"] or ""
-            
-            new_id = lib.tm_add_task(
-                parsed["name"].encode("utf-8"),
-                parsed["category"].encode("utf-8"),
-                int(parsed["priority"]),
-                deadline.encode("utf-8"),
-                start_time.encode("utf-8"),
-                int(parsed["duration"]),
-                0,
-            )
-            
             conn = db_conn()
-            conn.execute(
-                "INSERT INTO tasks (id, name, category, priority, deadline, start_time, duration, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (new_id, parsed["name"], parsed["category"], parsed["priority"], deadline, start_time, parsed["duration"], 0)
+            series_id = _insert_series(
+                conn, user_id, parsed["name"], parsed["recurrence"], parsed["category"], parsed["priority"],
+                date.fromisoformat(deadline), "", parsed["start_time"] or "", parsed["duration"], STRESS_DEFAULT,
             )
             conn.commit()
             conn.close()
+            response = f"Done! Added recurring '{parsed['name']}' starting {deadline}."
+            result["created_series"] = {"id": series_id, "name": parsed["name"], "rule": parsed["recurrence"]}
+        elif parsed["valid"]:
+            deadline = parsed["deadline"] or _today_iso()
+            start_time = parsed["start_time"] or ""
+            
+            with c_stores.use(user_id) as store:
+                conn = db_conn()
+                cur = conn.execute(
+                    "INSERT INTO tasks (name, category, priority, deadline, start_time, duration, status, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (parsed["name"], parsed["category"], parsed["priority"], deadline, start_time, parsed["duration"], 0, user_id)
+                )
+                new_id = int(cur.lastrowid)
+                conn.commit()
+                conn.close()
+
+                lib.tm_add_task_with_id(
+                    store,
+                    new_id,
+                    parsed["name"].encode("utf-8"),
+                    parsed["category"].encode("utf-8"),
+                    int(parsed["priority"]),
+                    deadline.encode("utf-8"),
+                    start_time.encode("utf-8"),
+                    int(parsed["duration"]),
+                    0,
+                    0,
+                    STRESS_DEFAULT,
+                )
+                _task_changed("upsert", new_id, user_id, store)
             
             response = f"Done! Added '{parsed['name']}' for {deadline}."
             result["created_task"] = {"id": new_id, "name": parsed["name"]}
     
     elif action == "complete_task" and result.get("task_id"):
         task_id = result["task_id"]
-        lib.tm_update_task(task_id, -1, None, None, -1, 1)
-        conn = db_conn()
-        conn.execute("UPDATE tasks SET status=1 WHERE id=?", (task_id,))
-        conn.commit()
-        conn.close()
+        with c_stores.use(user_id) as store:
+            conn = db_conn()
+            cur = conn.execute("UPDATE tasks SET status=1 WHERE id=? AND user_id=?", (task_id, user_id))
+            conn.commit()
+            conn.close()
+
+            # another user's id, or one deleted meanwhile: nothing to mirror
+            if cur.rowcount:
+                lib.tm_update_task(store, task_id, None, None, -1, None, None, -1, 1, -1, -1)
+                _task_changed("upsert", task_id, user_id, store)
+            else:
+                response = f"I couldn't find task #{task_id}."
     
     elif action == "delete_task" and result.get("task_id"):
         task_id = result["task_id"]
-        lib.tm_delete_task(task_id)
+        with c_stores.use(user_id) as store:
+            conn = db_conn()
+            released = _dependents(conn, user_id, task_id)
+            cur = conn.execute("DELETE FROM tasks WHERE id=? AND user_id=?", (task_id, user_id))
+            conn.commit()
+            conn.close()
+
+            if cur.rowcount:
+                lib.tm_delete_task(store, task_id)
+                _task_changed("delete", task_id, user_id, store)
+                for dep_id in released:
+                    _task_changed("upsert", dep_id, user_id, store)
+            else:
+                response = f"I couldn't find task #{task_id}."
+    
+    elif action == "list_tasks" and result.get("query"):
+        # "show my gym tasks": search instead of listing everything
         conn = db_conn()
-        conn.execute("DELETE FROM tasks WHERE id=?", (task_id,))
-        conn.commit()
+        matches = search_tasks(conn, user_id, result["query"], 10)
         conn.close()
-    
+        if matches:
+            task_list = "\n".join(
+                [f"#{t['id']}: {t['name']} (P{t['priority']}){' ✓' if t['status'] else ''}" for t in matches]
+            )
+            response = f"Here are your {result['query']} tasks:\n{task_list}"
+        else:
+            response = f"I couldn't find any tasks matching '{result['query']}'."
+
     elif action == "list_tasks":
         if tasks:
             task_list = "\n".join([f"#{t['id']}: {t['name']} (P{t['priority']})" for t in tasks])
@@ -442,55 +2318,268 @@ def chat(chat_in: ChatIn):
     return {"action": action, "response": response, "data": result}
 
 
+@app.get("/chat/metrics")
+def chat_metrics():
+    """LLM admission: generations running, queue depth, and how many messages were shed to fallback replies."""
+    return llm_gate.stats()
+
+
 # -----------------------------
 # Phase 2: Ghost scheduling
 # -----------------------------
+GHOST_SUGGESTIONS = 6
+GHOST_DAY_START = 8 * 60
+GHOST_DAY_END = 20 * 60
+GHOST_STEP = 30
+GHOST_MAX_TRIES = 200          # ready tasks tried before giving up on a full day
+STRESS_HIGH = 7                # stress_level from which tasks get spread out
+STRESS_SPREAD_MINS = 120       # high-stress tasks closer than this push each other apart
+
+
+def _minutes(hhmm: str):
+    """'HH:MM' -> minutes since midnight, None if malformed."""
+    try:
+        hh, mm = map(int, hhmm.split(":"))
+    except ValueError:
+        return None
+    return hh * 60 + mm
+
+
+def _ghost_slot(busy, earliest: int, duration: int, stress: int):
+    """
+    First free grid slot at or after `earliest`. A high-stress task instead
+    takes the free slot with the least stress nearby: every high-stress task
+    within STRESS_SPREAD_MINS adds (its stress x how much closer it is).
+    """
+    first = GHOST_DAY_START + max(0, -(-(earliest - GHOST_DAY_START) // GHOST_STEP)) * GHOST_STEP
+    best = None
+    for start in range(first, GHOST_DAY_END - duration + 1, GHOST_STEP):
+        end = start + duration
+        if any(start < b1 and end > b0 for b0, b1, _ in busy):
+            continue
+        if stress < STRESS_HIGH:
+            return start
+        pressure = sum(
+            bs * max(0, STRESS_SPREAD_MINS - max(b0 - end, start - b1))
+            for b0, b1, bs in busy
+            if bs >= STRESS_HIGH
+        )
+        if best is None or pressure < best[0]:
+            best = (pressure, start)
+        if pressure == 0:
+            break
+    return best[1] if best else None
+
+
+def dependency_schedule(store, day: int, busy=None):
+    """
+    Ghost slots that respect depends_on. A task is only suggested once its
+    prerequisite is done, scheduled on an earlier day or earlier today, or
+    suggested earlier in this pass, and never starts before that ends.
+    Ready tasks are picked by priority, then the longest chain of work they
+    unblock (the critical path through them), then deadline.
+    `busy` holds (start, end, stress) slots already taken that day besides
+    the store's own tasks; it is extended with every slot placed here.
+    Returns (critical_path_mins, [(task_id, start_min, duration, depends_on, stress)]).
+    """
+    busy = [] if busy is None else busy
+    n = lib.tm_count(store)
+    buf = (TmDepInfo * max(n, 1))()
+    m = lib.tm_dependency_order(store, buf, n)
+    info = np.frombuffer(buf, dtype=np.dtype(TmDepInfo), count=m)
+    if m == 0:
+        return 0, []
+
+    ids = info["id"]
+    start = info["start_min"].astype(np.int64)
+    dur = np.where(info["duration_mins"] == 0, 30, info["duration_mins"]).clip(min=15)
+    stress = info["stress"]
+    dep = info["depends_on"]
+
+    # row of each open prerequisite (tm_dependency_order lists every open task)
+    by_id = np.argsort(ids)
+    has_dep = dep != 0
+    prereq = np.full(m, -1, dtype=np.int64)
+    prereq[has_dep] = by_id[np.searchsorted(ids, dep[has_dep], sorter=by_id)]
+
+    today = (start >= 0) & (info["deadline_day"] == day)
+    busy += [(int(a), int(a + b), int(c)) for a, b, c in zip(start[today], info["duration_mins"][today].clip(min=0), stress[today])]
+
+    # Ready now: no open prerequisite, or it is already scheduled before `day` / earlier today
+    earliest = np.full(m, GHOST_DAY_START, dtype=np.int64)
+    ready = (start < 0) & ~has_dep
+    waiting = np.nonzero((start < 0) & has_dep)[0]
+    p = prereq[waiting]
+    p_day = info["deadline_day"][p]
+    before = (start[p] >= 0) & (p_day >= 0) & (p_day < day)
+    same_day = (start[p] >= 0) & (p_day == day)
+    ready[waiting[before | same_day]] = True
+    earliest[waiting[same_day]] = start[p[same_day]] + info["duration_mins"][p[same_day]].clip(min=0)
+
+    deadline = np.where(info["deadline_day"] < 0, np.iinfo(np.int32).max, info["deadline_day"])
+    tail = info["tail_mins"]
+
+    def key(i):
+        return (int(info["priority"][i]), -int(tail[i]), int(deadline[i]), int(i))
+
+    queue = np.nonzero(ready)[0]
+    queue = queue[np.lexsort((queue, deadline[queue], -tail[queue], info["priority"][queue]))]
+    unblocked = []   # heap of dependents whose prerequisite was placed in this pass
+    placed = []
+    qi = tries = 0
+    while len(placed) < GHOST_SUGGESTIONS and tries < GHOST_MAX_TRIES:
+        if unblocked and (qi >= len(queue) or unblocked[0][0] < key(queue[qi])):
+            i = heapq.heappop(unblocked)[1]
+        elif qi < len(queue):
+            i = int(queue[qi])
+            qi += 1
+        else:
+            break
+        tries += 1
+
+        slot = _ghost_slot(busy, int(earliest[i]), int(dur[i]), int(stress[i]))
+        if slot is None:
+            continue   # doesn't fit today, so neither do its dependents
+        end = slot + int(dur[i])
+        busy.append((slot, end, int(stress[i])))
+        placed.append((int(ids[i]), slot, int(dur[i]), int(dep[i]), int(stress[i])))
+        for c in np.nonzero((prereq == i) & (start < 0))[0]:
+            earliest[c] = end
+            heapq.heappush(unblocked, (key(c), int(c)))
+
+    return int(info["chain_mins"].max()), placed
+
+
 @app.get("/ghost-schedule")
-def ghost_schedule(date: Optional[str] = None):
+def ghost_schedule(date: Optional[str] = None, mode: str = "priority", user_id: int = Depends(current_user)):
     """
     Suggest slots for unscheduled tasks for a given date (YYYY-MM-DD).
     Uses 30-min grid between 08:00 and 20:00.
+    mode=dependencies keeps every task after its prerequisite and spreads
+    high-stress tasks over the day (see dependency_schedule).
+    Recurring occurrences due that day block their slot if they have a
+    start_time and are suggested like tasks if not (task_id=null, with
+    series_id/occurrence to PATCH /series/{id}/occurrences/{date}).
     """
     target_date = (date or _today_iso()).strip()
-
+    if mode not in ("priority", "dependencies"):
+        raise HTTPException(status_code=400, detail="mode must be 'priority' or 'dependencies'")
+    target_day = _parse_day(target_date, "date")
     conn = db_conn()
+    occurring = list(series_window(conn, user_id, target_day, target_day))
+    conn.close()
+    timed = [o for o in occurring if o["start_time"]]
+    untimed = sorted((o for o in occurring if not o["start_time"]), key=lambda o: o["priority"])
+
+    if mode == "dependencies":
+        day = _day_number(target_day)
+        busy = []
+        for o in timed:
+            m = _minutes(o["start_time"])
+            if m is not None:
+                busy.append((m, m + max(int(o["duration"]), 0), int(o["stress_level"])))
+        with c_stores.use(user_id) as store:
+            critical, placed = dependency_schedule(store, day, busy)
+        conn = db_conn()
+        names = _tasks_by_id(conn, user_id, [t[0] for t in placed])
+        conn.close()
+        suggestions = [
+            {
+                "task_id": task_id,
+                "name": names[task_id]["name"],
+                "priority": names[task_id]["priority"],
+                "duration": duration,
+                "suggested_time": f"{slot // 60:02d}:{slot % 60:02d}",
+                "deadline": target_date,
+                "depends_on_id": depends_on,
+                "stress_level": stress,
+            }
+            for task_id, slot, duration, depends_on, stress in placed
+            if task_id in names
+        ]
+        for o in untimed[: max(0, GHOST_SUGGESTIONS - len(suggestions))]:
+            duration = max(int(o["duration"] or 30), 15)
+            slot = _ghost_slot(busy, GHOST_DAY_START, duration, int(o["stress_level"]))
+            if slot is None:
+                continue
+            busy.append((slot, slot + duration, int(o["stress_level"])))
+            suggestions.append(
+                {
+                    "task_id": None,
+                    "name": o["name"],
+                    "priority": o["priority"],
+                    "duration": duration,
+                    "suggested_time": f"{slot // 60:02d}:{slot % 60:02d}",
+                    "deadline": target_date,
+                    "depends_on_id": 0,
+                    "stress_level": o["stress_level"],
+                    "series_id": o["series_id"],
+                    "occurrence": o["occurrence"],
+                }
+            )
+        return {"date": target_date, "mode": mode, "critical_path_mins": critical, "suggestions": suggestions}
 
-    unscheduled = conn.execute(
-        """
-        SELECT id, name, priority, duration, deadline
-        FROM tasks
-        WHERE status=0
-          AND (start_time='' OR start_time IS NULL)
-        ORDER BY priority ASC, deadline ASC
-        LIMIT 6
-        """
-    ).fetchall()
+    conn = db_conn()
 
-    scheduled = conn.execute(
-        """
-        SELECT start_time, duration
-        FROM tasks
-        WHERE status=0
-          AND deadline=?
-          AND start_time!=''
-        """,
-        (target_date,),
-    ).fetchall()
+    if time_columns_ready.is_set():
+        # both are range scans on idx_tasks_user_time / idx_tasks_day
+        unscheduled = conn.execute(
+            """
+            SELECT id, name, priority, duration, deadline
+            FROM tasks
+            WHERE user_id=?
+              AND status=0
+              AND start_min<0
+            ORDER BY priority ASC, deadline_day ASC
+            LIMIT ?
+            """,
+            (user_id, GHOST_SUGGESTIONS),
+        ).fetchall()
+
+        scheduled = conn.execute(
+            """
+            SELECT start_min, duration
+            FROM tasks
+            WHERE user_id=?
+              AND deadline_day=?
+              AND start_min>=0
+              AND status=0
+            """,
+            (user_id, _day_number(target_day)),
+        ).fetchall()
+        scheduled = [(r["start_min"], r["duration"]) for r in scheduled]
+    else:
+        unscheduled = conn.execute(
+            """
+            SELECT id, name, priority, duration, deadline
+            FROM tasks
+            WHERE user_id=?
+              AND status=0
+              AND (start_time='' OR start_time IS NULL)
+            ORDER BY priority ASC, deadline ASC
+            LIMIT ?
+            """,
+            (user_id, GHOST_SUGGESTIONS),
+        ).fetchall()
+
+        scheduled = conn.execute(
+            "SELECT start_time, duration FROM tasks WHERE user_id=? AND status=0 AND deadline=? AND start_time!=''",
+            (user_id, target_date),
+        ).fetchall()
+        scheduled = [(_minutes(r["start_time"]), r["duration"]) for r in scheduled]
 
     conn.close()
 
+    # the day's occurrences compete with the (already best) unscheduled rows
+    unscheduled = sorted(
+        [*map(dict, unscheduled), *untimed], key=lambda r: (r["priority"], r["deadline"])
+    )[:GHOST_SUGGESTIONS]
+
     occupied = []
-    for r in scheduled:
-        st = str(r["start_time"] or "").strip()
-        if not st:
-            continue
-        try:
-            hh, mm = map(int, st.split(":"))
-        except Exception:
+    for start_m, dur in [*scheduled, *((_minutes(o["start_time"]), o["duration"]) for o in timed)]:
+        if start_m is None or start_m < 0:
             continue
-        start_m = hh * 60 + mm
-        dur = int(r["duration"] or 0)
-        occupied.append((start_m, start_m + max(dur, 0)))
+        occupied.append((start_m, start_m + max(int(dur or 0), 0)))
 
     def overlaps(a0, a1):
         for b0, b1 in occupied:
@@ -498,14 +2587,14 @@ def ghost_schedule(date: Optional[str] = None):
                 return True
         return False
 
-    work_start = 8 * 60
-    work_end = 20 * 60
-    step = 30
+    work_start = GHOST_DAY_START
+    work_end = GHOST_DAY_END
+    step = GHOST_STEP
 
     suggestions = []
 
     for r in unscheduled:
-        task_id = int(r["id"])
+        task_id = r["id"]
         name = str(r["name"])
         priority = int(r["priority"])
         duration = max(int(r["duration"] or 30), 15)
@@ -523,61 +2612,59 @@ def ghost_schedule(date: Optional[str] = None):
 
         hh = slot // 60
         mm = slot % 60
-        suggestions.append(
-            {
-                "task_id": task_id,
-                "name": name,
-                "priority": priority,
-                "duration": duration,
-                "suggested_time": f"{hh:02d}:{mm:02d}",
-                "deadline": target_date,
-            }
-        )
+        suggestion = {
+            "task_id": task_id,
+            "name": name,
+            "priority": priority,
+            "duration": duration,
+            "suggested_time": f"{hh:02d}:{mm:02d}",
+            "deadline": target_date,
+        }
+        if task_id is None:
+            suggestion.update(series_id=r["series_id"], occurrence=r["occurrence"])
+        suggestions.append(suggestion)
         occupied.append((slot, slot + duration))
 
     return {"date": target_date, "suggestions": suggestions}
 
 
 @app.post("/solidify-ghost/{task_id}")
-def solidify_ghost(task_id: int, payload: dict):
+def solidify_ghost(task_id: int, payload: dict, user_id: int = Depends(current_user)):
     time_slot = (payload.get("time_slot") or "").strip()
     deadline = (payload.get("deadline") or "").strip()
 
     if not time_slot:
         raise HTTPException(status_code=400, detail="time_slot is required")
 
-    conn = db_conn()
-    row = conn.execute("SELECT id FROM tasks WHERE id=?", (task_id,)).fetchone()
-    if not row:
+    with c_stores.use(user_id) as store:
+        conn = db_conn()
+        if deadline:
+            cur = conn.execute(
+                "UPDATE tasks SET start_time=?, deadline=? WHERE id=? AND user_id=?",
+                (time_slot, deadline, task_id, user_id),
+            )
+        else:
+            cur = conn.execute("UPDATE tasks SET start_time=? WHERE id=? AND user_id=?", (time_slot, task_id, user_id))
+        conn.commit()
         conn.close()
-        raise HTTPException(status_code=404, detail="task not found")
-
-    if deadline:
-        conn.execute("UPDATE tasks SET start_time=?, deadline=? WHERE id=?", (time_slot, deadline, task_id))
-    else:
-        conn.execute("UPDATE tasks SET start_time=? WHERE id=?", (time_slot, task_id))
+        if not cur.rowcount:
+            raise HTTPException(status_code=404, detail="task not found")
 
-    conn.commit()
-    conn.close()
-
-    # Sync to C (keep other values by passing -1 and NULL? We pass full fields via patch endpoint normally,
-    # but here we’ll set priority=-1 and duration=-1 and status=-1 by re-reading from DB would be cleaner.
-    # We'll do a small re-read to keep C accurate.)
-    conn = db_conn()
-    t = conn.execute(
-        "SELECT priority, deadline, start_time, duration, status FROM tasks WHERE id=?",
-        (task_id,),
-    ).fetchone()
-    conn.close()
-
-    lib.tm_update_task(
-        int(task_id),
-        int(t["priority"]),
-        str(t["deadline"]).encode("utf-8"),
-        str(t["start_time"]).encode("utf-8"),
-        int(t["duration"]),
-        int(t["status"]),
-    )
+        # the same one or two fields; the rest of the C row is already right
+        lib.tm_update_task(
+            store,
+            int(task_id),
+            None,
+            None,
+            -1,
+            deadline.encode("utf-8") if deadline else None,
+            time_slot.encode("utf-8"),
+            -1,
+            -1,
+            -1,
+            -1,
+        )
+        _task_changed("upsert", task_id, user_id, store)
 
     return {"ok": True}
 
@@ -1,28 +1,136 @@
 import sqlite3
 import os
+import time
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "tasks.db")
+DB_PATH = os.environ.get("OPTITASK_DB") or os.path.join(BASE_DIR, "tasks.db")
+
+TIME_BACKFILL = "time_columns"   # migrations row tracking the deadline_day/start_min backfill
+MIGRATIONS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL DEFAULT 0, "
+    "done INTEGER NOT NULL DEFAULT 0)"
+)
+
+# Built once the backfill is done (updating them row by row during it costs
+# far more than one build); they replace the TEXT-ordered idx_tasks_user.
+TIME_INDEXES = """
+DROP INDEX IF EXISTS idx_tasks_user;
+CREATE INDEX IF NOT EXISTS idx_tasks_user_time ON tasks(user_id, status, priority, deadline_day, start_min);
+CREATE INDEX IF NOT EXISTS idx_tasks_day ON tasks(user_id, deadline_day, start_min);
+"""
+
+
+def day_sql(col: str) -> str:
+    """SQL for 'YYYY-MM-DD' in `col` -> days since 1970-01-01, -1 if empty or malformed (as the C core)."""
+    return (
+        f"CASE WHEN {col} GLOB '[0-9][0-9][0-9][0-9]-[0-1][0-9]-[0-3][0-9]' "
+        f"THEN COALESCE(CAST(julianday({col}) - 2440587.5 AS INTEGER), -1) ELSE -1 END"
+    )
+
+
+def minute_sql(col: str) -> str:
+    """SQL for 'HH:MM' in `col` -> minutes since midnight, -1 if empty or malformed."""
+    return (
+        f"CASE WHEN {col} GLOB '[0-2][0-9]:[0-5][0-9]' AND CAST(substr({col}, 1, 2) AS INTEGER) < 24 "
+        f"THEN CAST(substr({col}, 1, 2) AS INTEGER) * 60 + CAST(substr({col}, 4, 2) AS INTEGER) ELSE -1 END"
+    )
+
+
+def backfill_done(conn) -> bool:
+    conn.execute(MIGRATIONS_TABLE)
+    row = conn.execute("SELECT done FROM migrations WHERE name=?", (TIME_BACKFILL,)).fetchone()
+    return bool(row and row[0])
+
+
+def backfill_time_columns(db_path: str = DB_PATH, batch: int = 1000, pause: float = 0.05, log=None) -> int:
+    """
+    Fill deadline_day/start_min for rows written before those columns existed.
+
+    Walks the table in id order, `batch` rows per short transaction, and
+    between batches sleeps at least `pause` and at least as long as the
+    batch held the write lock, so request writes (whose busy handler backs
+    off up to 100 ms) get it in between. The last id done is committed with each batch, so an
+    interrupted run picks up where it stopped. Rows written meanwhile are
+    filled by the tasks_time_* triggers; the UPDATE here touches neither
+    tenant_seq nor the search index. The last step builds TIME_INDEXES,
+    the one time writers wait for more than a batch. Returns the rows it
+    filled.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA cache_size=-65536")   # 64 MB: the index pages each batch touches stay cached
+    filled = 0
+    try:
+        if backfill_done(conn):
+            return 0
+        conn.commit()
+        row = conn.execute("SELECT last_id FROM migrations WHERE name=?", (TIME_BACKFILL,)).fetchone()
+        last_id = int(row[0]) if row else 0
+        # rows inserted from here on already have the columns (tasks_time_ins)
+        end_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM tasks").fetchone()[0]
+        while True:
+            started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            hi = conn.execute(
+                "SELECT MAX(id) FROM (SELECT id FROM tasks WHERE id > ? AND id <= ? ORDER BY id LIMIT ?)",
+                (last_id, end_id, batch),
+            ).fetchone()[0]
+            if hi is None:
+                for stmt in filter(str.strip, TIME_INDEXES.split(";")):
+                    conn.execute(stmt)
+            else:
+                cur = conn.execute(
+                    f"UPDATE tasks SET deadline_day = {day_sql('deadline')}, start_min = {minute_sql('start_time')} "
+                    "WHERE id > ? AND id <= ? AND deadline_day IS NULL",
+                    (last_id, hi),
+                )
+                filled += cur.rowcount
+                last_id = hi
+            conn.execute(
+                "INSERT OR REPLACE INTO migrations(name, last_id, done) VALUES(?,?,?)",
+                (TIME_BACKFILL, last_id, int(hi is None)),
+            )
+            conn.commit()
+            if hi is None:
+                break
+            if log:
+                log(f"  ... up to id {last_id}")
+            time.sleep(max(pause, time.perf_counter() - started))
+    finally:
+        conn.close()
+    return filled
+
 
 def migrate():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    
+
     # Check if columns exist
     cursor.execute("PRAGMA table_info(tasks)")
     columns = [row[1] for row in cursor.fetchall()]
-    
+
     if 'stress_level' not in columns:
         print("Adding stress_level column...")
         cursor.execute("ALTER TABLE tasks ADD COLUMN stress_level INTEGER NOT NULL DEFAULT 5")
-    
+
     if 'depends_on_id' not in columns:
         print("Adding depends_on_id column...")
         cursor.execute("ALTER TABLE tasks ADD COLUMN depends_on_id INTEGER NOT NULL DEFAULT 0")
-    
+
+    if 'deadline_day' not in columns:
+        print("Adding deadline_day / start_min columns...")
+        cursor.execute("ALTER TABLE tasks ADD COLUMN deadline_day INTEGER")
+        cursor.execute("ALTER TABLE tasks ADD COLUMN start_min INTEGER")
+
+    if 'completed_day' not in columns:
+        print("Adding completed_day column...")
+        cursor.execute("ALTER TABLE tasks ADD COLUMN completed_day INTEGER")
+
     conn.commit()
     conn.close()
+
+    print("Backfilling deadline_day / start_min...")
+    print(f"  {backfill_time_columns(log=print)} rows filled")
     print("✅ Migration complete!")
 
 if __name__ == "__main__":
-    migrate()
\ No newline at end of file
+    migrate()
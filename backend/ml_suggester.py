@@ -1,70 +1,536 @@
-from typing import Dict, Tuple
+import os
+import re
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+FEATURE_MASK = (1 << 20) - 1    # hashed feature space (crc32, stable across processes)
+ALPHA = 1.0                     # Laplace smoothing
+PRIOR_WEIGHT = 4                # pseudo-counts per keyword in the built-in tables
+FALLBACK_DOCS = 2               # keyword-free pseudo-tasks for the default label
+CALIBRATION_MIN = 20            # tasks before a temperature is fitted (1.0 until then)
+CALIBRATION_SAMPLE = 2000       # tasks scored leave-one-out per fit
+TEMPERATURES = np.geomspace(0.25, 8.0, 41)
+MODEL_VERSION = 2               # 1 was one suggester.npz holding every user
+RECORD_BYTES = 200              # rough resident cost of a kept task record, besides its name
+FEATURE_BYTES = 100             # ... and of a feature hash -> row entry
+
+DEFAULT_CATEGORY = "general"
+DEFAULT_PRIORITY = 3
+
+# Cold-start prior: every user's model starts from these as one pseudo-task
+# per label (plus FALLBACK_DOCS empty ones for the default), so suggestions
+# behave like the old keyword table until the user's own tasks outweigh it.
+CATEGORY_KEYWORDS = {
+    "work": ["meeting", "client", "email", "report", "presentation", "project", "office", "call"],
+    "study": ["assignment", "exam", "study", "lecture", "lab", "homework", "paper", "thesis"],
+    "personal": ["gym", "doctor", "family", "shopping", "health", "friend", "travel"],
+    "finance": ["bill", "payment", "invoice", "tax", "bank", "budget", "salary"],
+    "home": ["clean", "laundry", "repair", "maintenance", "groceries", "cook"],
+    "urgent": ["urgent", "asap", "immediately", "critical", "emergency", "now"],
+}
+
+PRIORITY_KEYWORDS = {
+    1: ["urgent", "asap", "critical", "emergency", "immediately", "today"],
+    2: ["important", "soon", "this week", "deadline"],
+    3: ["normal", "regular", "routine"],
+    4: ["later", "optional", "whenever"],
+    5: ["someday", "eventually", "nice to have"],
+}
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & FEATURE_MASK
+
+
+def features(text: str) -> List[int]:
+    """Hashed lowercase words and word bigrams of `text`, repeats kept (multinomial counts)."""
+    words = _WORD.findall((text or "").lower())
+    return [_hash(f) for f in words + [f"{a} {b}" for a, b in zip(words, words[1:])]]
+
+
+# the priority head also sees whether a deadline / start time was given
+_HAS_DEADLINE, _HAS_TIME = 1, 2
+_FLAG_FEATURES = [
+    [_hash(f) for f, bit in (("@deadline", _HAS_DEADLINE), ("@time", _HAS_TIME)) if flags & bit]
+    for flags in range(4)
+]
+
+
+def _flags(deadline, start_time) -> int:
+    return (_HAS_DEADLINE if deadline else 0) | (_HAS_TIME if start_time else 0)
+
+
+def _record(name, category, priority, deadline, start_time) -> Tuple[str, str, int, int]:
+    """What the model keeps per task: (name, category, priority, flags)."""
+    return (str(name or ""), str(category or "") or DEFAULT_CATEGORY, int(priority), _flags(deadline, start_time))
+
+
+class _NaiveBayes:
+    """
+    Multinomial naive Bayes counts: a (features x labels) matrix plus
+    documents and tokens per label. Labels are added as they are first seen;
+    counting a document with sign=-1 takes it back out exactly.
+    """
 
-class MLSuggester:
     def __init__(self):
-        self.category_keywords = {
-            "work": ["meeting", "client", "email", "report", "presentation", "project", "office", "call"],
-            "study": ["assignment", "exam", "study", "lecture", "lab", "homework", "paper", "thesis"],
-            "personal": ["gym", "doctor", "family", "shopping", "health", "friend", "travel"],
-            "finance": ["bill", "payment", "invoice", "tax", "bank", "budget", "salary"],
-            "home": ["clean", "laundry", "repair", "maintenance", "groceries", "cook"],
-            "urgent": ["urgent", "asap", "immediately", "critical", "emergency", "now"],
-        }
+        self.labels: list = []
+        self.col: Dict = {}
+        self.row: Dict[int, int] = {}      # feature hash -> counts row
+        self.counts = np.zeros((256, 8), dtype=np.float32)   # whole counts: exact to 2**24
+        self.docs = np.zeros(8)
+        self.tokens = np.zeros(8)
+        self.vocab = 0                     # rows with any count left
+        self.temperature = 1.0
+
+    def _grow(self, rows: int, cols: int) -> None:
+        r, c = self.counts.shape
+        if rows <= r and cols <= c:
+            return
+        nr, nc = r, c
+        while nr < rows:
+            nr *= 2
+        while nc < cols:
+            nc *= 2
+        counts = np.zeros((nr, nc), dtype=np.float32)
+        counts[:r, :c] = self.counts
+        self.counts = counts
+        for name in ("docs", "tokens"):
+            old = getattr(self, name)
+            new = np.zeros(nc)
+            new[:c] = old
+            setattr(self, name, new)
+
+    def _column(self, label) -> int:
+        c = self.col.get(label)
+        if c is None:
+            c = self.col[label] = len(self.labels)
+            self.labels.append(label)
+            self._grow(len(self.row), len(self.labels))
+        return c
+
+    def _rows(self, feats: Sequence[int], create: bool) -> np.ndarray:
+        row = self.row
+        if create:
+            out = [row.setdefault(f, len(row)) for f in feats]
+            self._grow(len(row), len(self.labels))
+        else:
+            out = [row.get(f, -1) for f in feats]
+        return np.asarray(out, dtype=np.int64)
+
+    def add(self, feat_lists: Sequence[Sequence[int]], labels: Sequence, sign: float = 1.0) -> None:
+        """Count (sign=1) or uncount (sign=-1) documents: feat_lists[i] labelled labels[i]."""
+        cols = np.asarray([self._column(label) for label in labels], dtype=np.int64)
+        lens = np.asarray([len(f) for f in feat_lists], dtype=np.int64)
+        rows = self._rows([f for fl in feat_lists for f in fl], create=True)
+        n = len(self.labels)
+        self.docs[:n] += sign * np.bincount(cols, minlength=n)
+        self.tokens[:n] += sign * np.bincount(cols, weights=lens, minlength=n)
+        if len(rows):
+            touched = np.unique(rows)
+            before = np.count_nonzero(self.counts[touched].any(axis=1))
+            np.add.at(self.counts, (rows, np.repeat(cols, lens)), sign)
+            self.vocab += np.count_nonzero(self.counts[touched].any(axis=1)) - before
+
+    def log_joint(self, feat_lists: Sequence[Sequence[int]]) -> np.ndarray:
+        """
+        (documents x labels) log P(label) + log P(features | label), -inf for
+        emptied labels. Features the model has never counted are skipped: a
+        new word says nothing about the label.
+        """
+        n = len(self.labels)
+        rows = self._rows([f for fl in feat_lists for f in fl], create=False)
+        doc = np.repeat(np.arange(len(feat_lists)), [len(f) for f in feat_lists])
+        seen = rows >= 0
+        rows, doc = rows[seen], doc[seen]
+        out = np.zeros((len(feat_lists), n))
+        np.add.at(out, doc, np.log(self.counts[rows, :n] + ALPHA))
+        lens = np.bincount(doc, minlength=len(feat_lists))
+        with np.errstate(divide="ignore"):
+            out += np.log(self.docs[:n]) - lens[:, None] * np.log(self.tokens[:n] + ALPHA * self.vocab)
+        return out
+
+    def predict(self, feat_lists: Sequence[Sequence[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Best label index and its calibrated probability, per document."""
+        z = self.log_joint(feat_lists) / self.temperature
+        z -= z.max(axis=1, keepdims=True)
+        p = np.exp(z)
+        best = p.argmax(axis=1)
+        return best, p[np.arange(len(best)), best] / p.sum(axis=1)
+
+    def calibrate(self, feat_lists: Sequence[Sequence[int]], labels: Sequence) -> None:
+        """
+        Fit the softmax temperature to minimise the log loss of leave-one-out
+        posteriors over documents that are already counted: naive Bayes is
+        overconfident, and scoring a task against counts that include it
+        would be more so.
+        """
+        scores = self.log_joint(feat_lists)
+        keep, truth = [], []
+        for i, (fl, label) in enumerate(zip(feat_lists, labels)):
+            y = self.col[label]
+            if self.docs[y] <= 1:
+                continue    # its label's only example: nothing left to predict it from
+            rows, mult = np.unique(self._rows(fl, create=False), return_counts=True)
+            n = len(fl)
+            # only the true label's column changes when the task is taken out
+            scores[i, y] = (
+                np.log(self.docs[y] - 1)
+                + np.dot(mult, np.log(self.counts[rows, y] - mult + ALPHA))
+                - n * np.log(self.tokens[y] - n + ALPHA * self.vocab)
+            )
+            keep.append(i)
+            truth.append(y)
+        if len(keep) < CALIBRATION_MIN:
+            self.temperature = 1.0
+            return
+        s = scores[keep]
+        z = s[None, :, :] / TEMPERATURES[:, None, None]
+        top = z.max(axis=2)
+        lse = top + np.log(np.exp(z - top[:, :, None]).sum(axis=2))
+        nll = (lse - z[:, np.arange(len(keep)), truth]).mean(axis=1)
+        self.temperature = float(TEMPERATURES[int(np.argmin(nll))])
+
+    def state(self, prefix: str, out: Dict[str, np.ndarray]) -> None:
+        n, v = len(self.labels), len(self.row)
+        out[prefix + "labels"] = np.asarray(self.labels)
+        out[prefix + "keys"] = np.fromiter(self.row, dtype=np.int64, count=v)   # insertion order = row order
+        out[prefix + "counts"] = self.counts[:v, :n].copy()     # copies: written out after the lock
+        out[prefix + "docs"] = self.docs[:n].copy()
+        out[prefix + "tokens"] = self.tokens[:n].copy()
+        out[prefix + "scalars"] = np.array([self.vocab, self.temperature])
+
+    @classmethod
+    def from_state(cls, prefix: str, data) -> "_NaiveBayes":
+        nb = cls()
+        nb.labels = data[prefix + "labels"].tolist()
+        nb.col = {label: c for c, label in enumerate(nb.labels)}
+        nb.row = {int(k): r for r, k in enumerate(data[prefix + "keys"])}
+        counts = data[prefix + "counts"]
+        nb._grow(max(len(nb.row), 1), max(len(nb.labels), 1))
+        nb.counts[: counts.shape[0], : counts.shape[1]] = counts
+        nb.docs[: len(nb.labels)] = data[prefix + "docs"]
+        nb.tokens[: len(nb.labels)] = data[prefix + "tokens"]
+        vocab, nb.temperature = data[prefix + "scalars"].tolist()
+        nb.vocab = int(vocab)
+        return nb
 
-        self.priority_keywords = {
-            1: ["urgent", "asap", "critical", "emergency", "immediately", "today"],
-            2: ["important", "soon", "this week", "deadline"],
-            3: ["normal", "regular", "routine"],
-            4: ["later", "optional", "whenever"],
-            5: ["someday", "eventually", "nice to have"],
-        }
 
-    def suggest_category(self, text: str) -> Tuple[str, float]:
-        t = (text or "").lower().strip()
-        if not t:
-            return ("general", 0.3)
-
-        scores = {}
-        for cat, kws in self.category_keywords.items():
-            score = sum(1 for k in kws if k in t)
-            if score:
-                scores[cat] = score
-
-        if not scores:
-            return ("general", 0.35)
-
-        best = max(scores, key=scores.get)
-        conf = min(scores[best] / 3.0, 1.0)
-        return (best, conf)
-
-    def suggest_priority(self, text: str, date: str = "", time: str = "") -> Tuple[int, float]:
-        combined = f"{(text or '').lower()} {(date or '').lower()} {(time or '').lower()}".strip()
-        if not combined:
-            return (3, 0.5)
-
-        scores = {}
-        for p, kws in self.priority_keywords.items():
-            score = sum(2 for k in kws if k in combined)
-            if score:
-                scores[p] = score
-
-        if not scores:
-            return (3, 0.55)
-
-        best = min(scores, key=lambda p: (p, -scores[p]))
-        conf = min(scores[best] / 6.0, 1.0)
-        return (best, conf)
-
-    def get_smart_suggestions(self, text: str, date: str = "", time: str = "") -> Dict:
-        cat, cat_conf = self.suggest_category(text)
-        pri, pri_conf = self.suggest_priority(text, date, time)
-
-        return {
-            "suggested_category": cat,
-            "category_confidence": round(cat_conf, 2),
-            "suggested_priority": pri,
-            "priority_confidence": round(pri_conf, 2),
-            "explanation": "Auto-suggested from keywords in your task title (you can override anytime).",
+class _UserModel:
+    """One user's category and priority heads plus the record each task was counted with."""
+
+    def __init__(self, seeded: bool = True):
+        self.category = _NaiveBayes()
+        self.priority = _NaiveBayes()
+        self.tasks: Dict[int, Tuple[str, str, int, int]] = {}
+        self.seq = -1           # tenant_seq this model reflects
+        self.calibrated_at = 0  # len(tasks) at the last temperature fit
+        self.name_bytes = 0     # len() of every kept name
+        self.bytes = 0          # nbytes() when the pool last accounted for it
+        self.unsaved = 0        # updates since it was last written out
+        if seeded:
+            for head, table, default in (
+                (self.category, CATEGORY_KEYWORDS, DEFAULT_CATEGORY),
+                (self.priority, PRIORITY_KEYWORDS, DEFAULT_PRIORITY),
+            ):
+                pseudo = [[f for w in words for f in features(w)] * PRIOR_WEIGHT for words in table.values()]
+                head.add(pseudo, list(table))
+                # the default label wins when no known word matches
+                head.add([[]] * FALLBACK_DOCS, [default] * FALLBACK_DOCS)
+
+    def _count(self, recs: Sequence[Tuple[str, str, int, int]], sign: float) -> None:
+        texts = [features(r[0]) for r in recs]
+        self.category.add(texts, [r[1] for r in recs], sign)
+        self.priority.add([t + _FLAG_FEATURES[r[3]] for t, r in zip(texts, recs)], [r[2] for r in recs], sign)
+
+    def put(self, items: Iterable[Tuple[int, Tuple[str, str, int, int]]]) -> None:
+        old, new = [], []
+        for task_id, rec in items:
+            prev = self.tasks.get(task_id)
+            if prev == rec:
+                continue    # status/time-only edits don't change what was learned
+            if prev is not None:
+                old.append(prev)
+                self.name_bytes -= len(prev[0])
+            self.tasks[task_id] = rec
+            self.name_bytes += len(rec[0])
+            new.append(rec)
+        if old:
+            self._count(old, -1.0)
+        if new:
+            self._count(new, 1.0)
+
+    def remove(self, task_id: int) -> None:
+        prev = self.tasks.pop(task_id, None)
+        if prev is not None:
+            self.name_bytes -= len(prev[0])
+            self._count([prev], -1.0)
+
+    def nbytes(self) -> int:
+        """Rough resident size: both heads' counts and feature maps plus the kept task records."""
+        heads = sum(
+            h.counts.nbytes + h.docs.nbytes + h.tokens.nbytes + FEATURE_BYTES * len(h.row)
+            for h in (self.category, self.priority)
+        )
+        return heads + self.name_bytes + RECORD_BYTES * len(self.tasks)
+
+    def calibrate(self, force: bool = False) -> None:
+        """Refit temperatures; outside a full train only when the task count has doubled."""
+        n = len(self.tasks)
+        if not force and n < max(CALIBRATION_MIN, 2 * self.calibrated_at):
+            return
+        recs = list(self.tasks.values())
+        if n > CALIBRATION_SAMPLE:
+            pick = np.random.default_rng(n).choice(n, CALIBRATION_SAMPLE, replace=False)
+            recs = [recs[i] for i in pick]
+        texts = [features(r[0]) for r in recs]
+        self.category.calibrate(texts, [r[1] for r in recs])
+        self.priority.calibrate([t + _FLAG_FEATURES[r[3]] for t, r in zip(texts, recs)], [r[2] for r in recs])
+        self.calibrated_at = n
+
+
+class MLSuggester:
+    """
+    Category and priority suggestions from a per-user naive Bayes model of
+    the user's own task names (hashed words and bigrams).
+
+    A user's model is made resident on first use by load_user(): their saved
+    .npz if it is at the current tenant_seq, else trained in one pass over
+    load_rows(user_id). apply() / add_rows() keep resident models current
+    from the write paths and write a model out every `save_every` updates;
+    users not resident are skipped and retrained on their next load. Like
+    StorePool, resident models are LRU-evicted (and saved) past `max_bytes`.
+    Users without a model get the keyword prior alone.
+    """
+
+    def __init__(
+        self,
+        load_rows: Callable[[int], Tuple[int, Iterable[Sequence]]],
+        model_dir: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        save_every: int = 200,
+    ):
+        # load_rows(user_id) -> (tenant_seq, [(id, name, category, priority, deadline, start_time), ...])
+        self._load_rows = load_rows
+        self._dir = model_dir
+        self._max = max_bytes
+        self._save_every = save_every
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[int, _UserModel]" = OrderedDict()   # least recently used first
+        self._total = 0
+        self._prior = _UserModel()
+        self.evictions = 0
+        self.trained = 0
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(self._dir, f"{int(user_id)}.npz")
+
+    def is_loaded(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def seq(self, user_id: int) -> int:
+        with self._lock:
+            model = self._users.get(user_id)
+            return model.seq if model else -1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"users": len(self._users), "bytes": self._total, "evictions": self.evictions,
+                    "trained": self.trained}
+
+    def load_user(self, user_id: int, seq: int) -> bool:
+        """
+        Make `user_id` resident: their saved model if it reflects tenant_seq
+        `seq`, else one trained from their tasks (and saved). Returns True if
+        it had to train.
+        """
+        model = self._read(self._path(user_id))
+        trained = model is None or model.seq != seq
+        if trained:
+            seq, rows = self._load_rows(user_id)
+            model = _UserModel()
+            model.put((int(r[0]), _record(*r[1:6])) for r in rows)
+            model.calibrate(force=True)
+            model.seq = seq
+            self._write(user_id, self._state(model))
+        with self._lock:
+            old = self._users.pop(user_id, None)
+            if old is not None:
+                self._total -= old.bytes
+            self._users[user_id] = model
+            self.trained += trained
+            victims = self._account(user_id, model)
+        self._save_victims(victims)
+        return trained
+
+    def apply(self, user_id: int, op: str, task_id: int, row: Optional[dict], seq: int) -> None:
+        """Incremental update from a write path: relearn an upserted row, forget a deleted one."""
+        with self._lock:
+            model = self._users.get(user_id)
+            if model is None:
+                return
+            if op == "upsert" and row:
+                model.put([(int(task_id), _record(
+                    row["name"], row["category"], row["priority"], row["deadline"], row["start_time"]
+                ))])
+            else:
+                model.remove(int(task_id))
+            state, victims = self._updated(user_id, model, seq, 1)
+        self._write(user_id, state)
+        self._save_victims(victims)
+
+    def add_rows(self, user_id: int, rows: Iterable[Sequence], seq: int) -> None:
+        """Bulk apply() of (id, name, category, priority, deadline, start_time) upserts."""
+        items = [(int(r[0]), _record(*r[1:6])) for r in rows]
+        with self._lock:
+            model = self._users.get(user_id)
+            if model is None:
+                return
+            model.put(items)
+            state, victims = self._updated(user_id, model, seq, len(items))
+        self._write(user_id, state)
+        self._save_victims(victims)
+
+    def _updated(self, user_id: int, model: _UserModel, seq: int, changes: int):
+        # under self._lock: finish an update, then pick what to write out
+        model.calibrate()
+        model.seq = max(model.seq, seq)
+        model.unsaved += changes
+        state = None
+        if model.unsaved >= self._save_every:
+            state = self._state(model)
+        self._users.move_to_end(user_id)
+        return state, self._account(user_id, model)
+
+    def _account(self, user_id: int, model: _UserModel) -> list:
+        # under self._lock: re-size `model`, then evict least recently used
+        # models (never `user_id`'s) until under the cap
+        size = model.nbytes()
+        self._total += size - model.bytes
+        model.bytes = size
+        victims = []
+        for key, m in list(self._users.items()):
+            if self._total <= self._max:
+                break
+            if key == user_id:
+                continue
+            del self._users[key]
+            self._total -= m.bytes
+            self.evictions += 1
+            if m.unsaved:
+                victims.append((key, self._state(m)))
+        return victims
+
+    def _save_victims(self, victims) -> None:
+        for user_id, state in victims:
+            self._write(user_id, state)
+
+    def save_all(self) -> int:
+        """Write out every resident model with unsaved updates. Returns how many."""
+        with self._lock:
+            pending = [(u, self._state(m)) for u, m in self._users.items() if m.unsaved]
+        self._save_victims(pending)
+        return len(pending)
+
+    def suggest(self, user_id: int, items: Sequence[Tuple[str, str, str]]) -> List[Dict]:
+        """Batched get_smart_suggestions over (text, date, time) items."""
+        texts = [features(text) for text, _, _ in items]
+        flagged = [t + _FLAG_FEATURES[_flags(d, tm)] for t, (_, d, tm) in zip(texts, items)]
+        with self._lock:
+            model = self._users.get(user_id)
+            if model is None:
+                model = self._prior
+            else:
+                self._users.move_to_end(user_id)
+            cats, cat_conf = model.category.predict(texts) if items else ([], [])
+            pris, pri_conf = model.priority.predict(flagged) if items else ([], [])
+            cat_labels, pri_labels = list(model.category.labels), list(model.priority.labels)
+            learned = len(model.tasks)
+
+        explanation = (
+            f"Learned from {learned} of your tasks and the words in this title (you can override anytime)."
+            if learned
+            else "Auto-suggested from keywords in your task title (you can override anytime)."
+        )
+        return [
+            {
+                "suggested_category": cat_labels[c],
+                "category_confidence": round(float(cc), 2),
+                "suggested_priority": int(pri_labels[p]),
+                "priority_confidence": round(float(pc), 2),
+                "explanation": explanation,
+            }
+            for c, cc, p, pc in zip(cats, cat_conf, pris, pri_conf)
+        ]
+
+    def suggest_category(self, text: str, user_id: int = 0) -> Tuple[str, float]:
+        s = self.suggest(user_id, [(text, "", "")])[0]
+        return (s["suggested_category"], s["category_confidence"])
+
+    def suggest_priority(self, text: str, date: str = "", time: str = "", user_id: int = 0) -> Tuple[int, float]:
+        s = self.suggest(user_id, [(text, date, time)])[0]
+        return (s["suggested_priority"], s["priority_confidence"])
+
+    def get_smart_suggestions(self, text: str, date: str = "", time: str = "", user_id: int = 0) -> Dict:
+        return self.suggest(user_id, [(text, date, time)])[0]
+
+    @staticmethod
+    def _state(model: _UserModel) -> Dict[str, np.ndarray]:
+        # under the lock (or before the model is shared); the arrays are
+        # copies, so the file is written after the lock is released
+        model.unsaved = 0
+        ids = list(model.tasks)
+        recs = [model.tasks[i] for i in ids]
+        out = {
+            "version": np.array([MODEL_VERSION]),
+            "meta": np.array([model.seq, model.calibrated_at], dtype=np.int64),
+            "ids": np.asarray(ids, dtype=np.int64),
+            "names": np.asarray([r[0] for r in recs], dtype=str),
+            "categories": np.asarray([r[1] for r in recs], dtype=str),
+            "priorities": np.asarray([r[2] for r in recs], dtype=np.int64),
+            "flags": np.asarray([r[3] for r in recs], dtype=np.int8),
         }
+        model.category.state("category.", out)
+        model.priority.state("priority.", out)
+        return out
+
+    def _write(self, user_id: int, state: Optional[Dict[str, np.ndarray]]) -> None:
+        """Write one user's model atomically; a failed write only costs a retrain later."""
+        if state is None:
+            return
+        path = self._path(user_id)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self._dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.savez_compressed(f, **state)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"suggestion model for user {user_id} not saved: {e}")
 
-ml_suggester = MLSuggester()
\ No newline at end of file
+    @staticmethod
+    def _read(path: str) -> Optional[_UserModel]:
+        """The model saved at `path`; None if missing, unreadable or from another MODEL_VERSION."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"][0]) != MODEL_VERSION:
+                    return None
+                model = _UserModel(seeded=False)
+                model.seq, model.calibrated_at = (int(v) for v in data["meta"])
+                names = data["names"].tolist()
+                model.tasks = dict(zip(
+                    data["ids"].tolist(),
+                    zip(names, data["categories"].tolist(), data["priorities"].tolist(), data["flags"].tolist()),
+                ))
+                model.name_bytes = sum(map(len, names))
+                model.category = _NaiveBayes.from_state("category.", data)
+                model.priority = _NaiveBayes.from_state("priority.", data)
+                return model
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
@@ -1,5 +1,7 @@
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+from recurrence import find_rule, normalize_rule, occurrences
 
 _WEEKDAYS = {
     "monday": 0, "mon": 0,
@@ -64,25 +66,40 @@ def _parse_date(text: str) -> str:
 
     return today.isoformat()
 
-def validate_date_time(deadline: str, start_time: str) -> dict:
+def validate_date_time(deadline: str, start_time: str, allow_past: bool = False) -> dict:
     """
-    Validates that the deadline and start_time are not in the past.
+    Validates that the deadline and start_time are well-formed and (unless
+    allow_past, e.g. for an imported task that is already done) not in the past.
     Returns {"valid": True} or {"valid": False, "error": "message"}
     """
     if deadline == "__PAST__":
         return {"valid": False, "error": "Cannot schedule tasks for past dates (like yesterday)"}
 
-    today_iso = _today_iso()
-    now_time = _now_time()
+    # Compare as a date and minutes since midnight (the deadline_day /
+    # start_min columns), not as strings
+    try:
+        if deadline and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", deadline):
+            raise ValueError(deadline)
+        day = date.fromisoformat(deadline) if deadline else None
+    except ValueError:
+        return {"valid": False, "error": f"Invalid date ({deadline}), expected YYYY-MM-DD"}
+    m = re.fullmatch(r"([01]\d|2[0-3]):([0-5]\d)", start_time or "")
+    if start_time and not m:
+        return {"valid": False, "error": f"Invalid time ({start_time}), expected HH:MM"}
+    if allow_past:
+        return {"valid": True}
+
+    now = datetime.now()
+    today = now.date()
 
     # Check if deadline is in the past
-    if deadline and deadline < today_iso:
-        return {"valid": False, "error": f"Cannot schedule tasks for past date ({deadline}). Today is {today_iso}"}
+    if day and day < today:
+        return {"valid": False, "error": f"Cannot schedule tasks for past date ({deadline}). Today is {today.isoformat()}"}
 
     # If deadline is today and a start_time is provided, check if it's in the past
-    if deadline == today_iso and start_time:
-        if start_time < now_time:
-            return {"valid": False, "error": f"Cannot schedule tasks for past time ({start_time}). Current time is {now_time}"}
+    if day == today and m:
+        if int(m.group(1)) * 60 + int(m.group(2)) < now.hour * 60 + now.minute:
+            return {"valid": False, "error": f"Cannot schedule tasks for past time ({start_time}). Current time is {_now_time()}"}
 
     return {"valid": True}
 
@@ -147,12 +164,30 @@ def _strip_tokens(text: str, tokens: list[str]) -> str:
         t = re.sub(tok, " ", t, flags=re.IGNORECASE)
     return " ".join(t.split()).strip()
 
+def _first_occurrence(rule: str, start_iso: str, start_time: str):
+    """(normalized rule, first occurrence from start_iso that validate_date_time accepts)"""
+    start = date.fromisoformat(start_iso)
+    rule = normalize_rule(rule, start)
+    for d in occurrences(rule, start, start, start + timedelta(days=366)):
+        if validate_date_time(d.isoformat(), start_time)["valid"]:
+            return rule, d.isoformat()
+    return rule, start_iso
+
 def parse_command(text: str) -> dict:
     """
     Returns a dict:
-      name, category, priority, deadline, start_time, duration, status, valid, error
+      name, category, priority, deadline, start_time, duration, status,
+      recurrence, valid, error
+    recurrence is a rule ("daily", "weekly:0,2,4", "every:3") or "". For a
+    recurring command, deadline is the first occurrence that isn't past.
     """
     raw = (text or "").strip()
+
+    # "gym every mon/wed/fri": take the rule out first so the weekdays in it
+    # aren't read as a single date
+    rule, rm = find_rule(raw)
+    if rm:
+        raw = " ".join((raw[:rm.start()] + " " + raw[rm.end():]).split())
     t = raw.lower()
 
     out = {
@@ -163,6 +198,7 @@ def parse_command(text: str) -> dict:
         "start_time": "",
         "duration": 30,
         "status": 0,
+        "recurrence": "",
         "valid": False,
         "error": None,
     }
@@ -185,6 +221,9 @@ def parse_command(text: str) -> dict:
     if st:
         out["start_time"] = st
 
+    if rule and out["deadline"] != "__PAST__":
+        out["recurrence"], out["deadline"] = _first_occurrence(rule, out["deadline"], out["start_time"])
+
     # Check for past date EARLY and reject
     validation = validate_date_time(out["deadline"], out["start_time"])
     if not validation["valid"]:
@@ -0,0 +1,136 @@
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+# Rules are short strings stored in task_series.rule:
+#   "daily"            every day
+#   "every:N"          every N days from the series start
+#   "weekly:0,2,4"     on these weekdays (0 = Monday)
+
+_DAY_NAMES = {
+    "monday": 0, "mon": 0,
+    "tuesday": 1, "tue": 1, "tues": 1,
+    "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thur": 3, "thurs": 3,
+    "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5,
+    "sunday": 6, "sun": 6,
+}
+_DAY = "|".join(sorted(_DAY_NAMES, key=len, reverse=True))
+_DAY_LIST = re.compile(rf"\b(?:every|each|on)\s+((?:{_DAY})s?(?:\s*(?:/|,|&|\band\b|\bor\b)\s*(?:{_DAY})s?)*)\b", re.IGNORECASE)
+
+# A bare "daily" / "weekly" / "weekdays" / "weekends" is a rule only as the
+# last word (a time, priority or duration may follow): "stretch daily",
+# "standup weekdays 9am". Anywhere else it is part of the name, as in
+# "submit weekly report tomorrow".
+_TAIL = (
+    r"(?=(?:\s+(?:(?:at\s+)?\d{1,2}(?::\d{2})?\s*(?:am|pm)|(?:at\s+)?(?:[01]?\d|2[0-3]):[0-5]\d"
+    r"|p[1-5]|\d+\s*h(?:\s*\d+\s*m)?|\d+\s*m)\b)*\s*$)"
+)
+
+# (pattern, rule or None when it depends on the match), most specific first
+_PHRASES = [
+    (re.compile(r"\bevery\s+(\d+)\s+days\b", re.IGNORECASE), None),
+    (re.compile(r"\bevery\s+other\s+day\b", re.IGNORECASE), "every:2"),
+    (re.compile(rf"\b(?:(?:every|each)\s+weekday|on\s+weekdays|weekdays\b{_TAIL})\b", re.IGNORECASE), "weekly:0,1,2,3,4"),
+    (re.compile(rf"\b(?:(?:every|each)\s+weekend|on\s+weekends|weekends\b{_TAIL})\b", re.IGNORECASE), "weekly:5,6"),
+    (re.compile(rf"\b(?:every\s*day|each\s+day|daily\b{_TAIL})", re.IGNORECASE), "daily"),
+    (re.compile(rf"\b(?:(?:every|each)\s+week\b|weekly\b{_TAIL})", re.IGNORECASE), "weekly"),
+]
+
+
+def normalize_rule(rule: str, start: date) -> str:
+    """
+    Canonical form of a rule, or ValueError. A bare "weekly" repeats on the
+    start date's weekday.
+    """
+    r = (rule or "").strip().lower()
+    if r == "daily":
+        return r
+    if r == "weekly":
+        return f"weekly:{start.weekday()}"
+    kind, _, arg = r.partition(":")
+    if kind == "every" and arg.isdigit() and int(arg) >= 1:
+        return "daily" if int(arg) == 1 else f"every:{int(arg)}"
+    if kind == "weekly" and arg:
+        try:
+            days = sorted({int(d) for d in arg.split(",")})
+        except ValueError:
+            days = []
+        if days and all(0 <= d <= 6 for d in days):
+            return "weekly:" + ",".join(map(str, days))
+    raise ValueError("rule must be 'daily', 'weekly', 'every:N' or 'weekly:D,D,..' (0 = Monday)")
+
+
+def find_rule(text: str) -> Tuple[str, Optional[re.Match]]:
+    """
+    Recurrence phrase in free text ("gym every mon/wed/fri 7am").
+    Returns (rule, match) or ("", None). The rule may be a bare "weekly";
+    pass it through normalize_rule() once the start date is known.
+    """
+    m = _DAY_LIST.search(text)
+    if m:
+        words = [w.lower() for w in re.findall(rf"(?:{_DAY})s?", m.group(1), flags=re.IGNORECASE)]
+        days = sorted({_DAY_NAMES[w] if w in _DAY_NAMES else _DAY_NAMES[w[:-1]] for w in words})
+        if m.group(0).lower().startswith(("every", "each")) or len(days) > 1 or m.group(1).lower().endswith("s"):
+            return "weekly:" + ",".join(map(str, days)), m
+    for pattern, rule in _PHRASES:
+        m = pattern.search(text)
+        if m:
+            return (rule or f"every:{max(int(m.group(1)), 1)}"), m
+    return "", None
+
+
+def occurrences(rule: str, start: date, window_start: date, window_end: date,
+                until: Optional[date] = None) -> Iterator[date]:
+    """
+    Dates the rule produces inside [window_start, window_end], lazily and in
+    order. Cost is proportional to the window, never to the whole series.
+    """
+    first = max(start, window_start)
+    last = min(window_end, until) if until else window_end
+    if first > last:
+        return
+    kind, _, arg = rule.partition(":")
+    if kind == "weekly":
+        days = {int(d) for d in arg.split(",")}
+        d = first
+        while d <= last:
+            if d.weekday() in days:
+                yield d
+            d += timedelta(days=1)
+        return
+    step = 1 if kind == "daily" else int(arg)
+    d = start + timedelta(days=-(-(first - start).days // step) * step)
+    while d <= last:
+        yield d
+        d += timedelta(days=step)
+
+
+def expand(series: Iterable[Dict], window_start: date, window_end: date,
+           taken: Set[Tuple[int, str]] = frozenset()) -> Iterator[Dict]:
+    """
+    Virtual task rows for every series occurrence in the window, skipping
+    (series_id, "YYYY-MM-DD") pairs that already have an exception row.
+    Rows look like GET /tasks rows with id=None plus series_id/occurrence.
+    """
+    for s in series:
+        until = date.fromisoformat(s["until_date"]) if s["until_date"] else None
+        for d in occurrences(s["rule"], date.fromisoformat(s["start_date"]), window_start, window_end, until):
+            day = d.isoformat()
+            if (s["id"], day) in taken:
+                continue
+            yield {
+                "id": None,
+                "name": s["name"],
+                "category": s["category"],
+                "priority": s["priority"],
+                "deadline": day,
+                "start_time": s["start_time"],
+                "duration": s["duration"],
+                "status": 0,
+                "depends_on_id": 0,
+                "stress_level": s["stress_level"],
+                "series_id": s["id"],
+                "occurrence": day,
+            }
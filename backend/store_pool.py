@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Entry:
+    __slots__ = ("handle", "pins", "bytes", "ready", "error")
+
+    def __init__(self):
+        self.handle = None
+        self.pins = 0
+        self.bytes = 0
+        self.ready = threading.Event()
+        self.error = None
+
+
+class StorePool:
+    """
+    Lazily opened, LRU-evicted per-tenant C stores.
+
+    open_store(key) loads a tenant on its first request; close_store(key, handle)
+    persists and frees it on eviction. A store is pinned while a request uses
+    it, so a handle is never freed underneath a running call. max_bytes is a
+    soft cap: pinned stores can push the total over it until they're released.
+    """
+
+    def __init__(
+        self,
+        open_store: Callable[[Hashable], Any],
+        close_store: Callable[[Hashable, Any], None],
+        size_of: Callable[[Any], int],
+        max_bytes: int,
+    ):
+        self._open = open_store
+        self._close = close_store
+        self._size_of = size_of
+        self._max = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()   # oldest first
+        self._closing: Dict[Hashable, threading.Event] = {}
+        self._total = 0
+        self.evictions = 0
+
+    @contextmanager
+    def use(self, key: Hashable):
+        entry = self._acquire(key)
+        try:
+            yield entry.handle
+        finally:
+            self._release(entry)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"stores": len(self._entries), "bytes": self._total, "evictions": self.evictions}
+
+    def close_all(self) -> None:
+        with self._lock:
+            items = list(self._entries.items())
+            self._entries.clear()
+            self._total = 0
+        for key, entry in items:
+            if entry.handle is not None:
+                self._close(key, entry.handle)
+
+    def _acquire(self, key: Hashable) -> _Entry:
+        while True:
+            with self._lock:
+                closing = self._closing.get(key)
+                if closing is None:
+                    entry = self._entries.get(key)
+                    owner = entry is None
+                    if owner:
+                        entry = _Entry()
+                        self._entries[key] = entry
+                    else:
+                        self._entries.move_to_end(key)
+                    entry.pins += 1
+                    break
+            # being evicted right now: wait until its snapshot is written
+            closing.wait()
+
+        if owner:
+            try:
+                entry.handle = self._open(key)
+            except BaseException as e:
+                with self._lock:
+                    self._entries.pop(key, None)
+                entry.error = e
+                entry.ready.set()
+                raise
+            entry.ready.set()
+        else:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+        return entry
+
+    def _release(self, entry: _Entry) -> None:
+        size = self._size_of(entry.handle)
+        victims = []
+        with self._lock:
+            entry.pins -= 1
+            self._total += size - entry.bytes
+            entry.bytes = size
+
+            for key, e in list(self._entries.items()):
+                if self._total <= self._max:
+                    break
+                if e.pins or not e.ready.is_set():
+                    continue
+                del self._entries[key]
+                self._total -= e.bytes
+                done = threading.Event()
+                self._closing[key] = done
+                victims.append((key, e, done))
+
+        for key, e, done in victims:
+            try:
+                self._close(key, e.handle)
+            finally:
+                with self._lock:
+                    del self._closing[key]
+                    self.evictions += 1
+                done.set()
@@ -0,0 +1,177 @@
+import re
+import threading
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def embed(texts: Sequence[str], dim: int) -> np.ndarray:
+    """
+    Hashed n-gram embeddings, one L2-normalised float32 row per text.
+
+    Features are whole words plus character trigrams of each "#word#", hashed
+    (crc32, stable across processes) into `dim` buckets with a hash-derived
+    sign so collisions cancel out instead of piling up. "gym", "gym session"
+    and "gymnastics" land close together; no model download needed.
+    """
+    rows: List[int] = []
+    cols: List[int] = []
+    vals: List[float] = []
+    for i, text in enumerate(texts):
+        for word in _WORD.findall((text or "").lower()):
+            feats = ["w:" + word]
+            padded = f"#{word}#"
+            feats += [padded[j:j + 3] for j in range(len(padded) - 2)]
+            for f in feats:
+                h = zlib.crc32(f.encode("utf-8"))
+                rows.append(i)
+                cols.append(h % dim)
+                vals.append(1.0 if h & 0x80000000 else -1.0)
+
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    if rows:
+        np.add.at(out, (np.asarray(rows), np.asarray(cols)), np.asarray(vals, dtype=np.float32))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+
+class _UserIndex:
+    """One user's rows: a contiguous (capacity x dim) matrix plus parallel id/status arrays."""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.vecs = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.row_of: Dict[int, int] = {}
+        self.n = 0
+        self.seq = -1   # tenant_seq this index reflects
+
+    def _grow(self, need: int) -> None:
+        cap = len(self.ids)
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        for name in ("vecs", "ids", "active"):
+            old = getattr(self, name)
+            new = np.zeros((cap,) + old.shape[1:], dtype=old.dtype)
+            new[: self.n] = old[: self.n]
+            setattr(self, name, new)
+
+    def put(self, task_ids: Sequence[int], vecs: np.ndarray, active: Sequence[bool]) -> None:
+        for task_id, vec, act in zip(task_ids, vecs, active):
+            row = self.row_of.get(task_id)
+            if row is None:
+                self._grow(self.n + 1)
+                row = self.n
+                self.n += 1
+                self.row_of[task_id] = row
+                self.ids[row] = task_id
+            self.vecs[row] = vec
+            self.active[row] = act
+
+    def remove(self, task_id: int) -> None:
+        row = self.row_of.pop(task_id, None)
+        if row is None:
+            return
+        # swap-delete keeps the matrix contiguous
+        last = self.n - 1
+        if row != last:
+            self.vecs[row] = self.vecs[last]
+            self.ids[row] = self.ids[last]
+            self.active[row] = self.active[last]
+            self.row_of[int(self.ids[row])] = row
+        self.n = last
+
+
+class TaskIndex:
+    """
+    Per-user similarity index over task names for /tasks/similar and chat
+    context.
+
+    A user's index is built on first use by load_user(user_id) and then kept
+    current by apply() from the write paths. Each index remembers the
+    tenant_seq it reflects; callers compare that with SQLite and reload when
+    another process (or an offline edit) has moved it.
+    """
+
+    def __init__(self, load_rows: Callable[[int], Tuple[int, Iterable[Tuple[int, str, int]]]], dim: int = 128):
+        # load_rows(user_id) -> (tenant_seq, [(id, name, status), ...])
+        self._load_rows = load_rows
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._users: Dict[int, _UserIndex] = {}
+
+    def is_loaded(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def seq(self, user_id: int) -> int:
+        with self._lock:
+            idx = self._users.get(user_id)
+            return idx.seq if idx else -1
+
+    def load_user(self, user_id: int) -> None:
+        seq, rows = self._load_rows(user_id)
+        rows = list(rows)
+        idx = _UserIndex(self.dim, capacity=max(64, len(rows)))
+        for start in range(0, len(rows), 4096):
+            batch = rows[start:start + 4096]
+            idx.put([r[0] for r in batch], embed([r[1] for r in batch], self.dim), [r[2] == 0 for r in batch])
+        idx.seq = seq
+        with self._lock:
+            self._users[user_id] = idx
+
+    def apply(self, user_id: int, op: str, task_id: int, row: Optional[dict], seq: int) -> None:
+        """Incremental update from a write path; no-op for users not loaded yet."""
+        vec = embed([row["name"]], self.dim) if op == "upsert" and row else None
+        with self._lock:
+            idx = self._users.get(user_id)
+            if idx is None:
+                return
+            if vec is not None:
+                idx.put([int(task_id)], vec, [int(row["status"]) == 0])
+            else:
+                idx.remove(int(task_id))
+            idx.seq = max(idx.seq, seq)
+
+    def top_k(
+        self,
+        user_id: int,
+        queries: Sequence[str],
+        k: int = 10,
+        active_only: bool = False,
+        exclude: Iterable[int] = (),
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Batched cosine top-k: one (task_id, score) list per query, best first.
+        """
+        q = embed(queries, self.dim)
+        with self._lock:
+            idx = self._users.get(user_id)
+            if idx is None or idx.n == 0:
+                return [[] for _ in queries]
+            n = idx.n
+            scores = q @ idx.vecs[:n].T          # rows are unit length: dot = cosine
+            ids = idx.ids[:n].copy()
+            mask = ~idx.active[:n] if active_only else None
+
+        if mask is not None:
+            scores[:, mask] = -np.inf
+        exclude = list(exclude)
+        if exclude:
+            scores[:, np.isin(ids, exclude)] = -np.inf
+
+        k = min(k, n)
+        if k <= 0:
+            return [[] for _ in queries]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        out = []
+        for qi in range(len(queries)):
+            cand = top[qi][np.argsort(-scores[qi, top[qi]])]
+            out.append([(int(ids[c]), float(scores[qi, c])) for c in cand if np.isfinite(scores[qi, c])])
+        return out
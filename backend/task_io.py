@@ -0,0 +1,102 @@
+import codecs
+import csv
+import io
+import json
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Columns of an export, in GET /tasks row order; an import reads the same names.
+TASK_FIELDS = (
+    "id", "name", "category", "priority", "deadline", "start_time",
+    "duration", "status", "depends_on_id", "stress_level",
+)
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+_CSV_BREAKS = re.compile(r'["\n]')
+
+
+def encode_rows(fmt: str, rows: Iterable[Sequence], header: bool = False) -> str:
+    """One chunk of an export: TASK_FIELDS-ordered tuples as NDJSON lines or CSV records."""
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(zip(TASK_FIELDS, r)), ensure_ascii=False) + "\n" for r in rows)
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    if header:
+        w.writerow(TASK_FIELDS)
+    w.writerows(rows)
+    return buf.getvalue()
+
+
+class RecordReader:
+    """
+    Incremental parser for an uploaded NDJSON or CSV body.
+
+    feed() takes whatever bytes arrived and returns the records completed so
+    far as (record_number, dict) pairs, or (record_number, error) for a
+    record that doesn't parse; a partial trailing record is kept for the next
+    call. Memory is bounded by the longest record, not the upload. CSV needs
+    a header row; quoted fields may contain newlines.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._pending = ""
+        self._header: List[str] = []
+        self._n = 0
+
+    def feed(self, data: bytes, final: bool = False) -> List[Tuple[int, object]]:
+        text = self._pending + self._decoder.decode(data, final)
+        if final:
+            done, self._pending = text, ""
+        else:
+            cut = self._cut(text)
+            done, self._pending = text[:cut], text[cut:]
+        return self._parse(done) if done.strip() else []
+
+    def _cut(self, text: str) -> int:
+        """End of the last complete record in text (after its newline)."""
+        if self.fmt == "ndjson":
+            return text.rfind("\n") + 1
+        cut, quoted = 0, False
+        for m in _CSV_BREAKS.finditer(text):
+            if m.group() == '"':
+                quoted = not quoted
+            elif not quoted:
+                cut = m.end()
+        return cut
+
+    def _parse(self, text: str) -> List[Tuple[int, object]]:
+        out: List[Tuple[int, object]] = []
+        if self.fmt == "ndjson":
+            # "\n" only: str.splitlines() also breaks at U+2028, U+0085 and the
+            # like, which JSON allows unescaped inside strings
+            lines = text.split("\n")
+            if not lines[-1]:
+                lines.pop()     # what follows the last newline
+            for line in lines:
+                self._n += 1
+                if not line.strip():
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError as e:
+                    out.append((self._n, f"invalid JSON: {e}"))
+                    continue
+                out.append((self._n, rec if isinstance(rec, dict) else "expected a JSON object"))
+            return out
+
+        for row in csv.reader(io.StringIO(text, newline="")):
+            if not self._header:
+                self._header = [h.strip() for h in row]
+                continue
+            self._n += 1
+            if not any(cell.strip() for cell in row):
+                continue
+            if len(row) > len(self._header):
+                out.append((self._n, f"{len(row)} fields, header has {len(self._header)}"))
+                continue
+            rec: Dict[str, str] = dict(zip(self._header, row))
+            out.append((self._n, rec))
+        return out
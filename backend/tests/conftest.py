@@ -0,0 +1,57 @@
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+C_SOURCE = os.path.join(BACKEND, "c_core", "task_manager.c")
+
+# Everything main.py writes (tasks.db, C store files, the built core) goes
+# to a scratch dir; set before any test imports main.
+SCRATCH = tempfile.mkdtemp(prefix="optitask-tests-")
+os.environ["OPTITASK_DB"] = os.path.join(SCRATCH, "tasks.db")
+os.environ["OPTITASK_STORE_DIR"] = os.path.join(SCRATCH, "c_store")
+sys.path.insert(0, BACKEND)
+
+
+def build_c(out: str, *sources: str, shared: bool = True) -> str:
+    """gcc -O2 -pthread build of `sources` into `out`; skips the test without gcc."""
+    gcc = shutil.which("gcc")
+    if gcc is None:
+        pytest.skip("gcc not found")
+    flags = ["-shared", "-fPIC"] if shared else []
+    libs = ["-lrt"] if sys.platform.startswith("linux") else []     # shm_open, glibc < 2.34
+    subprocess.run([gcc, "-O2", "-pthread", *flags, "-o", out, *sources, *libs], check=True)
+    return out
+
+
+def _core() -> str:
+    built = os.path.join(BACKEND, "c_core", "task_manager.dll")
+    if shutil.which("gcc") is None:
+        return built    # build.bat / build.sh output
+    return build_c(os.path.join(SCRATCH, "task_manager.dll"), C_SOURCE)
+
+
+os.environ.setdefault("OPTITASK_C_CORE", _core())
+
+_users = itertools.count(1000)
+
+
+@pytest.fixture
+def user():
+    """A user id no other test has written to."""
+    return next(_users)
+
+
+@pytest.fixture
+def api(user):
+    """TestClient for `user` (X-User-Id set on every request)."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    return TestClient(main.app, headers={"X-User-Id": str(user)})
@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+import main
+from analytics import rebuild_rollups
+
+TODAY = date.today()
+MONDAY = TODAY + timedelta(days=14 - TODAY.weekday())     # a week bucket starts on a Monday
+
+
+def _day(n):
+    return (MONDAY + timedelta(days=n)).isoformat()
+
+
+def _rollups(user):
+    conn = main.db_conn()
+    rows = conn.execute(
+        "SELECT day, dim, key, tasks, completed, duration_sum FROM task_rollup WHERE user_id=? AND tasks != 0",
+        (user,),
+    ).fetchall()
+    conn.close()
+    return sorted(map(tuple, rows), key=repr)
+
+
+def _rebuilt(user):
+    conn = main.db_conn()
+    rebuild_rollups(conn)
+    conn.close()
+    return _rollups(user)
+
+
+def _seed(api):
+    specs = [
+        ("standup", 0, "work", 1, "09:00", 60),
+        ("review", 1, "work", 2, "09:30", 30),
+        ("laundry", 2, "home", 3, "", 20),
+        ("garden", 8, "home", 1, "14:00", 40),
+        ("typo", 9, "work", 2, "09:00", 10),
+    ]
+    ids = {}
+    for name, day, category, priority, start, duration in specs:
+        body = {"name": name, "deadline": _day(day), "category": category, "priority": priority,
+                "start_time": start, "duration": duration}
+        r = api.post("/tasks", json=body)
+        assert r.status_code == 200, r.text
+        ids[name] = r.json()["id"]
+    api.patch(f"/tasks/{ids['standup']}", json={"status": 1})
+    api.patch(f"/tasks/{ids['garden']}", json={"status": 1})
+    api.patch(f"/tasks/{ids['review']}", json={"category": "home", "deadline": _day(3)})
+    api.delete(f"/tasks/{ids['typo']}")
+    return ids
+
+
+def test_triggers_keep_the_rollups_equal_to_a_rebuild(api, user):
+    ids = _seed(api)
+    kept = _rollups(user)
+    assert kept and kept == _rebuilt(user)
+
+    conn = main.db_conn()
+    conn.execute("UPDATE tasks SET completed_day = ? WHERE id=?", ((TODAY - main._EPOCH).days - 40, ids["standup"]))
+    conn.commit()
+    conn.close()
+    assert main.archive_completed(after_days=30, pause=0) >= 1
+    assert _rollups(user) == kept == _rebuilt(user)     # archiving nets out
+
+
+def test_analytics_buckets_and_dimensions(api, user):
+    _seed(api)
+    params = {"from": _day(0), "to": _day(13)}
+    weekly = api.get("/analytics", params=params).json()
+    assert (weekly["from"], weekly["to"], weekly["bucket"]) == (_day(0), _day(13), "week")
+    assert weekly["buckets"] == [
+        {"start": _day(0), "tasks": 3, "completed": 1, "completion_rate": 0.333, "avg_duration": 36.7},
+        {"start": _day(7), "tasks": 1, "completed": 1, "completion_rate": 1.0, "avg_duration": 40.0},
+    ]
+    assert weekly["totals"] == {"tasks": 4, "completed": 2, "completion_rate": 0.5, "avg_duration": 37.5}
+    assert [(c["category"], c["tasks"], c["completed"]) for c in weekly["by_category"]] == [("home", 3, 1), ("work", 1, 1)]
+    assert [(p["priority"], p["tasks"], p["completed"]) for p in weekly["by_priority"]] == [(1, 2, 2), (2, 1, 0), (3, 1, 0)]
+    assert weekly["busiest_hours"] == [{"hour": 9, "tasks": 2, "minutes": 90}, {"hour": 14, "tasks": 1, "minutes": 40}]
+    assert weekly["untimed"] == 1
+
+    daily = api.get("/analytics", params={**params, "bucket": "day"}).json()
+    assert [(b["start"], b["tasks"]) for b in daily["buckets"]] == [(_day(0), 1), (_day(2), 1), (_day(3), 1), (_day(8), 1)]
+    monthly = api.get("/analytics", params={**params, "bucket": "month"}).json()
+    assert sum(b["tasks"] for b in monthly["buckets"]) == 4
+    assert all(b["start"].endswith("-01") for b in monthly["buckets"])
+
+    narrow = api.get("/analytics", params={"from": _day(7), "to": _day(7), "bucket": "day"}).json()
+    assert narrow["buckets"] == [] and narrow["totals"]["tasks"] == 0
+
+    assert api.get("/analytics", params={**params, "bucket": "year"}).status_code == 400
+    assert api.get("/analytics", params={"from": _day(5), "to": _day(1)}).status_code == 400
+    assert api.get("/analytics", params={"from": "2000-01-01", "to": _day(0)}).status_code == 400
@@ -0,0 +1,135 @@
+import json
+from datetime import date, timedelta
+
+import main
+
+TODAY = main._day_number(date.today())
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _import(api, *rows):
+    body = "\n".join(json.dumps(r) for r in rows).encode()
+    return api.post("/tasks/import", params={"format": "ndjson"}, content=body).json()
+
+
+def _completed_days(user):
+    conn = main.db_conn()
+    rows = conn.execute("SELECT name, completed_day FROM tasks WHERE user_id=?", (user,)).fetchall()
+    conn.close()
+    return {r["name"]: r["completed_day"] for r in rows}
+
+
+def _age(user, days):
+    conn = main.db_conn()
+    conn.execute("UPDATE tasks SET completed_day = ? WHERE user_id=? AND status=1", (TODAY - days, user))
+    conn.commit()
+    conn.close()
+
+
+def test_rows_inserted_done_get_a_completion_day(api, user):
+    api.post("/tasks", json={"name": "posted done", "deadline": FUTURE, "status": 1})
+    _import(api, {"name": "imported done", "status": 1}, {"name": "imported open", "deadline": FUTURE})
+    sid = api.post("/series", json={"name": "gym", "rule": "daily", "start_date": FUTURE}).json()["id"]
+    api.patch(f"/series/{sid}/occurrences/{FUTURE}", json={"status": 1})
+
+    days = _completed_days(user)
+    assert days["posted done"] == days["imported done"] == days["gym"] == TODAY
+    assert days["imported open"] is None
+
+
+def test_an_undated_done_import_is_not_archived_straight_away(api, user):
+    _import(api, {"name": "undated", "status": 1})
+    main.archive_completed(after_days=30, pause=0)
+    assert [t["name"] for t in api.get("/tasks").json()] == ["undated"]
+    assert api.get("/archive").json()["results"] == []
+
+
+def test_legacy_done_rows(api, user):
+    past = (date.today() - timedelta(days=90)).isoformat()
+    _import(api, {"name": "undated", "status": 1}, {"name": "dated", "status": 1, "deadline": past})
+    conn = main.db_conn()
+    conn.execute("UPDATE tasks SET completed_day = NULL WHERE user_id=?", (user,))   # as before the column existed
+    conn.execute("UPDATE tasks SET deadline = '' WHERE user_id=? AND name='undated'", (user,))
+    conn.commit()
+    conn.close()
+
+    main.archive_completed(after_days=30, pause=0)
+    # dated: archived by its deadline; undated: stamped today, kept for now
+    assert [t["name"] for t in api.get("/tasks").json()] == ["undated"]
+    assert _completed_days(user)["undated"] == TODAY
+    archived = api.get("/archive").json()["results"]
+    assert [(r["name"], r["completed"]) for r in archived] == [("dated", past)]
+
+
+def test_archive_moves_old_done_tasks_out_of_sqlite_and_the_c_store(api, user):
+    ids = [api.post("/tasks", json={"name": f"t{i}", "deadline": FUTURE}).json()["id"] for i in range(7)]
+    for i in ids[:5]:
+        api.patch(f"/tasks/{i}", json={"status": 1})
+    _age(user, 40)
+    conn = main.db_conn()
+    for n, i in enumerate(ids[:5]):     # distinct completion days for the paging order
+        conn.execute("UPDATE tasks SET completed_day = ? WHERE id=?", (TODAY - 40 - n, i))
+    conn.commit()
+    conn.close()
+
+    assert main.archive_completed(after_days=30, pause=0) >= 5
+    assert sorted(t["id"] for t in api.get("/tasks").json()) == ids[5:]
+    with main.c_stores.use(user) as store:
+        assert main.lib.tm_count(store) == 2
+    assert api.get("/health/consistency").json()["status"] == "ok"
+
+    pages, cursor = [], None
+    while True:
+        page = api.get("/archive", params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        pages.append([r["id"] for r in page["results"]])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert pages == [ids[0:2], ids[2:4], ids[4:5]]   # most recently completed first
+
+
+def test_archived_ids_are_not_handed_out_again(api, user):
+    last = api.post("/tasks", json={"name": "newest so far", "deadline": FUTURE, "status": 1}).json()["id"]
+    _age(user, 40)
+    main.archive_completed(after_days=30, pause=0)
+    assert [r["id"] for r in api.get("/archive").json()["results"]] == [last]
+
+    posted = api.post("/tasks", json={"name": "posted", "deadline": FUTURE}).json()["id"]
+    _import(api, {"name": "imported", "deadline": FUTURE})
+    ids = {t["name"]: t["id"] for t in api.get("/tasks").json()}
+    assert last < posted == ids["posted"] < ids["imported"]
+
+
+def test_a_table_from_before_autoincrement_is_rebuilt(tmp_path, monkeypatch):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE tasks (id INTEGER PRIMARY KEY, name TEXT NOT NULL, status INTEGER NOT NULL DEFAULT 0);
+        INSERT INTO tasks(id, name) VALUES (1, 'one'), (2, 'two');
+        CREATE TABLE tasks_archive (
+          archive_id INTEGER PRIMARY KEY, id INTEGER NOT NULL, user_id INTEGER NOT NULL, name TEXT NOT NULL,
+          category TEXT NOT NULL, priority INTEGER NOT NULL, deadline TEXT NOT NULL, start_time TEXT NOT NULL,
+          duration INTEGER NOT NULL, status INTEGER NOT NULL, depends_on_id INTEGER NOT NULL,
+          stress_level INTEGER NOT NULL, series_id INTEGER NOT NULL, occurrence TEXT NOT NULL,
+          done_day INTEGER NOT NULL
+        );
+        INSERT INTO tasks_archive VALUES (1, 9, 0, 'nine', 'general', 3, '', '', 30, 1, 0, 5, 0, '', 0);
+        """
+    )
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(main, "DB_PATH", path)
+    main.db_init()
+    main.db_init()      # once only
+
+    conn = main.db_conn()
+    assert "AUTOINCREMENT" in conn.execute("SELECT sql FROM sqlite_master WHERE name='tasks'").fetchone()[0]
+    conn.execute("INSERT INTO tasks(name) VALUES ('three')")
+    assert [tuple(r) for r in conn.execute("SELECT id, name FROM tasks ORDER BY id")] == [
+        (1, "one"), (2, "two"), (10, "three"),
+    ]
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name='tasks_time_ins'").fetchone()
+    conn.close()
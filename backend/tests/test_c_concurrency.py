@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BACKEND, build_c
+
+STRESS_SOURCE = os.path.join(BACKEND, "c_core", "stress_test.c")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the stress driver uses pthreads")
+def test_threads_mixing_writes_and_reads_keep_the_store_consistent(tmp_path):
+    exe = build_c(str(tmp_path / "stress_test"), STRESS_SOURCE, shared=False)
+    run = subprocess.run([exe, str(tmp_path)], capture_output=True, text=True, timeout=300)
+    assert run.returncode == 0, run.stderr
+    assert "0 failures" in run.stdout
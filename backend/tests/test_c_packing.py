@@ -0,0 +1,92 @@
+import ctypes
+import random
+import sqlite3
+from datetime import date
+
+import main
+from main import TmDepInfo, lib
+from consistency import hash_sql
+
+EPOCH = date(1970, 1, 1)
+
+
+def _add(store, name, category="work", priority=3, deadline="2030-01-02", start="09:00", status=0):
+    return lib.tm_add_task(store, name.encode(), category.encode(), priority, deadline.encode(), start.encode(),
+                           30, status, 0, 5)
+
+
+def _sql_digest(rows):
+    """XOR of consistency.hash_sql over (id, name, category, priority, deadline, start_time) rows."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE tasks (id, name, category, priority, deadline, start_time, duration, status, "
+        "depends_on_id, stress_level)"
+    )
+    conn.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?, 30, 0, 0, 5)", rows)
+    digest = 0
+    for (h,) in conn.execute(f"SELECT {hash_sql('tasks')} FROM tasks"):
+        digest ^= h & (2**64 - 1)
+    conn.close()
+    return digest
+
+
+def test_dates_and_times_are_day_and_minute_numbers():
+    store = lib.tm_store_create()
+    cases = [("2030-01-02", "09:30"), ("", ""), ("1970-01-01", "00:00"), ("2024-02-29", "23:59")]
+    ids = [_add(store, f"t{i}", deadline=d, start=t) for i, (d, t) in enumerate(cases)]
+    out = (TmDepInfo * 8)()
+    got = {out[i].id: (out[i].deadline_day, out[i].start_min) for i in range(lib.tm_dependency_order(store, out, 8))}
+    lib.tm_store_free(store)
+
+    def packed(d, t):
+        day = (date.fromisoformat(d) - EPOCH).days if d else -1
+        return day, int(t[:2]) * 60 + int(t[3:]) if t else -1
+
+    assert got == {i: packed(d, t) for i, (d, t) in zip(ids, cases)}
+
+
+def test_sorted_ids_keep_the_string_order():
+    rnd = random.Random(29)
+    store = lib.tm_store_create()
+    keys = {}
+    for i in range(300):
+        status, priority = rnd.randint(0, 1), rnd.randint(1, 5)
+        deadline = rnd.choice(["", f"20{rnd.randint(24, 31)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"])
+        start = rnd.choice(["", f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}"])
+        task_id = _add(store, f"t{i}", priority=priority, deadline=deadline, start=start, status=status)
+        keys[task_id] = (status, priority, deadline, start)     # "" sorts first, as -1 does
+
+    ids = (ctypes.c_int * 300)()
+    assert lib.tm_sorted_ids(store, ids, 300) == 300
+    lib.tm_store_free(store)
+    assert sorted(ids) == sorted(keys)
+    assert [keys[i] for i in ids] == sorted(keys.values())
+
+
+def test_categories_and_names_survive_renames_and_a_snapshot(tmp_path):
+    categories = ["work", "家", "", "Work", "health & fitness"]
+    store = lib.tm_store_create()
+    rows = {}
+    for i in range(50):
+        name, category = f"task {i} ✓", categories[i % len(categories)]
+        rows[_add(store, name, category)] = [name, category or "general"]
+
+    # rewriting names leaves garbage behind; the heap compacts instead of growing
+    start_bytes = lib.tm_store_bytes(store)
+    target = next(iter(rows))
+    for n in range(20000):
+        name = f"{n:05d} " + "x" * 200
+        lib.tm_update_task(store, target, name.encode(), None, -1, None, None, -1, -1, -1, -1)
+    rows[target][0] = name
+    assert lib.tm_store_bytes(store) < start_bytes + 64 * 1024     # 4 MB was written
+
+    expected = _sql_digest([(i, n, c, 3, "2030-01-02", "09:00") for i, (n, c) in rows.items()])
+    assert main.c_store_digest(store)[0] == expected
+
+    snap = str(tmp_path / "packed.snap").encode()
+    assert lib.tm_snapshot_save(store, snap, 1) == 1
+    lib.tm_store_free(store)
+    again = lib.tm_store_create()
+    assert lib.tm_snapshot_load(again, snap, str(tmp_path / "none.journal").encode()) == 1
+    assert main.c_store_digest(again)[:2] == (expected, len(rows))
+    lib.tm_store_free(again)
@@ -0,0 +1,66 @@
+import ctypes
+import os
+from datetime import date, timedelta
+
+import main
+from main import lib
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _add(store, name: bytes, priority: int = 3, depends_on: int = 0) -> int:
+    return lib.tm_add_task(store, name, b"work", priority, b"2030-01-02", b"09:00", 30, 0, depends_on, 5)
+
+
+def _state(store):
+    n = lib.tm_count(store)
+    ids = (ctypes.c_int * max(n, 1))()
+    got = lib.tm_sorted_ids(store, ids, n)
+    return list(ids[:got]), main.c_store_digest(store)[:2]
+
+
+def test_snapshot_plus_journal_replays_later_writes(tmp_path):
+    snap, journal = str(tmp_path / "s.snap").encode(), str(tmp_path / "s.journal").encode()
+    store = lib.tm_store_create()
+    assert lib.tm_journal_open(store, journal) == 1
+    a, b, c = (_add(store, n, p) for n, p in ((b"a", 2), (b"b", 1), (b"c", 3)))
+    assert lib.tm_snapshot_save(store, snap, 7) == 1
+
+    d = _add(store, b"d", 1, depends_on=a)
+    lib.tm_update_task(store, b, b"b renamed", None, 4, None, None, -1, 1, -1, -1)
+    lib.tm_delete_task(store, a)        # also releases d
+    assert lib.tm_journal_entries(store) > 0
+    expected = _state(store)
+    lib.tm_journal_close(store)
+    lib.tm_store_free(store)
+
+    again = lib.tm_store_create()
+    seq = lib.tm_snapshot_load(again, snap, journal)
+    assert seq > 7
+    assert _state(again) == expected
+    assert sorted(expected[0]) == sorted([b, c, d])
+    lib.tm_store_free(again)
+
+
+def test_snapshot_load_rejects_missing_files(tmp_path):
+    store = lib.tm_store_create()
+    assert lib.tm_snapshot_load(store, str(tmp_path / "no.snap").encode(), str(tmp_path / "no.j").encode()) == -1
+    lib.tm_store_free(store)
+
+
+def test_evicted_store_reloads_from_its_files(api, user):
+    ids = [api.post("/tasks", json={"name": f"t{i}", "deadline": FUTURE, "priority": i % 5 + 1}).json()["id"]
+           for i in range(6)]
+    api.patch(f"/tasks/{ids[0]}", json={"name": "renamed"})
+    api.delete(f"/tasks/{ids[1]}")
+    before = api.get("/tasks").json()
+
+    main.c_stores.close_all()
+    snap, _ = main._store_paths(user)
+    assert os.path.exists(snap.decode())
+
+    assert api.get("/tasks").json() == before
+    with main.c_stores.use(user) as store:
+        conn = main.db_conn()
+        assert lib.tm_store_seq(store) == main.db_user_seq(conn, user)
+        conn.close()
@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+
+import main
+from change_feed import ChangeFeed
+from fastapi.testclient import TestClient
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _add(api, name):
+    return api.post("/tasks", json={"name": name, "deadline": FUTURE}).json()["id"]
+
+
+def test_etag_answers_304_until_a_write(api):
+    _add(api, "first")
+    full = api.get("/tasks")
+    etag = full.headers["etag"]
+    again = api.get("/tasks", headers={"If-None-Match": etag})
+    assert (again.status_code, again.headers["etag"], again.content) == (304, etag, b"")
+
+    _add(api, "second")
+    fresh = api.get("/tasks", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["etag"] != etag
+    assert [t["name"] for t in fresh.json()] == ["first", "second"]
+
+
+def test_etags_are_per_user(api, user):
+    other = TestClient(main.app, headers={"X-User-Id": str(user + 400000)})
+    _add(api, "mine")
+    mine, theirs = api.get("/tasks"), other.get("/tasks")
+    assert mine.headers["etag"] != theirs.headers["etag"]
+    assert "X-User-Id" in mine.headers["vary"] and "Accept" in mine.headers["vary"]
+
+    other.post("/tasks", json={"name": "theirs", "deadline": FUTURE})   # leaves my ETag alone
+    assert api.get("/tasks", headers={"If-None-Match": mine.headers["etag"]}).status_code == 304
+    stolen = api.get("/tasks", headers={"If-None-Match": other.get("/tasks").headers["etag"]})
+    assert stolen.status_code == 200 and [t["name"] for t in stolen.json()] == ["mine"]
+
+    bad = api.get("/tasks", params={"shape": "table"}, headers={"If-None-Match": mine.headers["etag"]})
+    assert bad.status_code == 400
+
+
+def test_changes_since_a_version_are_only_the_last_op_per_row(api, user):
+    kept, gone = _add(api, "kept"), _add(api, "gone")
+    since = int(api.get("/tasks").headers["etag"].strip('"'))
+    created = _add(api, "created")
+    api.patch(f"/tasks/{kept}", json={"name": "kept, renamed"})
+    api.patch(f"/tasks/{gone}", json={"priority": 1})
+    api.delete(f"/tasks/{gone}")
+    TestClient(main.app, headers={"X-User-Id": str(user + 400000)}).post(
+        "/tasks", json={"name": "someone else's", "deadline": FUTURE}
+    )
+
+    feed = api.get("/tasks/changes", params={"since": since}).json()
+    assert feed["reset"] is False
+    assert sorted((t["id"], t["name"]) for t in feed["upserted"]) == [(kept, "kept, renamed"), (created, "created")]
+    assert feed["deleted"] == [gone]
+    assert api.get("/tasks/changes", params={"since": feed["version"]}).json()["upserted"] == []
+
+    assert api.get("/tasks/changes", params={"since": feed["version"] + 10}).json()["reset"] is True
+    assert api.get("/tasks/changes", params={"since": 0}).json()["reset"] is True
+
+
+def test_an_import_resets_only_its_user(api, user):
+    other = TestClient(main.app, headers={"X-User-Id": str(user + 400000)})
+    before = int(api.get("/tasks").headers["etag"].strip('"'))
+    api.post("/tasks/import", params={"format": "ndjson"}, content=b'{"name": "imported"}\n')
+    assert api.get("/tasks/changes", params={"since": before}).json()["reset"] is True
+    assert other.get("/tasks/changes", params={"since": before}).json()["reset"] is False
+
+
+def test_a_version_that_fell_out_of_the_log_resets():
+    feed = ChangeFeed(max_entries=3)
+    start = feed.version
+    events = []
+    feed.add_listener(events.append)
+    for i in range(1, 4):
+        feed.record("upsert", i, user_id=7)
+    assert feed.changes_since(start, user_id=7)["upserted_ids"] == [1, 2, 3]
+
+    feed.record("delete", 2, user_id=7)
+    assert feed.changes_since(start, user_id=7)["reset"] is True
+    tail = feed.changes_since(start + 1, user_id=7)
+    assert (tail["reset"], tail["upserted_ids"], tail["deleted_ids"]) == (False, [3], [2])
+    assert feed.changes_since(start + 1, user_id=8)["upserted_ids"] == []
+
+    # each event links to the same user's previous one
+    assert [e["version"] for e in events] == [start + 1, start + 2, start + 3, start + 4]
+    assert [e["prev"] for e in events[1:]] == [start + 1, start + 2, start + 3]
+
+    # an idle user's version stays usable after the log moved on
+    idle = feed.user_version(9)
+    for i in range(4, 8):
+        feed.record("upsert", i, user_id=7)
+    assert feed.user_version(9) == idle
+    assert feed.changes_since(idle, user_id=9)["reset"] is False
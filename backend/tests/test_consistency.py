@@ -0,0 +1,99 @@
+import sqlite3
+from datetime import date, timedelta
+
+import main
+from main import lib
+from consistency import DIGEST_TOTAL, rebuild_digests
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+NAMES = ["a", "Rückruf Zoë", "会議の準備をする", "gym 🏋️‍♀️ + stretch", "x" * 300, "ends in ñ"]
+
+
+def _digests(conn):
+    return sorted(tuple(r) for r in conn.execute("SELECT user_id, bucket, digest, tasks FROM task_digest"))
+
+
+def test_sql_and_c_hashes_agree(api):
+    ids = [
+        api.post("/tasks", json={"name": n, "category": c, "deadline": d, "start_time": t, "priority": p}).json()["id"]
+        for n, c, d, t, p in zip(NAMES, ["work", "家", "", "health", "study", "x"], [FUTURE, "", FUTURE, "", FUTURE, FUTURE],
+                                 ["09:30", "", "23:59", "", "00:00", ""], [1, 2, 3, 4, 5, 3])
+    ]
+    api.patch(f"/tasks/{ids[0]}", json={"depends_on_id": ids[1], "status": 1, "name": "ä"})
+    api.delete(f"/tasks/{ids[1]}")      # releases ids[0]
+    assert api.get("/health/consistency").json()["status"] == "ok"
+
+
+def test_plain_sqlite_writes_keep_the_digest(api, user):
+    ids = [api.post("/tasks", json={"name": f"t{i}", "deadline": FUTURE}).json()["id"] for i in range(3)]
+
+    # no functions registered: the triggers must not need any
+    conn = sqlite3.connect(main.DB_PATH)
+    conn.execute("UPDATE tasks SET name = 'renamed in a shell', category = 'ünïcode' WHERE id = ?", (ids[0],))
+    conn.execute("DELETE FROM tasks WHERE id = ?", (ids[1],))
+    conn.commit()
+    before = _digests(conn)
+    rebuild_digests(conn)
+    assert _digests(conn) == before
+    conn.close()
+
+    # the resident store is behind tenant_seq; a reload matches the digest
+    main.c_stores.close_all()
+    assert api.get("/health/consistency").json()["status"] == "ok"
+    assert {t["name"] for t in api.get("/tasks").json()} == {"renamed in a shell", "t2"}
+
+
+def test_a_check_repairs_only_what_the_store_lost(api, user):
+    ids = [api.post("/tasks", json={"name": f"t{i}", "deadline": FUTURE}).json()["id"] for i in range(3)]
+    with main.c_stores.use(user) as store:
+        seq = lib.tm_store_seq(store)
+        lib.tm_update_task(store, ids[0], b"stale", None, -1, None, None, -1, -1, -1, -1)
+        lib.tm_delete_task(store, ids[1])
+        lib.tm_snapshot_save(store, main._store_paths(user)[0], seq)     # same seq, different tasks
+
+    report = api.get("/health/consistency", params={"repair": False}).json()
+    assert report["status"] == "diverged"
+    assert (report["tasks"], report["store_tasks"]) == (3, 2)
+    assert sum(b["tasks"] - b["store_tasks"] for b in report["buckets"]) == 1
+    assert any(b["ids"][0] <= ids[0] <= b["ids"][1] for b in report["buckets"])
+
+    repaired = api.get("/health/consistency").json()
+    assert (repaired["status"], repaired["repaired"]) == ("repaired", 2)
+    assert api.get("/health/consistency").json()["status"] == "ok"
+    with main.c_stores.use(user) as store:
+        conn = main.db_conn()
+        assert main.c_store_digest(store)[:2] == main.db_user_digest(conn, user)
+        conn.close()
+
+
+def test_rebuild_drops_nothing_the_triggers_keep(api, user):
+    for n in NAMES:
+        api.post("/tasks", json={"name": n, "deadline": FUTURE})
+    conn = main.db_conn()
+    total = conn.execute(
+        "SELECT digest, tasks FROM task_digest WHERE user_id=? AND bucket=?", (user, DIGEST_TOTAL)
+    ).fetchone()
+    assert total["tasks"] == len(NAMES) and total["digest"] != 0
+    before = _digests(conn)
+    rebuild_digests(conn)
+    assert _digests(conn) == before
+    conn.close()
+
+
+def test_edits_anywhere_in_the_text_and_out_of_range_values_are_seen(api, user):
+    task_id = api.post("/tasks", json={"name": "Buy milk today", "deadline": FUTURE}).json()["id"]
+    with main.c_stores.use(user) as store:
+        seq = lib.tm_store_seq(store)
+        lib.tm_update_task(store, task_id, b"Buy silk today", None, -1, None, None, -1, -1, -1, -1)
+        lib.tm_snapshot_save(store, main._store_paths(user)[0], seq)
+    report = api.get("/health/consistency", params={"repair": False}).json()
+    assert report["status"] == "diverged"
+    assert api.get("/health/consistency").json()["status"] == "repaired"
+
+    conn = sqlite3.connect(main.DB_PATH)
+    conn.execute("UPDATE tasks SET status = 257 WHERE id = ?", (task_id,))     # the C byte would read 1
+    conn.commit()
+    conn.close()
+    main.c_stores.close_all()
+    assert api.get("/health/consistency", params={"repair": False}).json()["status"] == "diverged"
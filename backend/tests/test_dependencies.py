@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _add(api, name, duration=30, depends_on=0, **extra):
+    body = {"name": name, "deadline": FUTURE, "duration": duration, "depends_on_id": depends_on, **extra}
+    r = api.post("/tasks", json=body)
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def _minutes(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[3:])
+
+
+def test_cycles_are_refused_and_deletes_release_dependents(api):
+    a = _add(api, "a")
+    b = _add(api, "b", depends_on=a)
+    c = _add(api, "c", depends_on=b)
+
+    for task_id, dep in ((a, c), (a, a), (b, c)):
+        r = api.patch(f"/tasks/{task_id}", json={"depends_on_id": dep})
+        assert r.status_code == 409, (task_id, dep)
+    assert api.patch(f"/tasks/{a}", json={"depends_on_id": 10**9}).status_code == 400
+    assert api.patch(f"/tasks/{c}", json={"depends_on_id": a}).status_code == 200     # still acyclic
+
+    api.delete(f"/tasks/{a}")
+    deps = {t["id"]: t["depends_on_id"] for t in api.get("/tasks").json()}
+    assert deps == {b: 0, c: 0}
+    assert api.get("/health/consistency").json()["status"] == "ok"
+
+
+def test_dependency_mode_orders_a_chain_and_reports_the_critical_path(api):
+    a = _add(api, "pour foundation", duration=60, priority=3)
+    b = _add(api, "build walls", duration=45, depends_on=a, priority=1)
+    c = _add(api, "roof", duration=30, depends_on=b, priority=1)
+    loose = _add(api, "buy paint", duration=15, priority=5)
+
+    plan = api.get("/ghost-schedule", params={"date": FUTURE, "mode": "dependencies"}).json()
+    assert plan["critical_path_mins"] == 135
+    slots = {s["task_id"]: (_minutes(s["suggested_time"]), s["duration"]) for s in plan["suggestions"]}
+    assert set(slots) == {a, b, c, loose}
+    for before, after in ((a, b), (b, c)):
+        assert slots[before][0] + slots[before][1] <= slots[after][0]
+    assert all(8 * 60 <= start and start + dur <= 20 * 60 for start, dur in slots.values())
+
+    # a done prerequisite no longer holds its dependent back
+    api.patch(f"/tasks/{a}", json={"status": 1})
+    plan = api.get("/ghost-schedule", params={"date": FUTURE, "mode": "dependencies"}).json()
+    assert plan["critical_path_mins"] == 75
+    first = plan["suggestions"][0]
+    assert (first["task_id"], first["suggested_time"]) == (b, "08:00")
+
+    assert api.get("/ghost-schedule", params={"date": FUTURE, "mode": "nope"}).status_code == 400
+
+
+def test_a_refused_patch_leaves_the_row_alone_and_bad_values_are_400(api, user):
+    a = _add(api, "a")
+    b = _add(api, "b", depends_on=a)
+    r = api.patch(f"/tasks/{a}", json={"name": "renamed", "priority": 1, "depends_on_id": b})
+    assert r.status_code == 409
+    row = next(t for t in api.get("/tasks").json() if t["id"] == a)
+    assert (row["name"], row["depends_on_id"]) == ("a", 0)
+
+    assert api.post("/tasks", json={"name": "x", "deadline": FUTURE, "status": 300}).status_code == 400
+    assert api.post("/tasks", json={"name": "x", "deadline": FUTURE, "duration": 0}).status_code == 400
+    for body in ({"status": 7}, {"status": -1}, {"duration": 0}, {"duration": -5}):
+        assert api.patch(f"/tasks/{a}", json=body).status_code == 400, body
+    assert api.patch(f"/tasks/{a}", json={"status": 1, "duration": 90}).status_code == 200
+
+    other = {"X-User-Id": str(user + 400000)}
+    assert api.patch(f"/tasks/{a}", json={"name": "mine now"}, headers=other).status_code == 404
+    assert next(t for t in api.get("/tasks").json() if t["id"] == a)["name"] == "a"
+    assert api.get("/health/consistency").json()["status"] == "ok"
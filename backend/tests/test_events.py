@@ -0,0 +1,54 @@
+import asyncio
+import json
+from datetime import date, timedelta
+
+import main
+from event_hub import EventHub
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _frames(chunks):
+    return [dict(line.split(": ", 1) for line in c.strip().split("\n")) for c in chunks]
+
+
+def test_writes_reach_only_their_users_stream(api, user):
+    async def run():
+        mine, theirs = main.event_hub.subscribe(user), main.event_hub.subscribe(user + 500000)
+        stream = main.event_hub.stream(mine, keepalive=5)
+        assert await stream.__anext__() == "retry: 3000\n\n"
+
+        # sync endpoints publish from a worker thread
+        task_id = (await asyncio.to_thread(
+            api.post, "/tasks", json={"name": "streamed", "deadline": FUTURE}
+        )).json()["id"]
+        await asyncio.to_thread(api.delete, f"/tasks/{task_id}")
+
+        frames = _frames([await stream.__anext__(), await stream.__anext__()])
+        await stream.aclose()
+        assert theirs.queue.empty()
+        main.event_hub.unsubscribe(theirs)
+        return task_id, frames
+
+    task_id, (created, deleted) = asyncio.run(run())
+    assert created["event"] == deleted["event"] == "task"
+    first, second = json.loads(created["data"]), json.loads(deleted["data"])
+    assert (first["op"], first["id"], first["task"]["name"]) == ("upsert", task_id, "streamed")
+    assert (second["op"], second["id"], second["prev"]) == ("delete", task_id, first["version"])
+    assert int(deleted["id"]) == second["version"] > first["version"]
+
+
+def test_a_client_that_falls_behind_is_dropped():
+    hub = EventHub(buffer_size=2)
+
+    async def run():
+        slow, other = hub.subscribe(1), hub.subscribe(2)
+        for version in range(1, 4):
+            hub.publish({"version": version, "user_id": 1, "op": "upsert", "id": version})
+        await asyncio.sleep(0)     # let the loop deliver
+        chunks = [c async for c in hub.stream(slow)]
+        return chunks, other, hub.client_count
+
+    chunks, other, clients = asyncio.run(run())
+    assert chunks == ["retry: 3000\n\n", "event: dropped\ndata: {}\n\n"]
+    assert hub.dropped_total == 1 and clients == 1 and other.queue.empty()
@@ -0,0 +1,100 @@
+import json
+from datetime import date, timedelta
+
+import main
+from fastapi.testclient import TestClient
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _ndjson(*rows) -> bytes:
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode()
+
+
+def _import(api, body, fmt="ndjson"):
+    return api.post("/tasks/import", params={"format": fmt}, content=body).json()
+
+
+def _tasks(api):
+    return {t["name"]: t for t in api.get("/tasks").json()}
+
+
+def test_invalid_rows_are_skipped_and_reported(api):
+    body = _ndjson(
+        {"name": "ok", "deadline": FUTURE, "priority": 2},
+        {"name": "fraction", "deadline": FUTURE, "priority": 1.5},
+        {"name": "bool", "deadline": FUTURE, "priority": True},
+        {"name": "keep sentinel", "deadline": FUTURE, "priority": -1},
+        {"name": "too low", "deadline": FUTURE, "priority": 9},
+        {"name": "stressed", "deadline": FUTURE, "stress_level": 11},
+        {"name": "half done", "deadline": FUTURE, "status": 2},
+        {"deadline": FUTURE},
+        {"name": "past", "deadline": "2000-01-01"},
+    ) + b"not json\n[1, 2]\n"
+    report = _import(api, body)
+
+    assert (report["imported"], report["skipped"]) == (1, 10)
+    assert [e["record"] for e in report["errors"]] == list(range(2, 12))
+    errors = [e["error"] for e in report["errors"]]
+    assert errors[:4] == ["priority must be an integer"] * 2 + ["priority must be 1-5"] * 2
+    assert errors[4:7] == ["stress_level must be 1-10", "status must be 0 or 1", "name is required"]
+    assert errors[-2].startswith("invalid JSON") and errors[-1] == "expected a JSON object"
+    assert list(_tasks(api)) == ["ok"]
+
+
+def test_defaults_match_post_tasks(api):
+    report = _import(api, _ndjson({"name": "no deadline"}, {"name": "whole float", "priority": 4.0}))
+    assert report["imported"] == 2
+    tasks = _tasks(api)
+    assert tasks["no deadline"]["deadline"] == date.today().isoformat()
+    assert tasks["whole float"]["priority"] == 4
+
+    csv = f"name,priority,deadline\nfrom csv, 2 ,{FUTURE}\nbad,two,{FUTURE}\n".encode()
+    report = _import(api, csv, fmt="csv")
+    assert (report["imported"], report["errors"]) == (1, [{"record": 2, "error": "priority must be an integer"}])
+    assert _tasks(api)["from csv"]["priority"] == 2
+
+
+def test_line_separators_inside_json_strings_stay_in_the_name(api):
+    names = ["a\u2028b", "c\u0085d", "e\u2029f"]
+    report = _import(api, _ndjson(*({"name": n, "deadline": FUTURE} for n in names)))
+    assert (report["imported"], report["skipped"]) == (3, 0)
+    assert sorted(_tasks(api)) == sorted(names)
+
+
+def test_depends_on_ids_are_remapped_across_chunks(api, monkeypatch):
+    monkeypatch.setattr(main, "IMPORT_CHUNK_ROWS", 2)
+    rows = [
+        {"id": 10, "name": "first", "deadline": FUTURE},
+        {"id": 11, "name": "second", "deadline": FUTURE, "depends_on_id": 10},
+        {"id": 12, "name": "third", "deadline": FUTURE, "depends_on_id": 11},
+        {"id": 13, "name": "orphan", "deadline": FUTURE, "depends_on_id": 99},
+        {"id": 14, "name": "forward", "deadline": FUTURE, "depends_on_id": 15},
+        {"id": 15, "name": "last", "deadline": FUTURE, "depends_on_id": 10},
+    ]
+    body = (line.encode() + b"\n" for line in map(json.dumps, rows))     # streamed, a record at a time
+    report = _import(api, body)
+    assert (report["imported"], report["dependencies_dropped"]) == (6, 2)
+
+    tasks = _tasks(api)
+    assert tasks["second"]["depends_on_id"] == tasks["first"]["id"] != 10
+    assert tasks["third"]["depends_on_id"] == tasks["second"]["id"]
+    assert tasks["last"]["depends_on_id"] == tasks["first"]["id"]
+    assert tasks["orphan"]["depends_on_id"] == tasks["forward"]["depends_on_id"] == 0
+    assert api.get("/health/consistency").json()["status"] == "ok"
+
+
+def test_export_imports_back_as_the_same_tasks(api, user):
+    a = api.post("/tasks", json={"name": "línea dos", "deadline": FUTURE, "priority": 1}).json()["id"]
+    api.post("/tasks", json={"name": "then", "deadline": FUTURE, "start_time": "10:00", "depends_on_id": a})
+
+    def shape(client):
+        tasks = _tasks(client)
+        ids = {t["id"]: name for name, t in tasks.items()}
+        return {n: {**t, "id": None, "depends_on_id": ids.get(t["depends_on_id"])} for n, t in tasks.items()}
+
+    for offset, fmt in enumerate(("ndjson", "csv"), start=1):
+        exported = api.get("/tasks/export", params={"format": fmt}).content
+        other = TestClient(main.app, headers={"X-User-Id": str(user + 100000 * offset)})
+        assert _import(other, exported, fmt)["imported"] == 2
+        assert shape(other) == shape(api)
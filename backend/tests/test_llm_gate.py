@@ -0,0 +1,91 @@
+import threading
+import time
+
+from ai_assistant import LLMGate
+
+
+def _hold(gate):
+    """Take a slot on another thread until the returned event is set."""
+    entered, release = threading.Event(), threading.Event()
+    result = {}
+
+    def run():
+        with gate.slot() as admitted:
+            result["admitted"] = admitted
+            entered.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    entered.wait(5)
+    return release, thread, result
+
+
+def _hold_when_queued(gate):
+    # like _hold, for a caller that has to queue: returns before it is admitted
+    release, result = threading.Event(), {}
+
+    def run():
+        with gate.slot() as admitted:
+            result["admitted"] = admitted
+            release.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return release, thread, result
+
+
+def _wait_for(cond):
+    deadline = time.monotonic() + 5
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_a_full_queue_sheds_and_a_waiter_gets_the_freed_slot():
+    gate = LLMGate(max_concurrent=1, max_queue=1, wait_budget=5)
+    release_a, a, _ = _hold(gate)
+    release_b, b, waiter = _hold_when_queued(gate)
+    _wait_for(lambda: gate.stats()["queue_depth"] == 1)
+
+    with gate.slot() as admitted:
+        assert admitted is False
+    assert gate.stats()["shed"]["queue_full"] == 1
+
+    release_a.set()
+    _wait_for(lambda: "admitted" in waiter)
+    release_b.set()
+    a.join(5)
+    b.join(5)
+    stats = gate.stats()
+    assert waiter["admitted"] is True
+    assert (stats["admitted"], stats["running"], stats["queue_depth"], stats["shed_total"]) == (2, 0, 0, 1)
+
+
+def test_over_budget_and_timed_out_waits_are_shed():
+    gate = LLMGate(max_concurrent=1, max_queue=4, wait_budget=0.05)
+    with gate.slot() as admitted:      # teaches the gate a generation takes ~0.1s
+        assert admitted
+        time.sleep(0.1)
+    release, thread, _ = _hold(gate)
+    with gate.slot() as admitted:      # 0.1s expected > 0.05s budget: shed without waiting
+        assert admitted is False
+    assert gate.stats()["shed"]["over_budget"] == 1
+    release.set()
+    thread.join(5)
+
+    gate = LLMGate(max_concurrent=1, max_queue=4, wait_budget=0.05)   # no timing yet: it waits
+    release, thread, _ = _hold(gate)
+    started = time.monotonic()
+    with gate.slot() as admitted:
+        assert admitted is False
+    assert time.monotonic() - started >= 0.05
+    release.set()
+    thread.join(5)
+
+    assert gate.stats()["shed"] == {"queue_full": 0, "over_budget": 0, "timed_out": 1}
+
+
+def test_chat_metrics(api):
+    stats = api.get("/chat/metrics").json()
+    assert {"running", "queue_depth", "max_concurrent", "admitted", "shed", "shed_total"} <= set(stats)
+    assert stats["shed_total"] == sum(stats["shed"].values())
@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+
+import pytest
+
+from nl_parser import parse_command
+from recurrence import expand, find_rule, normalize_rule, occurrences
+
+
+@pytest.mark.parametrize(
+    "text, name, rule",
+    [
+        ("gym every mon/wed/fri 7am", "gym", "weekly:0,2,4"),
+        ("yoga each friday 6pm", "yoga", "weekly:4"),
+        ("review on mondays", "review", "weekly:0"),
+        ("water plants every 3 days", "water plants", "every:3"),
+        ("run every day at 6:30", "run", "daily"),
+        ("chores on weekends", "chores", "weekly:5,6"),
+        ("stretch daily", "stretch", "daily"),
+        ("meditate daily 7am 20m", "meditate", "daily"),
+        ("standup weekdays 9am", "standup", "weekly:0,1,2,3,4"),
+    ],
+)
+def test_recurrence_phrases(text, name, rule):
+    parsed = parse_command(text)
+    assert parsed["valid"], parsed
+    assert parsed["name"] == name
+    assert parsed["recurrence"] == rule
+
+
+@pytest.mark.parametrize(
+    "text, name",
+    [
+        ("Submit weekly report tomorrow", "Submit weekly report"),
+        ("Review daily sales numbers friday", "Review daily sales numbers"),
+        ("Read about weekends in Paris", "Read about weekends in Paris"),
+        ("Plan weekdays schedule", "Plan weekdays schedule"),
+    ],
+)
+def test_adjectives_inside_a_name_stay_one_off(text, name):
+    parsed = parse_command(text)
+    assert parsed["recurrence"] == ""
+    assert parsed["name"] == name
+
+
+def test_one_off_keeps_its_date():
+    parsed = parse_command("Submit weekly report tomorrow")
+    assert parsed["deadline"] == (date.today() + timedelta(days=1)).isoformat()
+
+
+def test_bare_weekly_repeats_on_the_start_weekday():
+    rule, _ = find_rule("call mom weekly")
+    assert normalize_rule(rule, date(2025, 3, 5)) == "weekly:2"
+    with pytest.raises(ValueError):
+        normalize_rule("fortnightly", date(2025, 3, 5))
+
+
+def test_occurrences_only_cover_the_window():
+    start = date(2025, 1, 1)
+    got = list(occurrences("every:3", start, date(2025, 3, 1), date(2025, 3, 10)))
+    assert got == [date(2025, 3, 2), date(2025, 3, 5), date(2025, 3, 8)]
+    assert list(occurrences("weekly:0,4", start, date(2025, 3, 3), date(2025, 3, 9))) == [
+        date(2025, 3, 3), date(2025, 3, 7)
+    ]
+    assert list(occurrences("daily", start, date(2025, 3, 1), date(2025, 3, 3), until=date(2025, 3, 2))) == [
+        date(2025, 3, 1), date(2025, 3, 2)
+    ]
+
+
+def test_expand_skips_exceptions():
+    series = [{
+        "id": 7, "name": "gym", "category": "personal", "priority": 2, "start_time": "07:00", "duration": 45,
+        "stress_level": 5, "rule": "daily", "start_date": "2025-03-01", "until_date": "",
+    }]
+    rows = list(expand(series, date(2025, 3, 1), date(2025, 3, 3), taken={(7, "2025-03-02")}))
+    assert [r["occurrence"] for r in rows] == ["2025-03-01", "2025-03-03"]
+    assert rows[0]["id"] is None and rows[0]["series_id"] == 7
+
+
+def test_series_occurrences_are_listed_and_materialised_on_edit(api):
+    first = date.today() + timedelta(days=1)
+    sid = api.post("/series", json={"name": "gym", "rule": "daily", "start_date": first.isoformat()}).json()["id"]
+    window = {"from": first.isoformat(), "to": (first + timedelta(days=6)).isoformat()}
+
+    rows = api.get("/tasks", params=window).json()
+    assert [r["occurrence"] for r in rows if r["series_id"] == sid] == [
+        (first + timedelta(days=i)).isoformat() for i in range(7)
+    ]
+    assert all(r["id"] is None for r in rows)
+
+    day = (first + timedelta(days=2)).isoformat()
+    assert api.patch(f"/series/{sid}/occurrences/{day}", json={"status": 1}).status_code == 200
+    rows = api.get("/tasks", params=window).json()
+    done = [r for r in rows if r["occurrence"] == day]
+    assert len(done) == 1 and done[0]["id"] is not None and done[0]["status"] == 1
+    assert len([r for r in rows if r["series_id"] == sid]) == 7
+
+
+def test_command_creates_a_series_not_a_task(api):
+    api.post("/command", json={"text": "stretch daily"})
+    assert api.get("/series").json()[0]["rule"] == "daily"
+    assert api.get("/tasks").json() == []
+    api.post("/command", json={"text": "Submit weekly report tomorrow"})
+    tasks = api.get("/tasks").json()
+    assert [t["name"] for t in tasks] == ["Submit weekly report"]
+    assert len(api.get("/series").json()) == 1
@@ -0,0 +1,42 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import fast_response
+from fast_response import FastJSONResponse
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+MSGPACK = {"Accept": "application/x-msgpack"}
+
+
+def test_every_shape_and_encoding_carries_the_same_rows(api):
+    msgpack = pytest.importorskip("msgpack")    # optional, like orjson
+    for name in ("naïve ✓", "second"):
+        api.post("/tasks", json={"name": name, "deadline": FUTURE, "start_time": "10:00"})
+    rows = api.get("/tasks").json()
+    assert [r["name"] for r in rows] == ["naïve ✓", "second"]
+
+    columns = api.get("/tasks", params={"shape": "columns"}).json()
+    assert [dict(zip(columns["columns"], r)) for r in columns["rows"]] == rows
+
+    packed = api.get("/tasks", headers=MSGPACK)
+    assert packed.headers["content-type"] == "application/x-msgpack"
+    assert "Accept" in packed.headers["vary"] and packed.headers["etag"]
+    assert msgpack.unpackb(packed.content) == rows
+    packed = api.get("/tasks", params={"shape": "columns"}, headers=MSGPACK)
+    assert msgpack.unpackb(packed.content) == columns
+
+    window = {"from": FUTURE, "to": FUTURE, "shape": "columns"}
+    windowed = msgpack.unpackb(api.get("/tasks", params=window, headers=MSGPACK).content)
+    assert [r[windowed["columns"].index("name")] for r in windowed["rows"]] == ["naïve ✓", "second"]
+
+    assert api.get("/tasks", params={"shape": "table"}).status_code == 400
+
+
+def test_json_module_fallback_matches_orjson(monkeypatch):
+    content = {"name": "naïve ✓", "ids": [1, 2], "none": None, "ratio": 0.5}
+    fast = FastJSONResponse(content).body
+    monkeypatch.setattr(fast_response, "orjson", None)
+    slow = FastJSONResponse(content).body
+    assert fast == slow and json.loads(slow) == content
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+import main
+from ai_assistant import PatternMatcher
+from fastapi.testclient import TestClient
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _search(api, q, **params):
+    return api.get("/tasks/search", params={"q": q, **params}).json()
+
+
+def _names(page):
+    return [t["name"] for t in page["results"]]
+
+
+def test_open_tasks_then_name_hits_then_priority(api, user):
+    def add(name, category="general", priority=3, status=0):
+        return api.post("/tasks", json={"name": name, "category": category, "priority": priority,
+                                        "deadline": FUTURE, "status": status}).json()["id"]
+
+    add("Gym session", priority=4)
+    add("gymnastics class", priority=2)
+    add("Call mum", category="gym")                 # category hit only
+    add("gym bag packed", priority=1, status=1)     # done: last
+    add("Café visit")
+    TestClient(main.app, headers={"X-User-Id": str(user + 300000)}).post(
+        "/tasks", json={"name": "gym for someone else", "deadline": FUTURE}
+    )
+
+    assert _names(_search(api, "gym")) == ["gymnastics class", "Gym session", "Call mum", "gym bag packed"]
+    assert _names(_search(api, "cafe")) == ["Café visit"]          # diacritics folded
+    assert _names(_search(api, "gym sess")) == ["Gym session"]     # every word, as a prefix
+    assert _search(api, 'gym" OR "*')["results"] == _search(api, "gym OR")["results"] == []
+
+    first = _search(api, "gym", limit=3)
+    rest = _search(api, "gym", limit=3, offset=first["next_offset"])
+    assert (first["next_offset"], rest["next_offset"]) == (3, None)
+    assert _names(first) + _names(rest) == _names(_search(api, "gym"))
+
+
+def test_renames_and_deletes_reindex(api):
+    task_id = api.post("/tasks", json={"name": "dentist", "deadline": FUTURE}).json()["id"]
+    api.patch(f"/tasks/{task_id}", json={"name": "orthodontist"})
+    assert _names(_search(api, "dentist")) == []
+    assert _names(_search(api, "ortho")) == ["orthodontist"]
+    api.delete(f"/tasks/{task_id}")
+    assert _search(api, "ortho")["results"] == []
+
+
+def test_only_task_phrasings_become_a_search():
+    assert PatternMatcher.match("find my gym tasks")[1]["groups"] == ("gym",)
+    assert PatternMatcher.match("show my gym tasks")[1]["groups"] == ("gym",)
+    assert PatternMatcher.match("search for client report")[1]["groups"] == ("client report",)
+    assert PatternMatcher.match("find tasks about client report")[1]["groups"] == ("client report",)
+    assert PatternMatcher.match("find my tasks") == ("list_tasks", {"groups": (), "text": "find my tasks"})
+    for text in ("find me a free slot", "find time for gym", "find a slot for gym tasks"):
+        assert PatternMatcher.match(text)[0] is None, text
+
+
+def test_chat_answers_a_search_from_the_index(api):
+    api.post("/tasks", json={"name": "gym session", "deadline": FUTURE})
+    api.post("/tasks", json={"name": "tax return", "deadline": FUTURE})
+    reply = api.post("/chat", json={"message": "find my gym tasks"}).json()
+    assert "gym session" in reply["response"] and "tax return" not in reply["response"]
+    reply = api.post("/chat", json={"message": "show my yoga tasks"}).json()
+    assert reply["response"] == "I couldn't find any tasks matching 'yoga'."
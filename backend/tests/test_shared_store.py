@@ -0,0 +1,132 @@
+import ctypes
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import date, timedelta
+
+import pytest
+
+import main
+from main import lib
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="POSIX shared memory under /dev/shm")
+
+
+@pytest.fixture
+def shm_name(request):
+    name = f"optitask-test-{os.getpid()}-{request.node.name}"[:60]
+    yield name.encode()
+    if os.path.exists(f"/dev/shm/{name}"):
+        os.remove(f"/dev/shm/{name}")
+
+
+def _open(name, max_tasks=16):
+    created = ctypes.c_int(-1)
+    store = lib.tm_store_open_shared(name, max_tasks, ctypes.byref(created))
+    assert store
+    return store, created.value
+
+
+def _add(store, name):
+    return lib.tm_add_task(store, name, b"work", 3, b"2030-01-02", b"", 30, 0, 0, 5)
+
+
+def _ids(store):
+    out = (ctypes.c_int * 64)()
+    return sorted(out[: lib.tm_sorted_ids(store, out, 64)])
+
+
+def test_two_handles_share_tasks_and_ids(shm_name):
+    a, a_created = _open(shm_name, max_tasks=4)
+    b, b_created = _open(shm_name, max_tasks=4)
+    assert (a_created, b_created) == (1, 0)
+
+    ids = [_add(a, b"from a"), _add(b, b"from b"), _add(a, b"from a again")]
+    assert len(set(ids)) == 3
+    assert _ids(a) == _ids(b) == sorted(ids)
+    assert lib.tm_update_task(b, ids[0], b"renamed by b", None, 1, None, None, -1, -1, -1, -1) == 1
+    assert lib.tm_delete_task(a, ids[1]) == 1
+    assert main.c_store_digest(a) == main.c_store_digest(b)
+
+    # sized once, by whoever created it
+    assert _add(b, b"fourth") > 0 and _add(a, b"fifth") > 0 and _add(b, b"sixth") == -1
+    lib.tm_store_free(a)
+    assert lib.tm_count(b) == 4     # freeing a handle only unmaps it
+    lib.tm_store_free(b)
+
+
+def test_a_rename_that_does_not_fit_is_refused(shm_name):
+    store, _ = _open(shm_name, max_tasks=4)     # one page of names
+    first, second = _add(store, b"short"), _add(store, b"other")
+    seq, digest = lib.tm_store_seq(store), main.c_store_digest(store)
+
+    long = b"x" * 5000
+    assert lib.tm_update_task(store, first, long, None, 1, None, None, -1, -1, -1, -1) == -4
+    assert lib.tm_update_task(store, first, None, long, 1, None, None, -1, -1, -1, -1) == -4
+    assert lib.tm_update_task(store, first, long, None, -1, None, None, -1, -1, second, -1) == -4
+    assert (lib.tm_store_seq(store), main.c_store_digest(store)) == (seq, digest)
+
+    assert lib.tm_update_task(store, first, b"fits", None, -1, None, None, -1, -1, -1, -1) == 1
+    lib.tm_store_free(store)
+
+
+def test_the_last_handle_out_removes_the_segment(shm_name):
+    path = f"/dev/shm/{shm_name.decode()}"
+    a, _ = _open(shm_name)
+    b, _ = _open(shm_name)
+    _add(a, b"kept while b is open")
+    lib.tm_store_free(a)
+    assert os.path.exists(path) and lib.tm_count(b) == 1
+    lib.tm_store_free(b)
+    assert not os.path.exists(path)
+
+    c, created = _open(shm_name)
+    assert (created, lib.tm_count(c)) == (1, 0)
+    lib.tm_store_free(c)
+    assert not os.path.exists(path)
+
+
+def test_another_process_sees_the_same_store(shm_name):
+    store, _ = _open(shm_name)
+    _add(store, b"parent")
+    child = textwrap.dedent(f"""
+        import ctypes
+        lib = ctypes.CDLL({os.environ["OPTITASK_C_CORE"]!r})
+        lib.tm_store_open_shared.restype = ctypes.c_void_p
+        lib.tm_store_open_shared.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int)]
+        lib.tm_add_task.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        lib.tm_count.argtypes = [ctypes.c_void_p]
+        created = ctypes.c_int(-1)
+        s = lib.tm_store_open_shared({shm_name!r}, 16, ctypes.byref(created))
+        print(created.value, lib.tm_count(s), lib.tm_add_task(s, b"child", b"home", 2, b"", b"", 15, 0, 0, 3))
+    """)
+    out = subprocess.run([sys.executable, "-c", child], capture_output=True, text=True, timeout=60, check=True)
+    created, seen, child_id = map(int, out.stdout.split())
+    assert (created, seen) == (0, 1)
+    assert child_id in _ids(store) and lib.tm_count(store) == 2
+    lib.tm_store_free(store)
+
+
+def test_workers_in_shared_mode_attach_to_one_store(api, user, monkeypatch):
+    monkeypatch.setattr(main, "C_STORE_SHARED", True)
+    segment = f"/dev/shm/{main._shm_name(user).decode()}"
+    try:
+        api.post("/tasks", json={"name": "first", "deadline": FUTURE})
+        second_worker = main.open_c_store(user)     # attaches instead of loading
+        api.post("/tasks", json={"name": "second", "deadline": FUTURE})
+        with main.c_stores.use(user) as store:
+            assert main.c_store_digest(second_worker) == main.c_store_digest(store)
+            assert main.c_store_digest(store)[1] == 2
+        lib.tm_store_free(second_worker)
+        assert api.get("/health/consistency").json()["status"] == "ok"
+        main.c_stores.close_all()       # eviction: the last handle, so the memory goes back
+        assert not os.path.exists(segment)
+        assert [t["name"] for t in api.get("/tasks").json()] == ["first", "second"]
+    finally:
+        main.c_stores.close_all()
+        if os.path.exists(segment):
+            os.remove(segment)
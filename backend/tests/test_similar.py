@@ -0,0 +1,63 @@
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+
+import main
+from task_index import TaskIndex, embed
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+def _similar(api, **params):
+    return api.get("/tasks/similar", params=params)
+
+
+def test_embeddings_are_unit_length_and_close_for_shared_words():
+    vecs = embed(["gym session", "gym", "gymnastics", "tax return", ""], 128)
+    assert np.allclose(np.linalg.norm(vecs[:4], axis=1), 1.0) and not vecs[4].any()
+    cos = vecs @ vecs.T
+    assert cos[0, 1] > cos[0, 3] and cos[1, 2] > cos[1, 3]
+
+
+def test_nearest_names_first_and_the_index_follows_writes(api):
+    ids = {n: api.post("/tasks", json={"name": n, "deadline": FUTURE}).json()["id"]
+           for n in ("gym session", "morning gym", "tax return", "file taxes", "call mum")}
+
+    hits = _similar(api, q="gym", k=2).json()["results"]
+    assert {h["name"] for h in hits} == {"gym session", "morning gym"}
+    assert hits[0]["score"] >= hits[1]["score"] > 0
+
+    by_task = _similar(api, task_id=ids["tax return"], k=1).json()["results"]
+    assert [h["name"] for h in by_task] == ["file taxes"]          # itself left out
+
+    api.patch(f"/tasks/{ids['morning gym']}", json={"status": 1})
+    active = [h["name"] for h in _similar(api, q="gym", k=5, active_only=True).json()["results"]]
+    assert active[0] == "gym session" and "morning gym" not in active
+    api.patch(f"/tasks/{ids['call mum']}", json={"name": "gym with mum"})
+    api.delete(f"/tasks/{ids['gym session']}")
+    names = [h["name"] for h in _similar(api, q="gym", k=5).json()["results"]]
+    assert "gym with mum" in names and "gym session" not in names
+
+    assert _similar(api, task_id=10**9).status_code == 404
+    assert _similar(api, q="  ").status_code == 400
+
+
+def test_an_out_of_band_write_rebuilds_the_index(api, user):
+    api.post("/tasks", json={"name": "gym session", "deadline": FUTURE})
+    assert _similar(api, q="gym").json()["results"]
+    conn = sqlite3.connect(main.DB_PATH)
+    conn.execute("UPDATE tasks SET name = 'dentist' WHERE user_id = ?", (user,))
+    conn.commit()
+    conn.close()
+    assert [h["name"] for h in _similar(api, q="dentist").json()["results"]] == ["dentist"]
+
+
+def test_top_k_on_an_index_built_from_rows():
+    index = TaskIndex(lambda user_id: (5, [(1, "write report", 0), (2, "report review", 1), (3, "buy milk", 0)]))
+    index.load_user(7)
+    assert index.seq(7) == 5
+    ranked = index.top_k(7, ["report", "milk"], k=2)
+    assert {i for i, _ in ranked[0]} == {1, 2} and ranked[1][0][0] == 3
+    assert [i for i, _ in index.top_k(7, ["report"], k=3, active_only=True, exclude=[1])[0]] == [3]
+    assert index.top_k(8, ["report"]) == [[]]
@@ -0,0 +1,105 @@
+import threading
+from datetime import date, timedelta
+
+import main
+from fastapi.testclient import TestClient
+from store_pool import StorePool
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+
+
+class _Stores:
+    """open/close/size stand-ins recording what the pool did."""
+
+    def __init__(self, size=100):
+        self.size = size
+        self.opened, self.closed = [], []
+
+    def open(self, key):
+        self.opened.append(key)
+        return {"key": key}
+
+    def close(self, key, handle):
+        assert handle["key"] == key
+        self.closed.append(key)
+
+
+def _pool(stores, max_bytes):
+    return StorePool(stores.open, stores.close, lambda handle: stores.size, max_bytes)
+
+
+def test_least_recently_used_stores_are_evicted_past_the_cap():
+    stores = _Stores()
+    pool = _pool(stores, max_bytes=250)
+    for key in ("a", "b"):
+        with pool.use(key):
+            pass
+    with pool.use("a"):             # "b" is now the oldest
+        pass
+    with pool.use("c"):
+        pass
+    assert stores.closed == ["b"]
+    assert pool.stats() == {"stores": 2, "bytes": 200, "evictions": 1}
+
+    with pool.use("b"):             # reopened; "a" is the oldest now
+        pass
+    assert stores.opened == ["a", "b", "c", "b"] and stores.closed == ["b", "a"]
+
+
+def test_a_pinned_store_is_never_evicted():
+    stores = _Stores()
+    pool = _pool(stores, max_bytes=150)
+    with pool.use("a"):             # sized when released
+        pass
+    with pool.use("a") as a:
+        with pool.use("b"):
+            pass
+        assert stores.closed == ["b"]     # "a" is older but in use: "b" goes instead
+        assert a == {"key": "a"}
+    with pool.use("c"):
+        pass
+    assert stores.closed == ["b", "a"]
+
+
+def test_concurrent_first_requests_open_a_store_once():
+    stores = _Stores()
+    gate = threading.Event()
+    opening = stores.open
+
+    def slow_open(key):
+        gate.wait(5)
+        return opening(key)
+
+    pool = StorePool(slow_open, stores.close, lambda handle: stores.size, 10_000)
+    seen = []
+
+    def request():
+        with pool.use("a") as handle:
+            seen.append(handle)
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert stores.opened == ["a"] and len(seen) == 4 and all(h is seen[0] for h in seen)
+
+
+def test_users_only_see_and_touch_their_own_tasks(api, user):
+    other = TestClient(main.app, headers={"X-User-Id": str(user + 600000)})
+    api.post("/tasks", json={"name": "mine", "deadline": FUTURE})
+    theirs = other.post("/tasks", json={"name": "theirs", "deadline": FUTURE}).json()["id"]
+
+    assert [t["name"] for t in api.get("/tasks").json()] == ["mine"]
+    assert api.patch(f"/tasks/{theirs}", json={"name": "hijacked"}).status_code == 404
+    assert api.delete(f"/tasks/{theirs}").status_code == 404
+    bad = api.post("/tasks", json={"name": "x", "deadline": FUTURE, "depends_on_id": theirs})
+    assert bad.status_code == 400
+    assert [t["name"] for t in other.get("/tasks").json()] == ["theirs"]
+
+    # each user has their own C store, in step with their own rows
+    for client, uid in ((api, user), (other, user + 600000)):
+        with main.c_stores.use(uid) as store:
+            assert main.c_store_digest(store)[1] == 1
+        assert client.get("/health/consistency").json()["status"] == "ok"
@@ -0,0 +1,102 @@
+from datetime import date, timedelta
+
+import main
+from fastapi.testclient import TestClient
+from ml_suggester import MLSuggester
+
+FUTURE = (date.today() + timedelta(days=3)).isoformat()
+GUITAR = ["guitar practice", "guitar scales", "practice guitar chords", "restring the guitar", "guitar lesson prep"]
+
+
+class _Rows:
+    """load_rows stand-in: per-user (seq, rows), counting the loads."""
+
+    def __init__(self):
+        self.users = {}
+        self.loads = 0
+
+    def __call__(self, user_id):
+        self.loads += 1
+        return self.users.get(user_id, (0, []))
+
+
+def _row(task_id, name, category="music", priority=2):
+    return (task_id, name, category, priority, FUTURE, "")
+
+
+def test_keywords_without_history(tmp_path):
+    rows = _Rows()
+    suggester = MLSuggester(rows, str(tmp_path))
+    s = suggester.get_smart_suggestions("pay the electricity bill", user_id=1)
+    assert s["suggested_category"] == "finance"
+    assert s["explanation"].startswith("Auto-suggested from keywords")
+    assert suggester.suggest_priority("urgent: server is down", user_id=1)[0] == 1
+    assert suggester.suggest_category("zzz qqq", user_id=1)[0] == "general"
+    assert suggester.suggest_priority("zzz qqq", user_id=1)[0] == 3
+    assert rows.loads == 0 and suggester.stats()["users"] == 0
+
+
+def test_each_user_learns_from_their_own_tasks(api, user):
+    other = TestClient(main.app, headers={"X-User-Id": str(user + 200000)})
+    ids = [api.post("/tasks", json={"name": n, "category": "music", "deadline": FUTURE}).json()["id"] for n in GUITAR]
+    assert not main.ml_suggester.is_loaded(user)     # writes don't load a model
+
+    mine = api.get("/tasks/suggest", params={"text": "guitar"}).json()
+    assert mine["suggested_category"] == "music"
+    assert mine["explanation"].startswith(f"Learned from {len(GUITAR)} of your tasks")
+    theirs = other.get("/tasks/suggest", params={"text": "guitar"}).json()
+    assert theirs["suggested_category"] != "music"
+    assert theirs["explanation"].startswith("Auto-suggested from keywords")
+
+    # kept current by the write paths, without a retrain
+    trained = main.ml_suggester.stats()["trained"]
+    for task_id in ids:
+        api.patch(f"/tasks/{task_id}", json={"category": "hobby"})
+    items = [{"text": "guitar"}, {"text": "bill invoice tax payment"}]
+    results = api.post("/tasks/suggest", json={"items": items}).json()["results"]
+    assert [r["suggested_category"] for r in results] == ["hobby", "finance"]
+    for task_id in ids:
+        api.delete(f"/tasks/{task_id}")
+    s = api.get("/tasks/suggest", params={"text": "guitar"}).json()
+    assert s["explanation"].startswith("Auto-suggested from keywords")
+    assert main.ml_suggester.stats()["trained"] == trained
+
+
+def test_saved_every_n_updates_and_reloaded_without_training(tmp_path):
+    rows = _Rows()
+    suggester = MLSuggester(rows, str(tmp_path), save_every=3)
+    assert suggester.load_user(1, 0) is True
+    for i, name in enumerate(GUITAR[:3], start=1):
+        suggester.apply(1, "upsert", i, dict(zip(("id", "name", "category", "priority", "deadline", "start_time"),
+                                                 _row(i, name))), seq=i)
+
+    # a new process (after a crash: no save_all) reads the third update's save
+    restarted = MLSuggester(rows, str(tmp_path))
+    assert restarted.load_user(1, 3) is False
+    assert rows.loads == 1
+    assert restarted.suggest_category("guitar", user_id=1) == suggester.suggest_category("guitar", user_id=1)
+    assert restarted.suggest_category("guitar", user_id=1)[0] == "music"
+
+    # behind SQLite: trained again from the rows
+    rows.users[1] = (4, [_row(i, n) for i, n in enumerate(GUITAR, start=1)])
+    assert restarted.load_user(1, 4) is True
+    assert restarted.get_smart_suggestions("guitar", user_id=1)["explanation"].startswith("Learned from 5")
+
+
+def test_models_are_lru_evicted_and_saved(tmp_path):
+    rows = _Rows()
+    for u in (1, 2, 3):
+        rows.users[u] = (10, [_row(i, n) for i, n in enumerate(GUITAR, start=1)])
+    suggester = MLSuggester(rows, str(tmp_path), max_bytes=1, save_every=1000)
+    suggester.load_user(1, 10)
+    suggester.add_rows(1, [_row(9, "bass guitar", "bass")], seq=11)    # unsaved when evicted
+
+    suggester.load_user(2, 10)
+    suggester.suggest(3, [("guitar", "", "")])           # not resident: the prior, and no load
+    assert not suggester.is_loaded(1) and suggester.is_loaded(2) and not suggester.is_loaded(3)
+    assert suggester.stats()["evictions"] == 1
+
+    loads = rows.loads
+    assert suggester.load_user(1, 11) is False and rows.loads == loads
+    assert suggester.get_smart_suggestions("bass", user_id=1)["explanation"].startswith("Learned from 6")
+    assert suggester.stats()["users"] == 1 and not suggester.is_loaded(2)
@@ -0,0 +1,81 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import main
+from migrate_db import TIME_BACKFILL, backfill_time_columns
+
+EPOCH = date(1970, 1, 1)
+VALUES = [("2030-01-02", "09:30"), ("", ""), ("2024-02-29", "23:59"), ("02/03/2030", "9:30"), ("2030-13-45", "24:00")]
+
+
+def _legacy_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE tasks (id INTEGER PRIMARY KEY, user_id INTEGER, status INTEGER, priority INTEGER, "
+        "deadline TEXT, start_time TEXT, deadline_day INTEGER, start_min INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO tasks (id, user_id, status, priority, deadline, start_time) VALUES (?, 1, 0, 3, ?, ?)",
+        [(i, *VALUES[i % len(VALUES)]) for i in range(1, rows + 1)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _expected(deadline, start_time):
+    try:
+        day = (date.fromisoformat(deadline) - EPOCH).days
+    except ValueError:
+        day = -1
+    ok = len(start_time) == 5 and start_time[2] == ":" and int(start_time[:2]) < 24
+    return day, int(start_time[:2]) * 60 + int(start_time[3:]) if ok else -1
+
+
+class _Stop(Exception):
+    pass
+
+
+def test_backfill_resumes_where_it_stopped(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    _legacy_db(path, 25)
+
+    def crash(msg):
+        raise _Stop(msg)
+
+    with pytest.raises(_Stop):
+        backfill_time_columns(path, batch=10, pause=0, log=crash)   # dies after the first batch
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT last_id, done FROM migrations WHERE name=?", (TIME_BACKFILL,)).fetchone() == (10, 0)
+    assert conn.execute("SELECT COUNT(*) FROM tasks WHERE deadline_day IS NULL").fetchone()[0] == 15
+
+    assert backfill_time_columns(path, batch=10, pause=0) == 15
+    assert conn.execute("SELECT done FROM migrations WHERE name=?", (TIME_BACKFILL,)).fetchone() == (1,)
+    rows = conn.execute("SELECT deadline, start_time, deadline_day, start_min FROM tasks").fetchall()
+    for deadline, start_time, day, minute in rows:
+        assert (day, minute) == _expected(deadline, start_time), (deadline, start_time)
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {"idx_tasks_user_time", "idx_tasks_day"} <= indexes
+    conn.close()
+    assert backfill_time_columns(path, batch=10, pause=0) == 0
+
+
+@pytest.mark.parametrize("ready", [True, False])
+def test_windowed_lists_use_the_day_numbers(api, user, ready, monkeypatch):
+    base = date.today() + timedelta(days=10 + 40 * ready)
+    days = [base + timedelta(days=d) for d in (0, 1, 2, 5)]
+    ids = [api.post("/tasks", json={"name": f"d{i}", "deadline": d.isoformat(), "start_time": "10:00"}).json()["id"]
+           for i, d in enumerate(days)]
+    api.patch(f"/tasks/{ids[3]}", json={"deadline": days[1].isoformat(), "start_time": "08:15"})
+
+    conn = main.db_conn()
+    row = conn.execute("SELECT deadline_day, start_min FROM tasks WHERE id=?", (ids[3],)).fetchone()
+    conn.close()
+    assert tuple(row) == ((days[1] - EPOCH).days, 8 * 60 + 15)     # kept by the triggers
+
+    if not ready:   # still backfilling: compare the TEXT columns instead
+        monkeypatch.setattr(main, "time_columns_ready", type(main.time_columns_ready)())
+    rows = api.get("/tasks", params={"from": days[1].isoformat(), "to": days[2].isoformat()}).json()
+    assert [r["name"] for r in rows] == ["d3", "d1", "d2"]
+    assert api.get("/tasks", params={"from": days[2].isoformat(), "to": days[0].isoformat()}).status_code == 400
@@ -31,6 +31,23 @@ function minsToHHMM(m) {
   return `${pad2(hh)}:${pad2(mm)}`;
 }
 
+// Same order as GET /tasks: status, priority, deadline, start_time
+function compareTasks(a, b) {
+  return (
+    a.status - b.status ||
+    a.priority - b.priority ||
+    (a.deadline || "").localeCompare(b.deadline || "") ||
+    (a.start_time || "").localeCompare(b.start_time || "")
+  );
+}
+
+function mergeTasks(prev, upserted, deleted) {
+  const gone = new Set(deleted);
+  const byId = new Map(upserted.map((t) => [t.id, t]));
+  const next = prev.filter((t) => !gone.has(t.id) && !byId.has(t.id));
+  return next.concat(upserted).sort(compareTasks);
+}
+
 export default function App() {
   // Layout
   const [sidebarOpen, setSidebarOpen] = useState(true);
@@ -53,6 +70,7 @@ export default function App() {
 
   // Ghost scheduling
   const [ghosts, setGhosts] = useState([]);
+  const [occurrences, setOccurrences] = useState([]); // recurring, not stored as tasks
 
   // Focus Timer (inline edit)
   const [sessionTotal, setSessionTotal] = useState(25 * 60);
@@ -66,16 +84,86 @@ export default function App() {
   const [currentFlowTask, setCurrentFlowTask] = useState(null);
 
   const notifiedDoneRef = useRef(false);
+  const versionRef = useRef(null); // store version of the tasks we hold
+  const streamLiveRef = useRef(false); // /events connected: writes arrive by push
 
-  const fetchTasks = async () => {
+  const fetchAllTasks = async () => {
     const res = await axios.get(`${API}/tasks`);
+    const etag = res.headers?.etag;
+    versionRef.current = etag ? parseInt(etag.replace(/"/g, ""), 10) : null;
     setTasks(res.data || []);
   };
 
+  // Pull only rows changed since the last version we saw; full reload on reset
+  const fetchTasks = async () => {
+    if (versionRef.current === null) return fetchAllTasks();
+
+    const res = await axios.get(`${API}/tasks/changes`, {
+      params: { since: versionRef.current },
+    });
+    const { version, reset, upserted = [], deleted = [] } = res.data || {};
+    if (reset) return fetchAllTasks();
+
+    versionRef.current = version;
+    if (upserted.length === 0 && deleted.length === 0) return;
+    setTasks((prev) => mergeTasks(prev, upserted, deleted));
+  };
+
+  // After our own writes: the /events stream delivers the change, so only
+  // pull when the stream is down.
+  const syncAfterWrite = async () => {
+    if (!streamLiveRef.current) await fetchTasks();
+  };
+
   useEffect(() => {
     fetchTasks();
   }, []);
 
+  // Live task changes from the server (all tabs / chat actions)
+  useEffect(() => {
+    if (!("EventSource" in window)) return;
+    const es = new EventSource(`${API}/events`);
+
+    es.onopen = () => {
+      streamLiveRef.current = true;
+      fetchTasks(); // catch up on anything missed while disconnected
+    };
+
+    es.addEventListener("task", (e) => {
+      const ev = JSON.parse(e.data);
+      if (versionRef.current !== null && ev.version <= versionRef.current) return; // already have it
+      if (ev.op === "reset") {
+        // bulk change (an import): reload instead of merging
+        fetchAllTasks();
+        return;
+      }
+      // versions are shared by all users; `prev` is this user's previous change
+      if (versionRef.current === null || ev.prev > versionRef.current || (ev.op === "upsert" && !ev.task)) {
+        // gap or no payload: fall back to a delta pull
+        fetchTasks();
+        return;
+      }
+      versionRef.current = ev.version;
+      setTasks((prev) =>
+        ev.op === "delete" ? mergeTasks(prev, [], [ev.id]) : mergeTasks(prev, [ev.task], [])
+      );
+    });
+
+    es.addEventListener("dropped", () => {
+      // server dropped us for being slow; EventSource reconnects on its own
+      streamLiveRef.current = false;
+    });
+
+    es.onerror = () => {
+      streamLiveRef.current = false;
+    };
+
+    return () => {
+      streamLiveRef.current = false;
+      es.close();
+    };
+  }, []);
+
   // Timer tick
   useEffect(() => {
     let interval = null;
@@ -167,23 +255,23 @@ export default function App() {
       status: 0,
     });
     setQuickTitle("");
-    await fetchTasks();
+    await syncAfterWrite();
   };
 
   const completeTask = async (id) => {
     await axios.patch(`${API}/tasks/${id}`, { status: 1 });
-    await fetchTasks();
+    await syncAfterWrite();
   };
 
   const deleteTask = async (id) => {
     await axios.delete(`${API}/tasks/${id}`);
-    await fetchTasks();
+    await syncAfterWrite();
   };
 
   const updatePriority = async (id, currentPriority) => {
     const newPriority = currentPriority >= 5 ? 1 : currentPriority + 1;
     await axios.patch(`${API}/tasks/${id}`, { priority: newPriority });
-    await fetchTasks();
+    await syncAfterWrite();
   };
 
   const executeCommand = async () => {
@@ -193,7 +281,7 @@ export default function App() {
       await axios.post(`${API}/command`, { text: commandText.trim() });
       setCommandText("");
       setCommandOpen(false);
-      await fetchTasks();
+      await syncAfterWrite();
     } catch (err) {
       setCommandError(err?.response?.data?.detail || "Could not parse that");
     }
@@ -230,10 +318,10 @@ export default function App() {
   const filteredActive = useMemo(() => tasks.filter((t) => t.status === 0), [tasks]);
 
   const scheduledForSelectedDate = useMemo(() => {
-    return tasks.filter(
+    return [...tasks, ...occurrences].filter(
       (t) => (t.deadline || "") === selectedDate && (t.start_time || "").trim() !== ""
     );
-  }, [tasks, selectedDate]);
+  }, [tasks, occurrences, selectedDate]);
 
   // Fetch ghost schedule when timetable expands OR date changes OR tasks change
   useEffect(() => {
@@ -242,6 +330,10 @@ export default function App() {
       .get(`${API}/ghost-schedule`, { params: { date: selectedDate } })
       .then((res) => setGhosts(res.data?.suggestions || []))
       .catch(() => setGhosts([]));
+    axios
+      .get(`${API}/tasks`, { params: { from: selectedDate, to: selectedDate } })
+      .then((res) => setOccurrences((res.data || []).filter((t) => t.id === null)))
+      .catch(() => setOccurrences([]));
   }, [timetableExpanded, selectedDate, tasks]);
 
   // Timetable slots: 08:00–20:00 in 30-min steps
@@ -262,11 +354,19 @@ export default function App() {
   };
 
   const solidifyGhost = async (g) => {
+    if (g.task_id === null) {
+      // recurring occurrence: storing its time turns it into a task row
+      await axios.patch(`${API}/series/${g.series_id}/occurrences/${g.occurrence}`, {
+        start_time: g.suggested_time,
+      });
+      await syncAfterWrite();
+      return;
+    }
     await axios.post(`${API}/solidify-ghost/${g.task_id}`, {
       time_slot: g.suggested_time,
       deadline: selectedDate,
     });
-    await fetchTasks();
+    await syncAfterWrite();
   };
 
   // Flow progress
@@ -556,7 +656,7 @@ export default function App() {
           </div>
         </div>
       </main>
-      <Assistant onTaskUpdate={fetchTasks} />
+      <Assistant onTaskUpdate={syncAfterWrite} />
     </div>
   );
 }
\ No newline at end of file